@@ -0,0 +1,175 @@
+# analise.py
+"""Agregados de uma busca: estatísticas (quantidade, percentis e valor por m²) e contagens por ano e tipo de imóvel, e tendência mensal de preços."""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+from consultas import contar_busca
+from esquema import COLUNA_ANO, COLUNA_DATA, COLUNA_VALOR, COLUNA_AREA_CONSTRUIDA, COLUNA_USO
+from normalizacao import intervalo_cep, padrao_logradouro
+
+logger = logging.getLogger(__name__)
+
+# Perfil usado na chave do cache para distinguir as estatísticas das listas de transações
+PERFIL_ESTATISTICAS = 'estatisticas'
+PERCENTIS = {'valor_p10': 0.10, 'valor_p25': 0.25, 'valor_mediano': 0.50, 'valor_p75': 0.75, 'valor_p90': 0.90}
+COLUNAS_ESTATISTICAS = [COLUNA_ANO, 'tipo', 'transacoes', *PERCENTIS, 'valor_m2_mediano']
+TIPO_TODOS = 'Todos'
+
+# Contagens (facetas) da busca: transações por ano e tipo, sem o filtro de anos
+PERFIL_CONTAGENS = 'contagens'
+COLUNAS_CONTAGENS = [COLUNA_ANO, 'tipo', 'transacoes']
+
+# Tendência: uma linha por mês, lida das tabelas pré-agregadas de sql/tendencias.sql
+PERFIL_TENDENCIA = 'tendencia'
+QUARTIS = {'p25': 0.25, 'mediano': 0.50, 'p75': 0.75}
+COLUNAS_TENDENCIA = [COLUNA_ANO, 'mes', 'transacoes', *(f'valor_{q}' for q in QUARTIS), *(f'valor_m2_{q}' for q in QUARTIS), 'grupos']
+
+
+def logradouro_rpc(chave):
+    """p_logradouro das RPCs: o nome exato ou o padrão LIKE sobre logradouro_norm (ver padrao_logradouro)."""
+    if not chave.rua: return None
+    return chave.rua if chave.rua_exata else padrao_logradouro(chave.rua)
+
+
+def estatisticas_remotas(cliente, chave) -> pd.DataFrame:
+    """Calcula as estatísticas no banco pela RPC get_estatisticas_busca."""
+    cep_inicio, cep_fim = intervalo_cep(chave.cep) if chave.cep else (None, None)
+    parametros = {
+        'p_logradouro': logradouro_rpc(chave),
+        'p_exato': chave.rua_exata,
+        'p_cep': cep_inicio,
+        'p_cep_fim': cep_fim,
+        'p_numero': chave.numero or None,
+        'p_anos': list(chave.anos) or None,
+    }
+    response = cliente.rpc('get_estatisticas_busca', parametros).execute()
+    return pd.DataFrame(response.data or [], columns=COLUNAS_ESTATISTICAS)
+
+
+def _agregar(df: pd.DataFrame, grupos: list) -> pd.DataFrame:
+    agrupado = df.groupby(grupos, observed=True, sort=False)
+    resultado = agrupado.size().rename('transacoes').to_frame()
+    quantis = agrupado[COLUNA_VALOR].quantile(list(PERCENTIS.values())).unstack()
+    quantis.columns = list(PERCENTIS)
+    resultado = resultado.join(quantis)
+    resultado['valor_m2_mediano'] = agrupado['_valor_m2'].median()
+    return resultado.reset_index()
+
+
+def calcular_estatisticas(df: pd.DataFrame) -> pd.DataFrame:
+    """Mesmas estatísticas da RPC, calculadas de forma vetorizada sobre linhas já em memória."""
+    if df.empty or COLUNA_VALOR not in df.columns:
+        return pd.DataFrame(columns=COLUNAS_ESTATISTICAS)
+    base = pd.DataFrame({
+        COLUNA_ANO: df[COLUNA_ANO],
+        'tipo': df[COLUNA_USO].astype('object').fillna('Não informado') if COLUNA_USO in df.columns else 'Não informado',
+        COLUNA_VALOR: df[COLUNA_VALOR].astype('float64'),
+    })
+    if COLUNA_AREA_CONSTRUIDA in df.columns:
+        base['_valor_m2'] = base[COLUNA_VALOR] / df[COLUNA_AREA_CONSTRUIDA].astype('float64').replace(0, np.nan)
+    else:
+        base['_valor_m2'] = np.nan
+    por_tipo = _agregar(base, [COLUNA_ANO, 'tipo'])
+    por_ano = _agregar(base, [COLUNA_ANO]).assign(tipo=TIPO_TODOS)
+    resultado = pd.concat([por_ano, por_tipo], ignore_index=True)[COLUNAS_ESTATISTICAS]
+    resultado['_todos'] = resultado['tipo'] == TIPO_TODOS
+    resultado = resultado.sort_values([COLUNA_ANO, '_todos', 'transacoes'], ascending=False, ignore_index=True)
+    return resultado.drop(columns='_todos')
+
+
+# --- Contagens ---
+
+def contagens_remotas(cliente, chave) -> pd.DataFrame:
+    """Transações por ano e tipo pela RPC get_contagens_busca (sem transferir as linhas).
+
+    Sem a RPC, devolve só o total da busca, contado por uma requisição HEAD (df.attrs['estimado']).
+    """
+    cep_inicio, cep_fim = intervalo_cep(chave.cep) if chave.cep else (None, None)
+    parametros = {
+        'p_logradouro': logradouro_rpc(chave),
+        'p_exato': chave.rua_exata,
+        'p_cep': cep_inicio,
+        'p_cep_fim': cep_fim,
+        'p_numero': chave.numero or None,
+    }
+    try:
+        response = cliente.rpc('get_contagens_busca', parametros).execute()
+        return pd.DataFrame(response.data or [], columns=COLUNAS_CONTAGENS)
+    except Exception as e:
+        logger.warning("RPC get_contagens_busca indisponível (execute sql/get_contagens_busca.sql): %s", e)
+    total = contar_busca(cliente, chave.rua, chave.cep, chave.numero, rua_exata=chave.rua_exata)
+    contagens = pd.DataFrame({COLUNA_ANO: [None], 'tipo': [None], 'transacoes': [total]}, columns=COLUNAS_CONTAGENS)
+    contagens.attrs['estimado'] = True
+    return contagens
+
+
+def calcular_contagens(df: pd.DataFrame) -> pd.DataFrame:
+    """Mesmas contagens da RPC, sobre linhas já em memória."""
+    if df.empty: return pd.DataFrame(columns=COLUNAS_CONTAGENS)
+    tipos = df[COLUNA_USO].astype('object').fillna('Não informado') if COLUNA_USO in df.columns else 'Não informado'
+    base = pd.DataFrame({COLUNA_ANO: df[COLUNA_ANO], 'tipo': tipos})
+    contagens = base.groupby([COLUNA_ANO, 'tipo'], observed=True).size().rename('transacoes').reset_index()
+    return contagens.sort_values([COLUNA_ANO, 'transacoes'], ascending=False, ignore_index=True)
+
+
+def resumir_contagens(contagens: pd.DataFrame, anos: list = None) -> dict:
+    """Total da busca nos anos escolhidos (todos, se nenhum), e totais por ano e por tipo.
+
+    Na contagem estimada, o total é o da busca em todos os anos: um limite superior do total nos anos escolhidos.
+    """
+    por_ano = contagens.dropna(subset=[COLUNA_ANO]).groupby(COLUNA_ANO)['transacoes'].sum()
+    por_ano = {int(ano): int(total) for ano, total in por_ano.sort_index(ascending=False).items()}
+    # A contagem estimada (sem a RPC) é uma linha só, sem ano: vale como total, mesmo com anos escolhidos
+    estimado = bool(contagens.attrs.get('estimado'))
+    selecionadas = contagens[contagens[COLUNA_ANO].isin(anos)] if anos and not estimado else contagens
+    por_tipo = selecionadas.dropna(subset=['tipo']).groupby('tipo')['transacoes'].sum().sort_values(ascending=False)
+    return {
+        'total': int(selecionadas['transacoes'].sum()),
+        'por_ano': por_ano,
+        'por_tipo': {str(tipo): int(total) for tipo, total in por_tipo.items()},
+        'estimado': estimado,
+    }
+
+
+# --- Tendência mensal ---
+
+def tendencia_remota(cliente, chave) -> pd.DataFrame:
+    """Tendência lida das tabelas agregadas pela RPC get_tendencia (o CEP, se houver, tem precedência sobre o logradouro)."""
+    cep_inicio, cep_fim = intervalo_cep(chave.cep) if chave.cep else (None, None)
+    parametros = {
+        'p_logradouro': logradouro_rpc(chave),
+        'p_exato': chave.rua_exata,
+        'p_cep': cep_inicio,
+        'p_cep_fim': cep_fim,
+        'p_anos': list(chave.anos) or None,
+    }
+    response = cliente.rpc('get_tendencia', parametros).execute()
+    return pd.DataFrame(response.data or [], columns=COLUNAS_TENDENCIA)
+
+
+def calcular_tendencia(df: pd.DataFrame) -> pd.DataFrame:
+    """Mesma tendência da RPC, com quartis exatos, calculada sobre linhas já em memória."""
+    if df.empty or COLUNA_VALOR not in df.columns or COLUNA_DATA not in df.columns:
+        return pd.DataFrame(columns=COLUNAS_TENDENCIA)
+    datas = pd.to_datetime(df[COLUNA_DATA], errors='coerce')
+    base = pd.DataFrame({
+        COLUNA_ANO: df[COLUNA_ANO] if COLUNA_ANO in df.columns else datas.dt.year,
+        'mes': datas.dt.month,
+        'valor': df[COLUNA_VALOR].astype('float64'),
+    })
+    if COLUNA_AREA_CONSTRUIDA in df.columns:
+        base['valor_m2'] = base['valor'] / df[COLUNA_AREA_CONSTRUIDA].astype('float64').replace(0, np.nan)
+    else:
+        base['valor_m2'] = np.nan
+    # Linhas sem ano ou sem data ficam de fora; só depois os dois viram inteiros (o ano pode ser Int32 com NA)
+    agrupado = base.dropna(subset=[COLUNA_ANO, 'mes']).astype({COLUNA_ANO: 'int64', 'mes': 'int64'}).groupby([COLUNA_ANO, 'mes'])
+    resultado = agrupado.size().rename('transacoes').to_frame()
+    for coluna in ('valor', 'valor_m2'):
+        quartis = agrupado[coluna].quantile(list(QUARTIS.values())).unstack()
+        quartis.columns = [f'{coluna}_{q}' for q in QUARTIS]
+        resultado = resultado.join(quartis)
+    resultado['grupos'] = 1
+    return resultado.reset_index()[COLUNAS_TENDENCIA]
@@ -1,183 +1,845 @@
-# app_busca.py (Versão 4.0 - Mobile-First Design)
-
-import streamlit as st
-import pandas as pd
-from supabase import create_client, Client
-import os
-from dotenv import load_dotenv
-import unicodedata
-import re
-
-# --- 0. CONFIGURAÇÃO INICIAL DA PÁGINA ---
-
-st.set_page_config(
-    layout="wide",
-    page_title="eXatos ITBI - Análise Imobiliária",
-    page_icon="assets/icon.png" 
-)
-
-# --- 1. FUNÇÕES DE CONEXÃO E BUSCA ---
-
-@st.cache_resource
-def init_supabase_connection() -> Client:
-    """Conecta ao Supabase usando as credenciais."""
-    try:
-        supabase_url = st.secrets["SUPABASE_URL"]
-        supabase_key = st.secrets["SUPABASE_KEY"]
-    except KeyError:
-        supabase_url = os.getenv("SUPABASE_URL")
-        supabase_key = os.getenv("SUPABASE_KEY")
-
-    if not supabase_url or not supabase_key:
-        st.error("ERRO: Credenciais do Supabase não configuradas.")
-        return None
-        
-    return create_client(supabase_url, supabase_key)
-
-supabase = init_supabase_connection()
-
-def normalizar_busca(texto_busca: str) -> str:
-    """Prepara o texto de busca do usuário para ser compatível com o banco de dados."""
-    if not texto_busca: return ""
-    texto_sem_acento = ''.join(c for c in unicodedata.normalize('NFD', texto_busca) if unicodedata.category(c) != 'Mn')
-    texto_lower = texto_sem_acento.lower()
-    substituicoes = {'rua ': 'r ', 'avenida ': 'av ', 'estrada ': 'est ', 'travessa ': 'tv ', 'praca ': 'pca ', 'largo ': 'lgo '}
-    for chave, valor in substituicoes.items():
-        if texto_lower.startswith(chave):
-            texto_lower = texto_lower.replace(chave, valor, 1)
-            break
-    return texto_lower.strip()
-
-@st.cache_data(ttl=3600)
-def get_anos_disponiveis(_supabase_client) -> list:
-    """Busca os anos distintos chamando a função RPC no Supabase."""
-    if not _supabase_client: return []
-    try:
-        response = _supabase_client.rpc('get_distinct_anos', {}).execute()
-        if response.data:
-            anos = [item['ano'] for item in response.data]
-            return anos
-        return []
-    except Exception as e:
-        st.error(f"Erro ao buscar lista de anos: {e}")
-        return []
-
-@st.cache_data(ttl=600)
-def buscar_dados(_supabase_client, nome_rua: str = None, cep: str = None, numero: str = None, anos_selecionados: list = []):
-    """Executa a busca no banco de dados."""
-    if not _supabase_client:
-        st.error("Conexão com o banco de dados falhou.")
-        return pd.DataFrame()
-
-    query = _supabase_client.table('transacoes_imobiliarias').select('*')
-    
-    if anos_selecionados:
-        query = query.in_('ano_transacao', anos_selecionados)
-
-    if cep:
-        cep_limpo = re.sub(r'\D', '', cep)
-        if cep_limpo:
-            query = query.eq('cep', int(cep_limpo))
-    
-    if nome_rua:
-        rua_normalizada = normalizar_busca(nome_rua)
-        query = query.ilike('nome_do_logradouro', f'%{rua_normalizada}%')
-    
-    if numero:
-        query = query.eq('numero', numero.strip())
-        
-    try:
-        response = query.limit(1000).execute()
-        df = pd.DataFrame(response.data)
-        return df
-    except Exception as e:
-        st.error(f"Ocorreu um erro durante a busca: {e}")
-        return pd.DataFrame()
-
-# --- 2. LAYOUT DA INTERFACE (PÁGINA PRINCIPAL) ---
-
-st.title("eXatos ITBI")
-st.markdown("##### Ferramenta de Análise do Mercado Imobiliário")
-
-# --- INÍCIO DA ATUALIZAÇÃO: Filtros movidos para um Expander ---
-with st.expander("🔍 Filtros de Busca", expanded=True):
-    anos_disponiveis = get_anos_disponiveis(supabase)
-
-    st.markdown("**Buscar por Endereço**")
-    col1, col2 = st.columns(2)
-    with col1:
-        nome_rua_input = st.text_input(
-            "Nome do Logradouro",
-            placeholder="Ex: Av Paulista",
-            help="A busca corrige abreviações (Rua -> R) e acentos."
-        )
-    with col2:
-        numero_input = st.text_input("Número", placeholder="(Opcional)")
-
-    st.markdown("**ou Buscar por CEP**", help="Preencher o CEP irá ignorar a busca por endereço.")
-    cep_input = st.text_input("CEP", placeholder="Ex: 01311-000")
-    
-    st.markdown("---")
-    anos_selecionados = st.multiselect(
-        "Filtrar por Ano(s)",
-        options=anos_disponiveis,
-        placeholder="Todos os anos"
-    )
-    
-    buscar_btn = st.button("Buscar", type="primary", use_container_width=True)
-# --- FIM DA ATUALIZAÇÃO ---
-
-st.divider()
-
-# Lógica para executar a busca quando o botão for clicado
-if buscar_btn:
-    if nome_rua_input or cep_input:
-        with st.spinner("Buscando dados no banco..."):
-            st.session_state['resultados_busca'] = buscar_dados(supabase, nome_rua_input, cep_input, numero_input, anos_selecionados)
-            st.session_state['last_search_executed'] = True
-    else:
-        st.warning("Por favor, preencha o 'Nome do Logradouro' ou o 'CEP' para iniciar a busca.")
-        st.session_state['last_search_executed'] = False
-
-
-# Seção de Resultados
-if 'resultados_busca' in st.session_state:
-    resultados_iniciais = st.session_state['resultados_busca']
-    
-    if not resultados_iniciais.empty:
-        st.header("📊 Resultados da Busca")
-        st.info(f"Busca encontrou **{len(resultados_iniciais)}** resultados (limitado aos 1000 mais recentes).")
-        
-        # Filtro Adicional
-        st.markdown("###### Refine sua busca:")
-        
-        colunas_disponiveis = sorted(resultados_iniciais.columns)
-        coluna_para_filtrar = st.selectbox("Filtrar por coluna:", options=colunas_disponiveis)
-        
-        valor_para_filtrar = st.text_input("Contendo o valor:", placeholder="Digite para filtrar...")
-
-        resultados_filtrados = resultados_iniciais
-        if valor_para_filtrar:
-            try:
-                resultados_filtrados = resultados_iniciais[
-                    resultados_iniciais[coluna_para_filtrar].astype(str).str.contains(valor_para_filtrar, case=False, na=False)
-                ]
-            except Exception as e:
-                st.error(f"Erro ao aplicar filtro: {e}")
-
-        # Formatação para Exibição
-        df_para_exibir = resultados_filtrados.copy()
-        coluna_valor = 'valor_de_transacao_declarado_pelo_contribuinte'
-        if coluna_valor in df_para_exibir.columns:
-            df_para_exibir[coluna_valor] = pd.to_numeric(df_para_exibir[coluna_valor], errors='coerce')
-            df_para_exibir[coluna_valor] = df_para_exibir[coluna_valor].apply(
-                lambda x: f'R$ {x:,.2f}'.replace(",", "X").replace(".", ",").replace("X", ".") if pd.notnull(x) else "N/A"
-            )
-
-        st.dataframe(df_para_exibir, use_container_width=True)
-
-    elif st.session_state.get('last_search_executed', False):
-        st.info("Nenhum resultado encontrado para os filtros informados.")
-
-else:
-    st.info("Utilize os filtros acima para iniciar sua análise.")
+# app_busca.py (Versão 4.0 - Mobile-First Design)
+
+import streamlit as st
+import os
+import hmac
+import logging
+import tempfile
+import time
+from dotenv import load_dotenv
+from esquema import PERFIS_COLUNAS, PERFIL_PADRAO
+from inicializacao import Partida
+from normalizacao import MINIMO_PREFIXO_CEP, canonizar_cep, intervalo_cep, descrever_cep
+
+logger = logging.getLogger(__name__)
+
+# --- 0. CONFIGURAÇÃO INICIAL DA PÁGINA ---
+
+st.set_page_config(
+    layout="wide",
+    page_title="eXatos ITBI - Análise Imobiliária",
+    page_icon="assets/icon.png" 
+)
+
+def ler_configuracao(nome: str, padrao=None):
+    """Lê uma configuração dos secrets do Streamlit ou, na falta deles, das variáveis de ambiente."""
+    try:
+        return st.secrets[nome]
+    except (KeyError, FileNotFoundError):
+        return os.getenv(nome, padrao)
+
+def formatar_milhar(numero: int) -> str:
+    """Inteiro com o separador de milhar brasileiro (12.430)."""
+    return f"{numero:,}".replace(',', '.')
+
+# --- 1. PARTIDA RÁPIDA (CONEXÃO E LISTAS EM SEGUNDO PLANO) ---
+
+# Carregados em segundo plano enquanto o formulário é desenhado
+MODULOS_PESADOS = ['pandas', 'supabase', 'analise', 'busca_lote', 'cache_resultados', 'comparaveis', 'consultas',
+                   'formatacao', 'indice_ceps', 'indice_logradouros', 'indice_refino', 'metricas', 'paginacao',
+                   'replica_local']
+
+# Teto de linhas por busca (também usado para dividir setores de CEP grandes em partes)
+LIMITE_LINHAS = int(ler_configuracao("ITBI_LIMITE_LINHAS", 50000))
+
+def init_supabase_connection():
+    """Conecta ao Supabase usando as credenciais (a biblioteca só é importada aqui)."""
+    from supabase import create_client
+    supabase_url = ler_configuracao("SUPABASE_URL")
+    supabase_key = ler_configuracao("SUPABASE_KEY")
+    if not supabase_url or not supabase_key:
+        return None
+    return create_client(supabase_url, supabase_key)
+
+def init_replica_local(partida: Partida):
+    """Ativa a réplica local (ITBI_REPLICA_DIR) e inicia sua sincronização em segundo plano."""
+    diretorio = ler_configuracao("ITBI_REPLICA_DIR")
+    if not diretorio: return None
+    from replica_local import ReplicaLocal
+    replica = ReplicaLocal(diretorio, idade_maxima=float(ler_configuracao("ITBI_REPLICA_IDADE_MAXIMA", 6 * 3600)))
+    cliente = partida.resultado('conexao')
+    if cliente:
+        replica.iniciar_sincronizacao_periodica(cliente, intervalo=float(ler_configuracao("ITBI_REPLICA_INTERVALO", 3600)))
+    return replica
+
+def get_anos_disponiveis(partida: Partida) -> list:
+    """Busca os anos distintos na réplica local ou chamando a função RPC no Supabase; grava a lista para a próxima partida."""
+    replica = partida.resultado('replica')
+    if replica and replica.esta_atualizada():
+        return partida.guardar_anos(replica.anos_disponiveis())
+    cliente = partida.resultado('conexao')
+    if not cliente: return []
+    from consultas import ler_anos
+    return partida.guardar_anos(ler_anos(cliente))
+
+def init_indice_logradouros(partida: Partida):
+    """Monta o índice de sugestões de logradouro na réplica local ou a partir da RPC."""
+    from indice_logradouros import IndiceLogradouros, carregar_logradouros
+    replica = partida.resultado('replica')
+    if replica and replica.esta_atualizada():
+        return IndiceLogradouros(replica.contagem_logradouros())
+    cliente = partida.resultado('conexao')
+    return IndiceLogradouros(carregar_logradouros(cliente)) if cliente else None
+
+def init_indice_ceps(partida: Partida):
+    """Índice de transações por CEP, da réplica local ou da RPC get_cep_logradouros (sql/indice_ceps.sql)."""
+    from indice_ceps import IndiceCeps, carregar_contagem_ceps
+    try:
+        replica = partida.resultado('replica')
+        if replica and replica.esta_atualizada():
+            return IndiceCeps(replica.contagem_ceps())
+        cliente = partida.resultado('conexao')
+        return IndiceCeps(carregar_contagem_ceps(cliente)) if cliente else None
+    except Exception as e:
+        logger.warning("Índice de CEPs indisponível: %s", e)
+        return None
+
+def init_base_comparaveis(partida: Partida):
+    """Snapshot colunar da réplica local para os comparáveis; sem réplica, cada busca usa a região do imóvel."""
+    replica = partida.resultado('replica')
+    if not replica or not replica.esta_atualizada(): return None
+    from comparaveis import BaseComparaveis, COLUNAS_COMPARAVEIS
+    return BaseComparaveis(replica.tabela(COLUNAS_COMPARAVEIS))
+
+@st.cache_resource
+def init_partida() -> Partida:
+    """Inicia, uma vez por processo, as tarefas de arranque; o formulário não espera por elas.
+
+    A lista de anos e as buscas populares ficam gravadas em ITBI_ESTADO_ARQUIVO entre reinícios.
+    """
+    partida = Partida(ler_configuracao("ITBI_ESTADO_ARQUIVO", "dados/estado_app.json"))
+    partida.tarefa('modulos', lambda: partida.importar(MODULOS_PESADOS))
+    partida.tarefa('conexao', init_supabase_connection)
+    partida.tarefa('replica', lambda: init_replica_local(partida))
+    partida.tarefa('anos', lambda: get_anos_disponiveis(partida), validade=3600)
+    partida.tarefa('indice_logradouros', lambda: init_indice_logradouros(partida),
+                   validade=int(ler_configuracao("ITBI_INDICE_LOGRADOUROS_TTL", 24 * 3600)))
+    partida.tarefa('indice_ceps', lambda: init_indice_ceps(partida),
+                   validade=int(ler_configuracao("ITBI_INDICE_CEPS_TTL", 24 * 3600)))
+    # Refeito a cada sincronização da réplica
+    partida.tarefa('comparaveis', lambda: init_base_comparaveis(partida),
+                   validade=float(ler_configuracao("ITBI_REPLICA_INTERVALO", 3600)))
+    return partida
+
+partida = init_partida()
+
+# --- 2. LAYOUT DA INTERFACE (PÁGINA PRINCIPAL) ---
+
+ROTULOS_PERFIS = {'listagem': 'Essenciais', 'analise': 'Análise de valores', 'completo': 'Todas as colunas'}
+
+st.title("eXatos ITBI")
+st.markdown("##### Ferramenta de Análise do Mercado Imobiliário")
+
+# --- INÍCIO DA ATUALIZAÇÃO: Filtros movidos para um Expander ---
+with st.expander("🔍 Filtros de Busca", expanded=True):
+    # Lista atual se já foi consultada; senão a da última execução; só a primeira partida espera pela consulta
+    anos_disponiveis = partida.resultado('anos', esperar=False) or partida.anos_conhecidos() or partida.resultado('anos', padrao=[])
+    # As sugestões aparecem assim que o índice termina de ser montado em segundo plano
+    indice_logradouros = partida.resultado('indice_logradouros', esperar=False)
+
+    st.markdown("**Buscar por Endereço**")
+    col1, col2 = st.columns(2)
+    with col1:
+        nome_rua_input = st.text_input(
+            "Nome do Logradouro",
+            placeholder="Ex: Av Paulista",
+            help="A busca corrige abreviações (Rua -> R) e acentos."
+        )
+    with col2:
+        numero_input = st.text_input("Número", placeholder="(Opcional)")
+
+    # Sugestões do índice de logradouros: o nome escolhido vira uma busca exata
+    logradouro_escolhido = None
+    if nome_rua_input and indice_logradouros:
+        from indice_logradouros import PONTUACAO_CONFIANTE
+        sugestoes = indice_logradouros.sugerir(nome_rua_input)
+        if sugestoes:
+            opcoes = [None] + [nome for nome, _, _ in sugestoes]
+            totais = {nome: total for nome, total, _ in sugestoes}
+            logradouro_escolhido = st.selectbox(
+                "Logradouro sugerido",
+                options=opcoes,
+                index=1 if sugestoes[0][2] >= PONTUACAO_CONFIANTE else 0,
+                format_func=lambda nome: "Qualquer logradouro contendo o texto digitado" if nome is None else f"{nome} ({totais[nome]} transações)"
+            )
+
+    st.markdown("**ou Buscar por CEP**", help="Preencher o CEP irá ignorar a busca por endereço.")
+    cep_input = st.text_input(
+        "CEP",
+        placeholder="Ex: 01311-000",
+        help="CEP completo, setor (5 dígitos, ex: 01311), sub-região (3 dígitos, ex: 013) ou faixa (ex: 01310-000 a 01319-999)."
+    )
+
+    # Setor, sub-região ou faixa: o índice de CEPs mostra o tamanho da busca antes de executá-la
+    cep_canonico = canonizar_cep(cep_input)
+    # CEP que não canoniza é recusado: buscar sem ele traria a cidade inteira
+    cep_invalido = bool(cep_input) and not cep_canonico
+    if cep_invalido:
+        st.warning(f"CEP inválido: informe de {MINIMO_PREFIXO_CEP} a 8 dígitos (ex: 01311-000, 01311 ou 013) "
+                   "ou uma faixa (ex: 01310 a 01319).")
+    if cep_canonico and len(set(intervalo_cep(cep_canonico))) > 1:
+        inicio_cep, fim_cep = intervalo_cep(cep_canonico)
+        indice_ceps = partida.resultado('indice_ceps', esperar=False)
+        if indice_ceps:
+            tamanho_cep = indice_ceps.resumo(inicio_cep, fim_cep)
+            principais = ', '.join(indice_ceps.logradouros(inicio_cep, fim_cep, 3).index)
+            st.caption(f"{descrever_cep(cep_canonico).capitalize()}: cerca de **{tamanho_cep['transacoes']}** transações "
+                       f"em {tamanho_cep['ceps']} CEPs (todos os anos)." + (f" Principais logradouros: {principais}." if principais else ""))
+            # Setores maiores que o teto de linhas são percorridos em partes, cada uma uma faixa de CEPs
+            if tamanho_cep['transacoes'] > LIMITE_LINHAS:
+                partes_cep = indice_ceps.partes(inicio_cep, fim_cep, LIMITE_LINHAS)
+                parte_cep = st.selectbox(
+                    "Parte da faixa",
+                    options=range(len(partes_cep)),
+                    format_func=lambda i: f"{i + 1} de {len(partes_cep)}: {descrever_cep(canonizar_cep(f'{partes_cep[i][0]:08d}-{partes_cep[i][1]:08d}'))} ({partes_cep[i][2]} transações)"
+                )
+                cep_input = f"{partes_cep[parte_cep][0]:08d}-{partes_cep[parte_cep][1]:08d}"
+        else:
+            st.caption(f"Busca por {descrever_cep(cep_canonico)}.")
+    
+    st.markdown("---")
+    # Depois de uma busca, cada ano mostra quantas transações a mesma busca tem nele
+    contagens_anteriores = st.session_state.get('contagens_busca')
+    contagens_por_ano = contagens_anteriores[1]['por_ano'] if contagens_anteriores and \
+        contagens_anteriores[0] == (nome_rua_input, cep_input, numero_input, logradouro_escolhido) else {}
+    anos_selecionados = st.multiselect(
+        "Filtrar por Ano(s)",
+        options=anos_disponiveis,
+        placeholder="Todos os anos",
+        key="anos_selecionados",  # a escolha se mantém quando os rótulos ganham as contagens
+        format_func=lambda ano: f"{ano} ({formatar_milhar(contagens_por_ano[ano])} transações)" if ano in contagens_por_ano else str(ano)
+    )
+    perfil_colunas = st.selectbox(
+        "Colunas",
+        options=list(PERFIS_COLUNAS),
+        index=list(PERFIS_COLUNAS).index(PERFIL_PADRAO),
+        format_func=lambda perfil: ROTULOS_PERFIS.get(perfil, perfil),
+        help="Trazer menos colunas deixa a busca mais rápida."
+    )
+    modo_resultado = st.radio(
+        "Resultado",
+        options=["Transações", "Estatísticas", "Tendência"],
+        horizontal=True,
+        help="Estatísticas calcula quantidade, percentis e valor por m² sobre todas as transações encontradas, sem baixá-las. "
+             "Tendência mostra a evolução mensal do valor por m² do logradouro ou CEP (o número é ignorado)."
+    )
+    
+    buscar_btn = st.button("Buscar", type="primary", use_container_width=True)
+# --- FIM DA ATUALIZAÇÃO ---
+
+with st.expander("📁 Busca em Lote"):
+    arquivo_lote = st.file_uploader(
+        "Planilha de endereços (CSV ou XLSX)",
+        type=["csv", "xlsx"],
+        help="Colunas aceitas: logradouro (ou endereco), numero e cep. Os filtros de ano acima também se aplicam."
+    )
+    buscar_lote_btn = st.button("Buscar Lote", use_container_width=True, disabled=arquivo_lote is None)
+
+with st.expander("🏘️ Comparáveis"):
+    st.caption("Transações mais parecidas com um imóvel no endereço ou CEP informado nos filtros acima. Deixe em branco (ou 0) o que não souber.")
+    col_area, col_terreno = st.columns(2)
+    with col_area:
+        area_comparaveis = st.number_input("Área construída (m²)", min_value=0.0, step=10.0)
+    with col_terreno:
+        terreno_comparaveis = st.number_input("Área do terreno (m²)", min_value=0.0, step=10.0)
+    col_ano, col_uso = st.columns(2)
+    with col_ano:
+        ano_comparaveis = st.selectbox(
+            "Ano de referência",
+            options=[None] + list(anos_disponiveis),
+            index=1 if anos_disponiveis else 0,
+            format_func=lambda ano: "Qualquer ano" if ano is None else str(ano)
+        )
+    with col_uso:
+        # Lista de usos do snapshot da réplica, quando já montado; senão, texto livre
+        base_comparaveis = partida.resultado('comparaveis', esperar=False)
+        usos_comparaveis = base_comparaveis.usos() if base_comparaveis else []
+        if usos_comparaveis:
+            uso_comparaveis = st.selectbox("Uso do IPTU", options=[None] + usos_comparaveis,
+                                           format_func=lambda uso: "Qualquer uso" if uso is None else uso)
+        else:
+            uso_comparaveis = st.text_input("Uso do IPTU", placeholder="Ex: Residencial (opcional)")
+    quantidade_comparaveis = st.slider("Quantidade de comparáveis", min_value=5, max_value=50, value=10)
+    buscar_comparaveis_btn = st.button("Buscar Comparáveis", use_container_width=True)
+
+st.divider()
+
+# --- 3. FUNÇÕES DE CONEXÃO E BUSCA ---
+
+# Importados só depois do formulário desenhado (a tarefa 'modulos' já os carregou ou está carregando)
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from analise import (PERFIL_ESTATISTICAS, PERFIL_TENDENCIA, PERFIL_CONTAGENS, calcular_estatisticas, estatisticas_remotas,
+                     TIPO_TODOS, calcular_tendencia, tendencia_remota, calcular_contagens, contagens_remotas, resumir_contagens)
+from busca_lote import (ler_planilha, preparar_consultas, descrever_chave, buscar_em_lote,
+                        combinar_resultados, resumir_por_endereco, MAX_ENDERECOS)
+from cache_resultados import CacheResultados, ChaveBusca, Referencia, chave_busca
+from comparaveis import BaseComparaveis, NIVEIS_REGIAO, cep_predominante
+from consultas import buscar_paginado, paginas_busca, ler_atualizacoes
+from esquema import COLUNA_ANO, COLUNA_USO, colunas_do_perfil
+from exportacao import FORMATOS, em_blocos, exportar
+from formatacao import FORMATOS_COLUNAS, configuracao_colunas, formatar_moeda
+from metricas import REGISTRO, medir, contar, configurar_log_json, iniciar_servidor_metricas
+from paginacao import TAMANHOS_PAGINA, colunas_ordenaveis, ordenar, pagina, tamanho_pagina_padrao, total_paginas
+
+supabase = partida.resultado('conexao')
+if not supabase:
+    st.error("ERRO: Credenciais do Supabase não configuradas.")
+replica = partida.resultado('replica')
+
+# Número de páginas baixadas em paralelo
+MAX_PARALELO = int(ler_configuracao("ITBI_MAX_PARALELO", 4))
+# Consultas por segundo da busca em lote
+TAXA_LOTE = float(ler_configuracao("ITBI_LOTE_TAXA", 5))
+# Buscas mais frequentes refeitas em segundo plano quando o processo sobe
+BUSCAS_AQUECIMENTO = int(ler_configuracao("ITBI_AQUECIMENTO_BUSCAS", 20))
+
+@st.cache_resource
+def init_cache_resultados() -> CacheResultados:
+    """Cache dos resultados compartilhado por todas as sessões (e, com ITBI_CACHE_DIR, entre processos)."""
+    return CacheResultados(
+        max_bytes=int(float(ler_configuracao("ITBI_CACHE_MAX_MB", 256)) * 1024 ** 2),
+        ttl=float(ler_configuracao("ITBI_CACHE_TTL", 600)),
+        diretorio=ler_configuracao("ITBI_CACHE_DIR"),
+    )
+
+cache_resultados = init_cache_resultados()
+
+@st.cache_data(ttl=int(ler_configuracao("ITBI_ATUALIZACOES_TTL", 300)))
+def get_atualizacoes(_supabase_client) -> dict:
+    """Anos alterados pelo coletor e quando (tabela coletor_atualizacoes)."""
+    contar('st_cache_faltas', funcao='get_atualizacoes')
+    if not _supabase_client: return {}
+    try:
+        return ler_atualizacoes(_supabase_client)
+    except Exception as e:
+        logger.warning("Não foi possível ler os anos alterados pelo coletor: %s", e)
+        return {}
+
+# Resultados anteriores à última carga de um ano deixam de valer; os demais anos continuam em cache
+cache_resultados.invalidar_anos(get_atualizacoes(supabase))
+# Consultas e faltas (contadas dentro da função) dão a taxa de acerto do st.cache_data
+contar('st_cache_consultas', funcao='get_atualizacoes')
+
+@st.cache_resource
+def init_metricas():
+    """Ativa o log JSON das fases (ITBI_METRICAS_LOG) e o endpoint /metrics do Prometheus (ITBI_METRICAS_PORTA,
+    em ITBI_METRICAS_ENDERECO)."""
+    if ler_configuracao("ITBI_METRICAS_LOG"):
+        configurar_log_json()
+    porta = ler_configuracao("ITBI_METRICAS_PORTA")
+    if not porta: return None
+    try:
+        return iniciar_servidor_metricas(int(porta), medidores=lambda: {
+            f'cache_resultados_{nome}': valor for nome, valor in cache_resultados.estatisticas().items()
+        }, endereco=ler_configuracao("ITBI_METRICAS_ENDERECO") or '127.0.0.1')
+    except OSError as e:
+        logger.warning("Endpoint de métricas indisponível na porta %s: %s", porta, e)
+        return None
+
+init_metricas()
+
+def executar_busca(_supabase_client, chave: ChaveBusca, _replica=None) -> pd.DataFrame:
+    """Executa a busca na réplica local, se estiver atualizada, ou no banco de dados.
+
+    Não desenha nada na tela (pode rodar fora da thread do script); erros são levantados.
+    """
+    if _replica and _replica.esta_atualizada():
+        try:
+            with medir('busca.replica'):
+                return _replica.buscar(chave.rua, chave.cep, chave.numero, list(chave.anos), limite=LIMITE_LINHAS,
+                                       colunas=PERFIS_COLUNAS.get(chave.perfil), rua_exata=chave.rua_exata)
+        except Exception as e:
+            logger.warning("Réplica local indisponível, consultando o banco: %s", e)
+
+    if not _supabase_client:
+        raise ConnectionError("Conexão com o banco de dados falhou.")
+
+    with medir('busca.supabase'):
+        return buscar_paginado(_supabase_client, chave.rua, chave.cep, chave.numero, list(chave.anos),
+                               colunas=colunas_do_perfil(chave.perfil), limite_linhas=LIMITE_LINHAS,
+                               max_paralelo=MAX_PARALELO, rua_exata=chave.rua_exata)
+
+def executar_estatisticas(_supabase_client, chave: ChaveBusca, _replica=None) -> pd.DataFrame:
+    """Estatísticas agregadas da busca: vetorizadas sobre a réplica local ou calculadas no banco (RPC)."""
+    if _replica and _replica.esta_atualizada():
+        try:
+            with medir('estatisticas.replica'):
+                linhas = _replica.buscar(chave.rua, chave.cep, chave.numero, list(chave.anos), limite=None,
+                                         colunas=PERFIS_COLUNAS['analise'], rua_exata=chave.rua_exata)
+                return calcular_estatisticas(linhas)
+        except Exception as e:
+            logger.warning("Réplica local indisponível, consultando o banco: %s", e)
+
+    if not _supabase_client:
+        raise ConnectionError("Conexão com o banco de dados falhou.")
+
+    with medir('estatisticas.rpc'):
+        return estatisticas_remotas(_supabase_client, chave)
+
+def executar_tendencia(_supabase_client, chave: ChaveBusca, _replica=None) -> pd.DataFrame:
+    """Tendência mensal: quartis exatos sobre a réplica local ou lidos das tabelas agregadas no banco (RPC)."""
+    if _replica and _replica.esta_atualizada():
+        try:
+            with medir('tendencia.replica'):
+                linhas = _replica.buscar(chave.rua, chave.cep, None, list(chave.anos), limite=None,
+                                         colunas=PERFIS_COLUNAS['analise'], rua_exata=chave.rua_exata)
+                return calcular_tendencia(linhas)
+        except Exception as e:
+            logger.warning("Réplica local indisponível, consultando o banco: %s", e)
+
+    if not _supabase_client:
+        raise ConnectionError("Conexão com o banco de dados falhou.")
+
+    with medir('tendencia.rpc'):
+        return tendencia_remota(_supabase_client, chave)
+
+def executar_contagens(_supabase_client, chave: ChaveBusca, _replica=None) -> pd.DataFrame:
+    """Transações por ano e tipo da busca: contadas na réplica local ou no banco (RPC), sem baixar as linhas."""
+    if _replica and _replica.esta_atualizada():
+        try:
+            with medir('contagens.replica'):
+                linhas = _replica.buscar(chave.rua, chave.cep, chave.numero, list(chave.anos), limite=None,
+                                         colunas=[COLUNA_ANO, COLUNA_USO], rua_exata=chave.rua_exata)
+                return calcular_contagens(linhas)
+        except Exception as e:
+            logger.warning("Réplica local indisponível, consultando o banco: %s", e)
+
+    if not _supabase_client:
+        raise ConnectionError("Conexão com o banco de dados falhou.")
+
+    with medir('contagens.rpc'):
+        return contagens_remotas(_supabase_client, chave)
+
+def buscar_com_cache(_supabase_client, chave: ChaveBusca, _replica=None) -> pd.DataFrame:
+    """Consulta o cache compartilhado de resultados antes de executar a busca."""
+    with medir('busca.cache'):
+        resultado = cache_resultados.obter(chave)
+    if resultado is None:
+        executar = {PERFIL_ESTATISTICAS: executar_estatisticas, PERFIL_TENDENCIA: executar_tendencia,
+                    PERFIL_CONTAGENS: executar_contagens}.get(chave.perfil, executar_busca)
+        resultado = executar(_supabase_client, chave, _replica)
+        cache_resultados.guardar(chave, resultado)
+    return resultado
+
+def buscar_dados(_supabase_client, nome_rua: str = None, cep: str = None, numero: str = None, anos_selecionados: list = [],
+                 perfil: str = PERFIL_PADRAO, logradouro_exato: str = None, _replica=None) -> Referencia:
+    """Busca pela forma canônica da consulta, passando antes pelo cache compartilhado de resultados.
+
+    Devolve uma referência ao resultado compartilhado (a sessão não guarda o DataFrame), ou None se a busca falhou.
+    Se um logradouro foi escolhido nas sugestões (logradouro_exato), a busca é por igualdade.
+    Com perfil=PERFIL_ESTATISTICAS, o resultado é a tabela agregada em vez das transações; com
+    PERFIL_TENDENCIA, uma linha por mês.
+    """
+    chave = chave_busca(nome_rua, cep, numero, anos_selecionados, perfil, logradouro_exato)
+    partida.registrar_busca(chave.hash(), chave.campos())
+    try:
+        with medir('busca.total', perfil=perfil) as contexto:
+            resultado = buscar_com_cache(_supabase_client, chave, _replica)
+            contexto['linhas'] = len(resultado)
+        return cache_resultados.referenciar(chave, resultado)
+    except ConnectionError as e:
+        st.error(str(e))
+    except Exception as e:
+        st.error(f"Ocorreu um erro durante a busca: {e}")
+    return None
+
+def contar_dados(_supabase_client, nome_rua: str = None, cep: str = None, numero: str = None, anos_selecionados: list = [],
+                 logradouro_exato: str = None, _replica=None) -> dict:
+    """Total real da busca e contagens por ano e tipo (resumir_contagens), ou None se não foi possível contar.
+
+    As contagens ignoram o filtro de anos, para que a lista de anos mostre todos; o total soma os escolhidos.
+    Não desenha nada na tela: roda em paralelo com a busca.
+    """
+    chave = chave_busca(nome_rua, cep, numero, [], PERFIL_CONTAGENS, logradouro_exato)
+    try:
+        with medir('contagens.total'):
+            return resumir_contagens(buscar_com_cache(_supabase_client, chave, _replica), anos_selecionados)
+    except Exception as e:
+        logger.warning("Não foi possível contar os resultados da busca: %s", e)
+        return None
+
+def localizar_imovel(_supabase_client, nome_rua: str = None, cep: str = None, numero: str = None,
+                     logradouro_exato: str = None, _replica=None):
+    """CEP do imóvel: o informado ou o mais frequente nas transações do logradouro (e do número, se houver)."""
+    canonico = canonizar_cep(cep)
+    if canonico: return intervalo_cep(canonico)[0]
+    transacoes = buscar_com_cache(_supabase_client, chave_busca(nome_rua, logradouro_exato=logradouro_exato,
+                                                                 perfil=PERFIL_PADRAO), _replica)
+    return cep_predominante(transacoes, numero)
+
+def buscar_comparaveis(_supabase_client, cep: int, quantidade: int, _replica=None, **atributos) -> pd.DataFrame:
+    """Comparáveis no snapshot da réplica ou, sem ele, nas transações do setor (e da sub-região) do imóvel.
+
+    Sem a réplica, as regiões são buscas comuns por prefixo de CEP e passam pelo cache de resultados.
+    """
+    base = partida.resultado('comparaveis', esperar=False)
+    if base is not None:
+        with medir('comparaveis.snapshot'):
+            return base.buscar(cep, quantidade=quantidade, **atributos)
+    with medir('comparaveis.regiao'):
+        for digitos in NIVEIS_REGIAO[:2]:
+            regiao = buscar_com_cache(_supabase_client, chave_busca(cep=f'{cep:08d}'[:digitos], perfil='analise'), _replica)
+            comparaveis = BaseComparaveis(regiao).buscar(cep, quantidade=quantidade, **atributos)
+            if len(comparaveis) >= quantidade: break
+    return comparaveis
+
+def paginas_exportacao(_supabase_client, chave: ChaveBusca, resultado: pd.DataFrame, _replica=None):
+    """Páginas do resultado completo da busca, sem o teto de LIMITE_LINHAS.
+
+    Um resultado que não foi truncado já está inteiro em memória; senão as páginas vêm da réplica
+    local, se atualizada, ou do banco, uma de cada vez.
+    """
+    if not resultado.attrs.get('truncado'):
+        return em_blocos(resultado)
+    if _replica and _replica.esta_atualizada():
+        return em_blocos(_replica.buscar(chave.rua, chave.cep, chave.numero, list(chave.anos), limite=None,
+                                         colunas=PERFIS_COLUNAS.get(chave.perfil), rua_exata=chave.rua_exata))
+    if not _supabase_client:
+        raise ConnectionError("Conexão com o banco de dados falhou.")
+    return paginas_busca(_supabase_client, chave.rua, chave.cep, chave.numero, list(chave.anos),
+                         colunas=colunas_do_perfil(chave.perfil), rua_exata=chave.rua_exata)
+
+# Arquivos exportados ficam numa pasta temporária do processo e são apagados depois de uma hora
+PASTA_EXPORTACOES = os.path.join(tempfile.gettempdir(), 'itbi_exportacoes')
+
+def exportar_resultado(referencia: Referencia, formato: str, formatar: bool, ao_progredir=None) -> tuple:
+    """Grava o resultado completo da busca em um arquivo temporário e devolve (caminho, linhas)."""
+    os.makedirs(PASTA_EXPORTACOES, exist_ok=True)
+    for nome in os.listdir(PASTA_EXPORTACOES):
+        caminho = os.path.join(PASTA_EXPORTACOES, nome)
+        if time.time() - os.path.getmtime(caminho) > 3600:
+            os.remove(caminho)
+    descritor, caminho = tempfile.mkstemp(suffix=f'.{formato}', dir=PASTA_EXPORTACOES)
+    os.close(descritor)
+    with medir('exportacao', formato=formato) as contexto:
+        paginas = paginas_exportacao(supabase, referencia.chave, referencia.df, replica)
+        contexto['linhas'] = exportar(paginas, formato, caminho, formatar=formatar, ao_progredir=ao_progredir)
+    return caminho, contexto['linhas']
+
+def aquecer_buscas_populares(quantidade: int) -> int:
+    """Refaz as buscas mais frequentes das execuções anteriores para deixá-las no cache de resultados."""
+    aquecidas = 0
+    for campos in partida.buscas_populares(quantidade):
+        try:
+            with medir('partida.aquecimento'):
+                buscar_com_cache(supabase, ChaveBusca.de_campos(campos), replica)
+            aquecidas += 1
+        except Exception as e:
+            logger.warning("Falha ao aquecer a busca %s: %s", campos, e)
+    return aquecidas
+
+def fragmento(funcao):
+    """st.fragment quando disponível: os widgets da função redesenham só ela, sem rodar a página inteira."""
+    return st.fragment(funcao) if hasattr(st, 'fragment') else funcao
+
+def agente_usuario() -> str:
+    """User-Agent do navegador da sessão (vazio em versões do Streamlit sem st.context)."""
+    try:
+        return st.context.headers.get('User-Agent') or ''
+    except AttributeError:
+        return ''
+
+@fragmento
+def exibir_grade(referencia: Referencia, posicoes_refino=None):
+    """Grade paginada do resultado: ordena no servidor e envia ao navegador só as linhas da página.
+
+    As posições já ordenadas (do resultado inteiro ou do refino) ficam no session_state: trocar de
+    página só fatia o resultado, sem refazer a busca, o refino, a ordenação ou a formatação.
+    """
+    df = referencia.df
+    col_ordem, col_sentido, col_tamanho = st.columns([2, 1, 1])
+    with col_ordem:
+        coluna_ordem = st.selectbox(
+            "Ordenar por", options=[None] + colunas_ordenaveis(df), key="grade_ordem",
+            format_func=lambda c: "Mais recentes" if c is None else FORMATOS_COLUNAS.get(c, (None, c))[1]
+        )
+    with col_sentido:
+        decrescente = st.radio("Ordem", ["Maior primeiro", "Menor primeiro"], key="grade_sentido",
+                               horizontal=True, disabled=coluna_ordem is None) == "Maior primeiro"
+    with col_tamanho:
+        tamanho = st.selectbox("Linhas por página", TAMANHOS_PAGINA, key="grade_tamanho",
+                               index=TAMANHOS_PAGINA.index(tamanho_pagina_padrao(agente_usuario())))
+
+    refino = None if posicoes_refino is None else hash(posicoes_refino.tobytes())
+    assinatura = (referencia.chave, id(df), refino, coluna_ordem, decrescente)
+    estado = st.session_state.get('grade_resultados')
+    if not estado or estado[0] != assinatura:
+        with medir('exibicao.ordenacao', linhas=len(df)):
+            estado = (assinatura, ordenar(df, coluna_ordem, decrescente, posicoes_refino))
+        st.session_state['grade_resultados'] = estado
+        st.session_state['grade_pagina'] = 1
+    posicoes = estado[1]
+    paginas = total_paginas(len(posicoes), tamanho)
+    numero = min(st.session_state.get('grade_pagina', 1), paginas)
+    st.session_state['grade_pagina'] = numero
+
+    with medir('exibicao.dataframe', linhas=min(tamanho, len(posicoes))):
+        st.dataframe(pagina(df, posicoes, numero, tamanho), use_container_width=True,
+                     column_config=configuracao_colunas(df.columns))
+    col_pagina, col_linhas = st.columns([1, 2])
+    with col_pagina:
+        st.number_input("Página", min_value=1, max_value=paginas, step=1, key="grade_pagina")
+    with col_linhas:
+        inicio = (numero - 1) * tamanho
+        st.caption(f"Página {formatar_milhar(numero)} de {formatar_milhar(paginas)}: linhas "
+                   f"{formatar_milhar(inicio + 1 if posicoes.size else 0)} a {formatar_milhar(min(inicio + tamanho, len(posicoes)))} "
+                   f"de {formatar_milhar(len(posicoes))}.")
+
+# Uma vez por processo (a tarefa não é registrada de novo nos reruns)
+if supabase and BUSCAS_AQUECIMENTO:
+    partida.tarefa('aquecimento', lambda: aquecer_buscas_populares(BUSCAS_AQUECIMENTO))
+
+# --- 4. RESULTADOS ---
+
+# Lógica para executar a busca quando o botão for clicado
+if buscar_btn:
+    if cep_invalido:
+        st.warning("Corrija o CEP para iniciar a busca.")
+    elif nome_rua_input or cep_input:
+        if modo_resultado == "Estatísticas":
+            with st.spinner("Calculando estatísticas..."):
+                st.session_state['estatisticas_busca'] = buscar_dados(supabase, nome_rua_input, cep_input, numero_input, anos_selecionados,
+                                                                      perfil=PERFIL_ESTATISTICAS, logradouro_exato=logradouro_escolhido,
+                                                                      _replica=replica)
+                st.session_state.pop('resultados_busca', None)
+                st.session_state.pop('tendencia_busca', None)
+        elif modo_resultado == "Tendência":
+            with st.spinner("Carregando tendência..."):
+                # As tabelas agregadas são por logradouro ou por CEP: o número não entra, e o CEP tem precedência
+                st.session_state['tendencia_busca'] = buscar_dados(supabase, None if cep_input else nome_rua_input, cep_input, None,
+                                                                   anos_selecionados, perfil=PERFIL_TENDENCIA,
+                                                                   logradouro_exato=None if cep_input else logradouro_escolhido,
+                                                                   _replica=replica)
+                st.session_state.pop('resultados_busca', None)
+                st.session_state.pop('estatisticas_busca', None)
+        else:
+            with st.spinner("Buscando dados no banco..."), ThreadPoolExecutor(max_workers=1) as executor:
+                # As contagens (total real, por ano e por tipo) são calculadas junto com a busca
+                futuro_contagens = executor.submit(contar_dados, supabase, nome_rua_input, cep_input, numero_input, anos_selecionados,
+                                                   logradouro_escolhido, replica)
+                st.session_state['resultados_busca'] = buscar_dados(supabase, nome_rua_input, cep_input, numero_input, anos_selecionados,
+                                                                      perfil=perfil_colunas, logradouro_exato=logradouro_escolhido,
+                                                                      _replica=replica)
+                st.session_state['contagens_busca'] = ((nome_rua_input, cep_input, numero_input, logradouro_escolhido),
+                                                       futuro_contagens.result())
+                if st.session_state['resultados_busca']:
+                    with medir('refino.indice'):
+                        st.session_state['resultados_busca'].indice_refino()
+                st.session_state.pop('estatisticas_busca', None)
+                st.session_state.pop('tendencia_busca', None)
+        st.session_state['last_search_executed'] = True
+        st.session_state.pop('exportacao', None)  # o arquivo da busca anterior é apagado com a pasta temporária
+        if modo_resultado != "Transações": st.session_state.pop('contagens_busca', None)
+    else:
+        st.warning("Por favor, preencha o 'Nome do Logradouro' ou o 'CEP' para iniciar a busca.")
+        st.session_state['last_search_executed'] = False
+
+
+# Lógica da busca em lote
+if buscar_lote_btn and arquivo_lote is not None:
+    try:
+        chaves_lote = preparar_consultas(ler_planilha(arquivo_lote, arquivo_lote.name), anos_selecionados)
+    except Exception as e:
+        st.error(f"Não foi possível ler a planilha: {e}")
+        chaves_lote = []
+    if len(chaves_lote) > MAX_ENDERECOS:
+        st.warning(f"A planilha tem {len(chaves_lote)} endereços distintos; apenas os {MAX_ENDERECOS} primeiros serão buscados.")
+        chaves_lote = chaves_lote[:MAX_ENDERECOS]
+    if chaves_lote:
+        resultados_lote, falhas_lote = {}, []
+        progresso = st.progress(0.0, text="Buscando endereços...")
+        consultas = buscar_em_lote(lambda chave: buscar_com_cache(supabase, chave, replica), chaves_lote,
+                                   max_paralelo=MAX_PARALELO, por_segundo=TAXA_LOTE)
+        for concluidas, (chave, resultado, erro) in enumerate(consultas, 1):
+            resultados_lote[descrever_chave(chave)] = resultado
+            if erro: falhas_lote.append(f"{descrever_chave(chave)}: {erro}")
+            progresso.progress(concluidas / len(chaves_lote), text=f"{concluidas} de {len(chaves_lote)} endereços")
+        progresso.empty()
+        combinado = combinar_resultados(resultados_lote)
+        st.session_state['resultados_lote'] = (combinado, resumir_por_endereco(combinado, [descrever_chave(c) for c in chaves_lote]))
+        if falhas_lote:
+            st.warning("Falha em alguns endereços:\n\n" + "\n\n".join(falhas_lote[:10]))
+
+# Lógica dos comparáveis
+if buscar_comparaveis_btn:
+    if cep_invalido:
+        st.warning("Corrija o CEP para procurar comparáveis.")
+    elif nome_rua_input or cep_input:
+        with st.spinner("Procurando comparáveis..."):
+            try:
+                cep_imovel = localizar_imovel(supabase, nome_rua_input, cep_input, numero_input, logradouro_escolhido, replica)
+                if cep_imovel is None:
+                    st.warning("Não foi possível localizar o CEP do endereço informado; tente buscar pelo CEP.")
+                else:
+                    comparaveis = buscar_comparaveis(supabase, cep_imovel, quantidade_comparaveis, replica,
+                                                     area=area_comparaveis or None, terreno=terreno_comparaveis or None,
+                                                     ano=ano_comparaveis, uso=uso_comparaveis or None)
+                    st.session_state['comparaveis'] = (descrever_cep(f'{cep_imovel:08d}'), comparaveis)
+            except Exception as e:
+                st.error(f"Ocorreu um erro ao buscar comparáveis: {e}")
+    else:
+        st.warning("Por favor, preencha o 'Nome do Logradouro' ou o 'CEP' do imóvel para buscar comparáveis.")
+
+if 'comparaveis' in st.session_state:
+    cep_comparaveis, comparaveis = st.session_state['comparaveis']
+    st.header("🏘️ Comparáveis")
+    if comparaveis.empty:
+        st.info("Nenhuma transação comparável encontrada.")
+    else:
+        resumo_comparaveis = f"**{len(comparaveis)}** transações comparáveis ao imóvel do CEP {cep_comparaveis}"
+        if 'valor_m2' in comparaveis.columns and comparaveis['valor_m2'].notna().any():
+            resumo_comparaveis += f", valor mediano por m² de **{formatar_moeda(pd.Series([comparaveis['valor_m2'].median()])).iloc[0]}**"
+        st.info(resumo_comparaveis + ". Quanto menor a distância, mais parecida a transação.")
+        st.dataframe(comparaveis, use_container_width=True, hide_index=True, column_config=configuracao_colunas(comparaveis.columns))
+    st.divider()
+
+if 'resultados_lote' in st.session_state:
+    combinado_lote, resumo_lote = st.session_state['resultados_lote']
+    st.header("📁 Resultados do Lote")
+    st.info(f"**{len(resumo_lote)}** endereços consultados, **{len(combinado_lote)}** transações encontradas.")
+    st.dataframe(resumo_lote, use_container_width=True, hide_index=True, column_config=configuracao_colunas(resumo_lote.columns))
+    with st.expander("Todas as transações do lote"):
+        st.dataframe(combinado_lote, use_container_width=True, column_config=configuracao_colunas(combinado_lote.columns))
+    st.divider()
+
+# Seção de Estatísticas
+if 'estatisticas_busca' in st.session_state:
+    referencia_estatisticas = st.session_state['estatisticas_busca']
+    estatisticas = referencia_estatisticas.df if referencia_estatisticas else pd.DataFrame()
+
+    if not estatisticas.empty:
+        st.header("📈 Estatísticas da Busca")
+        por_ano = estatisticas[estatisticas['tipo'] == TIPO_TODOS]
+        st.info(f"Estatísticas calculadas sobre **{int(por_ano['transacoes'].sum())}** transações.")
+        st.bar_chart(por_ano.set_index('ano_transacao')['valor_mediano'], y_label="Valor mediano (R$)")
+        st.dataframe(estatisticas, use_container_width=True, hide_index=True, column_config=configuracao_colunas(estatisticas.columns))
+    elif st.session_state.get('last_search_executed', False):
+        st.info("Nenhum resultado encontrado para os filtros informados.")
+
+# Seção de Tendência
+if 'tendencia_busca' in st.session_state:
+    referencia_tendencia = st.session_state['tendencia_busca']
+    tendencia = referencia_tendencia.df if referencia_tendencia else pd.DataFrame()
+
+    if not tendencia.empty:
+        st.header("📉 Tendência de Preços")
+        aviso = (" Mais de um logradouro ou CEP entrou em algum mês: os percentis são a média deles, ponderada pelo número de transações."
+                 if (tendencia['grupos'] > 1).any() else "")
+        st.info(f"**{int(tendencia['transacoes'].sum())}** transações em **{len(tendencia)}** meses.{aviso}")
+        mensal = tendencia.set_index(pd.to_datetime(pd.DataFrame({'year': tendencia['ano_transacao'], 'month': tendencia['mes'], 'day': 1})))
+        st.line_chart(mensal[['valor_m2_p25', 'valor_m2_mediano', 'valor_m2_p75']], y_label="Valor por m² (R$)")
+        st.line_chart(mensal['transacoes'], y_label="Transações por mês")
+        st.dataframe(tendencia, use_container_width=True, hide_index=True, column_config=configuracao_colunas(tendencia.columns))
+    elif st.session_state.get('last_search_executed', False):
+        st.info("Nenhum resultado encontrado para os filtros informados.")
+
+# Seção de Resultados
+if 'resultados_busca' in st.session_state:
+    # A sessão guarda só a referência; o DataFrame e o índice de refino são os do cache, compartilhados
+    referencia_resultados = st.session_state['resultados_busca']
+    resultados_iniciais = referencia_resultados.df if referencia_resultados else pd.DataFrame()
+    
+    if not resultados_iniciais.empty:
+        st.header("📊 Resultados da Busca")
+        contagens = (st.session_state.get('contagens_busca') or (None, None))[1]
+        if contagens and contagens['total']:
+            total_busca = contagens['total']
+            texto = f"Busca encontrou {'cerca de ' if contagens['estimado'] else ''}**{formatar_milhar(total_busca)}** resultados"
+            anos_busca = list(referencia_resultados.chave.anos) or list(contagens['por_ano'])
+            detalhes = [f"{formatar_milhar(contagens['por_ano'][ano])} em {ano}" for ano in anos_busca if ano in contagens['por_ano']][:3]
+            detalhes += [f"{formatar_milhar(total)} {tipo.lower()}" for tipo, total in list(contagens['por_tipo'].items())[:2]]
+            texto += f" ({', '.join(detalhes)})." if detalhes else "."
+            if resultados_iniciais.attrs.get('truncado'):
+                texto += f" Exibindo os {formatar_milhar(len(resultados_iniciais))} mais recentes; escolha anos acima para reduzir a busca."
+            st.info(texto)
+        elif resultados_iniciais.attrs.get('truncado'):
+            st.info(f"Busca encontrou **{len(resultados_iniciais)}** resultados (limitado aos {LIMITE_LINHAS} mais recentes).")
+        else:
+            st.info(f"Busca encontrou **{len(resultados_iniciais)}** resultados.")
+        
+        # Filtro Adicional
+        st.markdown("###### Refine sua busca:")
+        
+        colunas_disponiveis = sorted(resultados_iniciais.columns)
+        colunas_para_filtrar = st.multiselect("Filtrar por coluna(s):", options=colunas_disponiveis)
+        
+        filtros_refino = {}
+        for coluna in colunas_para_filtrar:
+            filtros_refino[coluna] = st.text_input(f"{coluna} contendo:", placeholder="Digite para filtrar...", key=f"refino_{coluna}")
+
+        posicoes_refino = None
+        if any(filtros_refino.values()):
+            try:
+                with medir('refino.indice'):
+                    indice_refino = referencia_resultados.indice_refino()
+                with medir('refino.filtro'):
+                    # Só as posições filtradas são calculadas; a grade copia apenas as linhas da página
+                    posicoes_refino = indice_refino.posicoes(filtros_refino)
+            except Exception as e:
+                st.error(f"Erro ao aplicar filtro: {e}")
+
+        # Grade paginada (a formatação é feita pelo column_config, sem copiar os dados)
+        exibir_grade(referencia_resultados, posicoes_refino)
+
+        # Exportação do conjunto completo (sem o teto de linhas da tela e sem o refino)
+        with st.expander("⬇️ Exportar resultado completo"):
+            if contagens and contagens['total'] > len(resultados_iniciais):
+                st.warning(f"O arquivo terá {'cerca de ' if contagens['estimado'] else ''}{formatar_milhar(contagens['total'])} linhas, "
+                           "lidas do banco página por página: a exportação pode levar alguns minutos.")
+            col_formato, col_moeda = st.columns(2)
+            with col_formato:
+                formato_exportacao = st.selectbox("Formato", options=list(FORMATOS), format_func=lambda f: FORMATOS[f][0])
+            with col_moeda:
+                formatar_exportacao = st.checkbox(
+                    "Formatar valores (R$, m², %)",
+                    disabled=formato_exportacao == 'parquet',
+                    help="No CSV os valores viram texto no padrão brasileiro; no Excel continuam numéricos, só com o formato de exibição."
+                )
+            if st.button("Preparar arquivo", use_container_width=True):
+                progresso = st.progress(0.0, text="Exportando...")
+                try:
+                    # Total real da busca (contagens): o resultado em tela pode estar limitado pelo teto de linhas
+                    total = max(contagens['total'] if contagens else 0, len(resultados_iniciais))
+                    caminho, linhas = exportar_resultado(
+                        referencia_resultados, formato_exportacao, formatar_exportacao,
+                        ao_progredir=lambda linhas: progresso.progress(
+                            min(1.0, linhas / total) if total else 0.0,
+                            text=f"{formatar_milhar(linhas)} de {'cerca de ' if contagens and contagens['estimado'] else ''}"
+                                 f"{formatar_milhar(total)} linhas exportadas")
+                    )
+                    anterior = st.session_state.get('exportacao')
+                    if anterior and os.path.exists(anterior[0]): os.remove(anterior[0])
+                    st.session_state['exportacao'] = (caminho, formato_exportacao, linhas)
+                except Exception as e:
+                    st.error(f"Não foi possível exportar: {e}")
+                progresso.empty()
+            if st.session_state.get('exportacao') and os.path.exists(st.session_state['exportacao'][0]):
+                caminho, formato, linhas = st.session_state['exportacao']
+                with open(caminho, 'rb') as arquivo:
+                    st.download_button(
+                        f"Baixar {FORMATOS[formato][0]} ({linhas} linhas)",
+                        data=arquivo,
+                        file_name=f"itbi_{time.strftime('%Y%m%d_%H%M%S')}.{formato}",
+                        mime=FORMATOS[formato][1],
+                        use_container_width=True
+                    )
+
+    elif st.session_state.get('last_search_executed', False):
+        st.info("Nenhum resultado encontrado para os filtros informados.")
+
+elif 'estatisticas_busca' not in st.session_state and 'tendencia_busca' not in st.session_state:
+    st.info("Utilize os filtros acima para iniciar sua análise.")
+
+# --- 5. PAINEL DE DIAGNÓSTICO (SOMENTE ADMINISTRADORES) ---
+
+# Aberto com ?admin=<ITBI_ADMIN_TOKEN> na URL
+token_admin = ler_configuracao("ITBI_ADMIN_TOKEN")
+if token_admin and hmac.compare_digest(str(st.query_params.get("admin", "")), str(token_admin)):
+    with st.expander("🛠️ Diagnóstico"):
+        st.markdown("**Duração por fase** (amostras recentes deste processo)")
+        st.dataframe(pd.DataFrame(REGISTRO.resumo()), use_container_width=True, hide_index=True)
+        st.markdown("**Contadores**")
+        st.dataframe(pd.DataFrame(REGISTRO.contadores()), use_container_width=True, hide_index=True)
+        st.markdown("**Cache de resultados**")
+        st.json(cache_resultados.estatisticas())
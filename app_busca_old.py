@@ -6,6 +6,7 @@ from supabase import create_client, Client
 import os
 from dotenv import load_dotenv
 import unicodedata
+from sessao import GerenciadorSessoes
 
 # Carrega variáveis de ambiente do arquivo .env (APENAS PARA TESTE LOCAL)
 load_dotenv()
@@ -32,6 +33,32 @@ def init_supabase_connection() -> Client:
 
 supabase = init_supabase_connection()
 
+@st.cache_resource
+def init_gerenciador_sessoes() -> GerenciadorSessoes:
+    """Sessões validadas localmente, com renovação em segundo plano e um cliente por usuário."""
+    try:
+        supabase_url = st.secrets["SUPABASE_URL"]
+        supabase_key = st.secrets["SUPABASE_KEY"]
+        segredo_jwt = st.secrets.get("SUPABASE_JWT_SECRET")
+    except (KeyError, FileNotFoundError):
+        supabase_url = os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_KEY")
+        segredo_jwt = os.getenv("SUPABASE_JWT_SECRET")
+
+    if not supabase_url or not supabase_key:
+        return None
+
+    return GerenciadorSessoes(supabase_url, supabase_key, segredo_jwt)
+
+gerenciador_sessoes = init_gerenciador_sessoes()
+
+def cliente_da_sessao() -> Client:
+    """Cliente do usuário logado (consultas com o token dele) ou, sem sessão, o cliente anônimo compartilhado."""
+    sessao = st.session_state.get('sessao')
+    if gerenciador_sessoes and sessao and st.session_state.get('authenticated'):
+        return gerenciador_sessoes.pool.cliente(sessao)
+    return supabase
+
 # --- 2. FUNÇÕES DE BUSCA E NORMALIZAÇÃO ---
 
 def normalizar_busca(texto_busca: str) -> str:
@@ -71,13 +98,14 @@ def get_anos_disponiveis() -> list:
 
 def buscar_dados(nome_rua: str, numero: str = None, anos_selecionados: list = []):
     """Executa a busca no banco de dados, usando a busca normalizada."""
-    if not supabase:
+    cliente = cliente_da_sessao()
+    if not cliente:
         st.error("Conexão com o banco de dados falhou.")
         return pd.DataFrame()
 
     rua_normalizada = normalizar_busca(nome_rua)
 
-    query = supabase.table('transacoes_imobiliarias').select('*')
+    query = cliente.table('transacoes_imobiliarias').select('*')
     
     if anos_selecionados:
         query = query.in_('ano_transacao', anos_selecionados)
@@ -174,67 +202,53 @@ if 'resultados_busca' in st.session_state:
 # --- 4. SISTEMA DE AUTENTICAÇÃO ---
 
 def check_user_session():
-    """Verifica e processa a sessão do usuário."""
+    """Verifica e processa a sessão do usuário.
+
+    A sessão fica em st.session_state (uma por navegador) e o token é conferido localmente,
+    sem chamadas ao Supabase a cada rerun; a renovação acontece em segundo plano.
+    """
     query_params = dict(st.query_params)
     
     # Processar callback do Google OAuth
-    if "access_token" in query_params:
-        access_token = query_params["access_token"]
-        refresh_token = query_params.get("refresh_token", "")
-        
+    if "access_token" in query_params and gerenciador_sessoes:
         try:
-            # Definir a sessão no Supabase
-            if refresh_token:
-                session_response = supabase.auth.set_session(access_token, refresh_token)
-            else:
-                session_response = supabase.auth.get_user(access_token)
-            
-            if session_response and session_response.user:
-                st.session_state.user = session_response.user.dict()
-                st.session_state.authenticated = True
-                st.query_params.clear()
-                st.success("✅ Login realizado com sucesso!")
-                st.rerun()
-                return True
+            sessao = gerenciador_sessoes.de_tokens(query_params["access_token"], query_params.get("refresh_token", ""))
+            st.session_state.sessao = sessao
+            st.session_state.user = sessao.usuario
+            st.session_state.authenticated = True
+            st.query_params.clear()
+            st.success("✅ Login realizado com sucesso!")
+            st.rerun()
+            return True
                 
         except Exception as e:
             st.error(f"❌ Erro ao processar login: {e}")
     
     # Verificar sessão existente
-    try:
-        session = supabase.auth.get_session()
-        if session and session.user:
-            if 'user' not in st.session_state:
-                st.session_state.user = session.user.dict()
-                st.session_state.authenticated = True
-            return True
-        else:
-            st.session_state.user = None
-            st.session_state.authenticated = False
-            return False
-    except Exception as e:
-        st.session_state.user = None
-        st.session_state.authenticated = False
-        return False
+    sessao = st.session_state.get('sessao')
+    if gerenciador_sessoes and gerenciador_sessoes.validar(sessao):
+        st.session_state.user = sessao.usuario
+        st.session_state.authenticated = True
+        return True
+    st.session_state.sessao = None
+    st.session_state.user = None
+    st.session_state.authenticated = False
+    return False
 
 def login_com_email_senha(email, password):
     """Faz login com email e senha."""
     try:
-        response = supabase.auth.sign_in_with_password({
-            "email": email,
-            "password": password
-        })
-        
-        if response.user:
-            st.session_state.user = response.user.dict()
-            st.session_state.authenticated = True
-            st.success("✅ Login realizado com sucesso!")
-            st.rerun()
-            return True
-        else:
-            st.error("❌ Credenciais inválidas")
-            return False
+        sessao = gerenciador_sessoes.entrar_com_senha(email, password)
+        st.session_state.sessao = sessao
+        st.session_state.user = sessao.usuario
+        st.session_state.authenticated = True
+        st.success("✅ Login realizado com sucesso!")
+        st.rerun()
+        return True
             
+    except ValueError:
+        st.error("❌ Credenciais inválidas")
+        return False
     except Exception as e:
         st.error(f"❌ Erro no login: {e}")
         return False
@@ -242,7 +256,8 @@ def login_com_email_senha(email, password):
 def cadastrar_usuario(email, password, nome):
     """Cadastra um novo usuário."""
     try:
-        response = supabase.auth.sign_up({
+        # Cliente sem estado próprio: o cadastro não deixa sessão em um cliente compartilhado
+        response = gerenciador_sessoes.pool.novo_cliente().auth.sign_up({
             "email": email,
             "password": password,
             "options": {
@@ -266,7 +281,9 @@ def cadastrar_usuario(email, password, nome):
 def logout_usuario():
     """Faz logout do usuário."""
     try:
-        supabase.auth.sign_out()
+        if st.session_state.get('sessao'):
+            gerenciador_sessoes.encerrar(st.session_state.sessao)
+        st.session_state.sessao = None
         st.session_state.user = None
         st.session_state.authenticated = False
         st.success("✅ Logout realizado com sucesso!")
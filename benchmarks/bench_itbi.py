@@ -0,0 +1,148 @@
+# benchmarks/bench_itbi.py
+"""Benchmarks reprodutíveis das etapas da busca, sem acesso ao Supabase.
+
+Uso (na raiz do projeto):
+
+    python -m benchmarks.bench_itbi --linhas 1000,100000,1000000 --saida bench.json
+
+O resultado é um JSON com a mediana de cada medição, para comparar entre commits.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+from benchmarks.postgrest_falso import ClienteFalso, gerar_transacoes, para_json
+from cache_resultados import CacheResultados, chave_busca
+from comparaveis import BaseComparaveis
+from consultas import LIMITE_LINHAS, MAX_PARALELO, buscar_paginado
+from esquema import COLUNA_CEP, COLUNA_LOGRADOURO, COLUNA_VALOR, compactar_tipos, colunas_do_perfil
+from formatacao import formatar_moeda
+from indice_refino import IndiceRefino
+from normalizacao import normalizar_busca, normalizar_logradouro, normalizar_logradouros
+
+ENTRADAS_NORMALIZACAO = ['Rua Augusta', 'Avenida Paulista', 'Praça da Sé', 'travessa São José', 'AL. SANTOS', 'Estrada do M\'Boi Mirim']
+
+
+def medir(funcao, repeticoes: int) -> dict:
+    """Executa a função `repeticoes` vezes e devolve mediana, mínimo e máximo em segundos."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return {'mediana_s': statistics.median(tempos), 'min_s': min(tempos), 'max_s': max(tempos), 'repeticoes': repeticoes}
+
+
+def _formatar_com_lambda(serie: pd.Series) -> pd.Series:
+    """Formatação de moeda antiga (uma lambda por linha), mantida como referência."""
+    return pd.to_numeric(serie, errors='coerce').apply(
+        lambda x: f'R$ {x:,.2f}'.replace(",", "X").replace(".", ",").replace("X", ".") if pd.notnull(x) else "N/A"
+    )
+
+
+def buscar_dados(cliente, cache: CacheResultados, nome_rua: str = None, logradouro_exato: str = None,
+                 perfil: str = 'listagem'):
+    """Mesmo caminho de app_busca.buscar_dados, que roda dentro do script do Streamlit e não pode ser importado:
+    chave canônica, cache compartilhado, busca paginada no banco, referência da sessão e índice de refino.
+    """
+    chave = chave_busca(nome_rua, perfil=perfil, logradouro_exato=logradouro_exato)
+    resultado = cache.obter(chave)
+    if resultado is None:
+        resultado = buscar_paginado(cliente, chave.rua, chave.cep, chave.numero, list(chave.anos),
+                                    colunas=colunas_do_perfil(chave.perfil), limite_linhas=LIMITE_LINHAS,
+                                    max_paralelo=MAX_PARALELO, rua_exata=chave.rua_exata)
+        cache.guardar(chave, resultado)
+    referencia = cache.referenciar(chave, resultado)
+    referencia.indice_refino()
+    return referencia
+
+
+def executar(linhas: int, repeticoes: int, latencia: float) -> list:
+    tabela = gerar_transacoes(linhas)
+    cliente = ClienteFalso(tabela, latencia=latencia)
+    rua_movimentada = tabela[COLUNA_LOGRADOURO].value_counts().index[0]
+    resultados = []
+
+    def registrar(nome, funcao, **extra):
+        resultado = {'nome': nome, 'linhas': linhas, **medir(funcao, repeticoes), **extra}
+        resultados.append(resultado)
+        print(f"{nome:<40} {linhas:>9} linhas  {resultado['mediana_s'] * 1000:10.2f} ms", file=sys.stderr)
+
+    entradas = ENTRADAS_NORMALIZACAO * 1000
+    registrar('normalizar_busca', lambda: [normalizar_busca(t) for t in entradas], chamadas=len(entradas))
+    # Como no coletor: cada logradouro distinto do bloco é normalizado uma vez (sem o cache de execuções anteriores)
+    registrar('normalizar_logradouros (coluna)', lambda: (normalizar_logradouro.cache_clear(),
+                                                          normalizar_logradouros(tabela[COLUNA_LOGRADOURO])))
+
+    # Busca completa como na aplicação: sem cache (um cache novo a cada repetição) e com o resultado em cache
+    registrar('buscar_dados (rua movimentada)', lambda: buscar_dados(
+        cliente, CacheResultados(), logradouro_exato=rua_movimentada))
+    registrar('buscar_dados (logradouro_norm)', lambda: buscar_dados(cliente, CacheResultados(), 'augusta'))
+    cache = CacheResultados()
+    buscar_dados(cliente, cache, 'augusta')
+    registrar('buscar_dados (em cache)', lambda: buscar_dados(cliente, cache, 'augusta'))
+
+    registros = para_json(tabela.head(min(linhas, 100000)))
+    registrar('construcao DataFrame', lambda: pd.DataFrame(registros), registros=len(registros))
+    registrar('construcao DataFrame + compactar_tipos', lambda: compactar_tipos(pd.DataFrame(registros)), registros=len(registros))
+
+    resultado = compactar_tipos(tabela.copy())
+    registrar('refino antigo (astype(str).contains)', lambda: resultado[
+        resultado[COLUNA_LOGRADOURO].astype(str).str.contains('augusta', case=False, na=False)])
+    indice = IndiceRefino(resultado)
+    registrar('refino IndiceRefino (criacao)', lambda: IndiceRefino(resultado))
+    registrar('refino IndiceRefino (filtro)', lambda: indice.filtrar(resultado, {COLUNA_LOGRADOURO: 'augusta', 'numero': '12'}))
+
+    base = BaseComparaveis(resultado)
+    cep_alvo = int(resultado[COLUNA_CEP].iloc[0])
+    registrar('comparaveis (snapshot)', lambda: BaseComparaveis(resultado))
+    registrar('comparaveis (busca)', lambda: base.buscar(cep_alvo, area=80, ano=2024, uso='Residencial vertical'))
+
+    registrar('moeda antiga (lambda por linha)', lambda: _formatar_com_lambda(resultado[COLUNA_VALOR]))
+    registrar('moeda formatar_moeda', lambda: formatar_moeda(resultado[COLUNA_VALOR]))
+    return resultados
+
+
+def _commit_atual() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', default='1000,100000,1000000', help="Tamanhos da tabela, separados por vírgula.")
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="Latência simulada por requisição.")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: saída padrão).")
+    args = parser.parse_args(argv)
+
+    relatorio = {
+        'commit': _commit_atual(),
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'latencia_ms': args.latencia_ms,
+        'resultados': [],
+    }
+    for linhas in (int(n) for n in args.linhas.split(',')):
+        relatorio['resultados'].extend(executar(linhas, args.repeticoes, args.latencia_ms / 1000))
+
+    texto = json.dumps(relatorio, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(texto)
+    else:
+        print(texto)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# benchmarks/postgrest_falso.py
+"""Substituto em memória do cliente Supabase/PostgREST, para medir a aplicação sem rede."""
+
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from esquema import TABELA, COLUNA_ID, COLUNA_ANO, COLUNA_LOGRADOURO, COLUNA_LOGRADOURO_NORM, COLUNA_CEP, COLUNA_VALOR
+from normalizacao import normalizar_logradouro
+
+MAX_LINHAS = 1000  # mesmo limite padrão de linhas por resposta do PostgREST
+
+
+def gerar_transacoes(linhas: int, semente: int = 42) -> pd.DataFrame:
+    """Gera uma tabela sintética com as colunas e a distribuição aproximada de transacoes_imobiliarias."""
+    rng = np.random.default_rng(semente)
+    tipos = np.array(['r', 'av', 'al', 'tv', 'pca', 'est'])
+    nomes = np.array(['augusta', 'paulista', 'da consolacao', 'haddock lobo', 'dos pinheiros', 'santos',
+                      'brigadeiro luis antonio', 'teodoro sampaio', 'vergueiro', 'domingos de morais'])
+    quantidade_ruas = max(10, min(linhas // 20, 50000))
+    ruas = np.char.add(np.char.add(tipos[rng.integers(0, len(tipos), quantidade_ruas)], ' '),
+                       np.char.add(nomes[rng.integers(0, len(nomes), quantidade_ruas)],
+                                   np.char.mod(' %d', np.arange(quantidade_ruas))))
+    ruas_norm = np.array([normalizar_logradouro(rua) for rua in ruas], dtype=object)
+    # Poucas ruas concentram muitas transações, como nas ruas movimentadas reais
+    pesos = 1.0 / np.arange(1, quantidade_ruas + 1)
+    rua_de_cada_linha = rng.choice(quantidade_ruas, size=linhas, p=pesos / pesos.sum())
+    anos = rng.integers(2019, 2026, linhas)
+    area = rng.lognormal(4.3, 0.6, linhas).round(2)
+    return pd.DataFrame({
+        COLUNA_ID: np.arange(1, linhas + 1),
+        COLUNA_ANO: anos,
+        'data_de_transacao': pd.to_datetime(anos.astype(str)) + pd.to_timedelta(rng.integers(0, 365, linhas), unit='D'),
+        COLUNA_LOGRADOURO: ruas[rua_de_cada_linha],
+        COLUNA_LOGRADOURO_NORM: ruas_norm[rua_de_cada_linha],
+        'numero': rng.integers(1, 3000, linhas).astype(str),
+        'complemento': np.where(rng.random(linhas) < 0.6, 'ap ' + rng.integers(1, 300, linhas).astype(str), ''),
+        'bairro': np.array(['bela vista', 'jardins', 'pinheiros', 'vila mariana', 'moema'])[rua_de_cada_linha % 5],
+        COLUNA_CEP: 1000000 + rua_de_cada_linha * 10 + rng.integers(0, 10, linhas),
+        COLUNA_VALOR: (area * rng.normal(10000, 2500, linhas).clip(2000)).round(2),
+        'valor_venal_de_referencia': (area * 7000).round(2),
+        'area_construida_m2': area,
+        'area_do_terreno_m2': (area * rng.uniform(0.2, 3, linhas)).round(2),
+        'descricao_do_uso_iptu': np.array(['Residencial vertical', 'Residencial horizontal', 'Comercial'])[rng.integers(0, 3, linhas)],
+        'descricao_do_padrao_iptu': np.array(['A', 'B', 'C'])[rng.integers(0, 3, linhas)],
+        'natureza_de_transacao': '1.Compra e venda',
+        'tipo_de_financiamento': np.array(['Sistema Financeiro de Habitação', 'Nenhum'])[rng.integers(0, 2, linhas)],
+    })
+
+
+class Resposta:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class ConsultaFalsa:
+    """Imita a cadeia table().select().ilike().in_().eq().order().limit().execute()."""
+
+    def __init__(self, cliente, tabela: pd.DataFrame):
+        self._cliente = cliente
+        self._tabela = tabela
+        self._filtros = []      # filtros fora da chave: o resultado deles fica em cache no cliente
+        self._filtros_id = []   # filtros de paginação por id
+        self._colunas = None
+        self._ordem = None
+        self._limite = None
+        self._intervalo = None
+        self._contar = None
+        self._somente_cabecalho = False
+
+    def select(self, *colunas, count=None, head=None):
+        self._colunas = ','.join(colunas)
+        self._contar = count
+        self._somente_cabecalho = bool(head)
+        return self
+
+    def _filtro(self, operador, coluna, valor):
+        destino = self._filtros_id if coluna == COLUNA_ID else self._filtros
+        destino.append((operador, coluna, tuple(valor) if isinstance(valor, list) else valor))
+        return self
+
+    def eq(self, coluna, valor): return self._filtro('eq', coluna, valor)
+    def neq(self, coluna, valor): return self._filtro('neq', coluna, valor)
+    def gt(self, coluna, valor): return self._filtro('gt', coluna, valor)
+    def gte(self, coluna, valor): return self._filtro('gte', coluna, valor)
+    def lt(self, coluna, valor): return self._filtro('lt', coluna, valor)
+    def lte(self, coluna, valor): return self._filtro('lte', coluna, valor)
+    def in_(self, coluna, valores): return self._filtro('in', coluna, list(valores))
+    def ilike(self, coluna, padrao): return self._filtro('ilike', coluna, padrao)
+    def like(self, coluna, padrao): return self._filtro('like', coluna, padrao)
+
+    def order(self, coluna, desc=False, **_):
+        self._ordem = (coluna, desc)
+        return self
+
+    def limit(self, quantidade, **_):
+        self._limite = quantidade
+        return self
+
+    def range(self, inicio, fim, **_):
+        self._intervalo = (inicio, fim)
+        return self
+
+    def execute(self):
+        self._cliente.requisicoes += 1
+        if self._cliente.latencia: time.sleep(self._cliente.latencia)
+        df = self._cliente.filtrar(self._tabela, tuple(self._filtros))
+        for operador, coluna, valor in self._filtros_id:
+            df = df[_mascara(df, operador, coluna, valor)]
+        total = len(df)
+        if self._somente_cabecalho:
+            return Resposta([], total if self._contar else None)
+        if self._ordem:
+            coluna, desc = self._ordem
+            df = df.sort_values(coluna, ascending=not desc)
+        if self._intervalo:
+            df = df.iloc[self._intervalo[0]:self._intervalo[1] + 1]
+        df = df.head(min(self._limite or MAX_LINHAS, MAX_LINHAS))
+        if self._colunas and self._colunas != '*':
+            df = df[[c for c in self._colunas.split(',') if c in df.columns]]
+        registros = para_json(df)
+        return Resposta(registros, total if self._contar else None)
+
+
+def _mascara(df, operador, coluna, valor):
+    serie = df[coluna]
+    if operador == 'eq': return serie == valor
+    if operador == 'neq': return serie != valor
+    if operador == 'gt': return serie > valor
+    if operador == 'gte': return serie >= valor
+    if operador == 'lt': return serie < valor
+    if operador == 'lte': return serie <= valor
+    if operador == 'in': return serie.isin(valor)
+    if operador in ('ilike', 'like'):
+        texto = valor.strip('%')
+        if '%' in texto:   # curinga no meio ('nome% tipo'): o texto inteiro precisa casar com o padrão
+            padrao = '.*'.join(re.escape(parte) for parte in valor.split('%'))
+            return serie.str.fullmatch(padrao, case=operador == 'like').fillna(False)
+        if valor.startswith('%'):
+            return serie.str.contains(texto, case=operador == 'like', regex=False)
+        return serie.str.lower().str.startswith(texto.lower()) if operador == 'ilike' else serie.str.startswith(texto)
+    raise ValueError(f"Operador não suportado: {operador}")
+
+
+def para_json(df: pd.DataFrame) -> list:
+    """Registros como o PostgREST os devolve (datas em texto ISO)."""
+    df = df.copy()
+    for coluna in df.select_dtypes(include='datetime').columns:
+        df[coluna] = df[coluna].dt.strftime('%Y-%m-%d')
+    return df.to_dict('records')
+
+
+class RPCFalsa:
+    def __init__(self, cliente, funcao):
+        self._cliente = cliente
+        self._funcao = funcao
+        self._intervalo = None
+
+    def range(self, inicio, fim, **_):
+        self._intervalo = (inicio, fim)
+        return self
+
+    def execute(self):
+        self._cliente.requisicoes += 1
+        if self._cliente.latencia: time.sleep(self._cliente.latencia)
+        dados = self._funcao()
+        if self._intervalo:
+            dados = dados[self._intervalo[0]:self._intervalo[1] + 1]
+        return Resposta(dados[:MAX_LINHAS])
+
+
+class ClienteFalso:
+    """Cliente com a mesma interface usada pela aplicação (table e rpc), servido de um DataFrame.
+
+    `latencia` (segundos) é somada a cada requisição para simular a ida e volta da rede.
+    """
+
+    def __init__(self, tabela: pd.DataFrame, latencia: float = 0.0):
+        self.tabela = tabela
+        self.latencia = latencia
+        self.requisicoes = 0
+        self._filtrados = OrderedDict()
+        self.funcoes_rpc = {
+            'get_distinct_anos': lambda parametros: [{'ano': int(a)} for a in sorted(tabela[COLUNA_ANO].unique(), reverse=True)],
+            'get_distinct_logradouros': lambda parametros: [
+                {'logradouro': nome, 'total': int(total)}
+                for nome, total in tabela[COLUNA_LOGRADOURO].value_counts().sort_index().items()
+            ],
+        }
+
+    def filtrar(self, df: pd.DataFrame, filtros: tuple) -> pd.DataFrame:
+        """Aplica os filtros fora da chave, guardando os últimos resultados (as páginas repetem os mesmos filtros)."""
+        if filtros in self._filtrados:
+            return self._filtrados[filtros]
+        for operador, coluna, valor in filtros:
+            df = df[_mascara(df, operador, coluna, valor)]
+        self._filtrados[filtros] = df
+        if len(self._filtrados) > 16: self._filtrados.popitem(last=False)
+        return df
+
+    def table(self, nome: str) -> ConsultaFalsa:
+        if nome != TABELA: raise ValueError(f"Tabela desconhecida: {nome}")
+        return ConsultaFalsa(self, self.tabela)
+
+    def rpc(self, nome: str, parametros: dict) -> RPCFalsa:
+        if nome not in self.funcoes_rpc: raise ValueError(f"Função RPC desconhecida: {nome}")
+        return RPCFalsa(self, lambda: self.funcoes_rpc[nome](parametros))
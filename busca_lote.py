@@ -0,0 +1,151 @@
+# busca_lote.py
+"""Busca em lote: resolve uma planilha de endereços ou CEPs com consultas simultâneas."""
+
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from cache_resultados import chave_busca
+from esquema import COLUNA_ANO, COLUNA_VALOR, COLUNA_AREA_CONSTRUIDA
+from indice_refino import normalizar_texto
+from normalizacao import descrever_cep
+
+MAX_ENDERECOS = 1000
+COLUNA_CONSULTA = 'endereco_consultado'
+
+# Nomes aceitos (já normalizados) para as colunas da planilha enviada
+SINONIMOS_COLUNAS = {
+    'rua': {'rua', 'logradouro', 'endereco', 'nome_do_logradouro', 'nome do logradouro'},
+    'numero': {'numero', 'num', 'no', 'nº', 'n'},
+    'cep': {'cep'},
+}
+
+
+def ler_planilha(arquivo, nome_arquivo: str) -> pd.DataFrame:
+    """Lê um CSV (separado por vírgula ou ponto e vírgula) ou XLSX, com todas as colunas como texto."""
+    if nome_arquivo.lower().endswith(('.xlsx', '.xls')):
+        return pd.read_excel(arquivo, dtype=str)
+    return pd.read_csv(arquivo, dtype=str, sep=None, engine='python', encoding='utf-8-sig')
+
+
+def _identificar_colunas(df: pd.DataFrame) -> dict:
+    colunas = {}
+    for coluna in df.columns:
+        nome = normalizar_texto(coluna).strip()
+        for campo, sinonimos in SINONIMOS_COLUNAS.items():
+            if nome in sinonimos and campo not in colunas:
+                colunas[campo] = coluna
+    return colunas
+
+
+def preparar_consultas(df: pd.DataFrame, anos: list = None, perfil: str = 'analise') -> list:
+    """Converte as linhas da planilha em chaves canônicas de busca, sem repetições.
+
+    Aceita colunas de logradouro, número e CEP. Se não houver coluna de número, um número no
+    fim do endereço ("Rua Augusta, 123") é separado automaticamente.
+    """
+    colunas = _identificar_colunas(df)
+    if 'rua' not in colunas and 'cep' not in colunas:
+        raise ValueError("A planilha precisa de uma coluna 'logradouro' (ou 'endereco') ou 'cep'.")
+    chaves, vistas = [], set()
+    for _, linha in df.iterrows():
+        rua = str(linha.get(colunas.get('rua'), '') or '').strip() if 'rua' in colunas else ''
+        numero = str(linha.get(colunas.get('numero'), '') or '').strip() if 'numero' in colunas else ''
+        cep = str(linha.get(colunas.get('cep'), '') or '').strip() if 'cep' in colunas else ''
+        rua, numero, cep = ('' if v.lower() == 'nan' else v for v in (rua, numero, cep))
+        if rua and not numero:
+            separado = re.match(r'^(.*?)[,\s]+n?[º°o.]?\s*(\d+)\s*$', rua)
+            if separado: rua, numero = separado.group(1), separado.group(2)
+        chave = chave_busca(rua, cep, numero, anos, perfil)
+        # Linhas sem endereço ou com CEP inválido ficam de fora (sem filtro, a busca traria a cidade inteira)
+        if not chave.rua and not chave.cep or cep and not chave.cep: continue
+        if chave not in vistas:
+            vistas.add(chave)
+            chaves.append(chave)
+    return chaves
+
+
+def descrever_chave(chave) -> str:
+    """Texto curto que identifica a consulta nos resultados combinados."""
+    partes = [chave.rua, chave.numero]
+    if chave.cep: partes.append(f"CEP {descrever_cep(chave.cep)}")
+    return ', '.join(p for p in partes if p)
+
+
+class LimitadorTaxa:
+    """Balde de fichas: no máximo `por_segundo` consultas por segundo, compartilhado entre threads."""
+
+    def __init__(self, por_segundo: float, rajada: int = 1):
+        self.intervalo = 1.0 / por_segundo if por_segundo else 0.0
+        self.capacidade = max(1, rajada)
+        self._fichas = float(self.capacidade)
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo: return
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._fichas = min(self.capacidade, self._fichas + (agora - self._ultimo) / self.intervalo)
+                self._ultimo = agora
+                if self._fichas >= 1:
+                    self._fichas -= 1
+                    return
+                espera = (1 - self._fichas) * self.intervalo
+            time.sleep(espera)
+
+
+def buscar_em_lote(funcao_busca, chaves: list, max_paralelo: int = 4, por_segundo: float = 5.0):
+    """Executa funcao_busca(chave) para cada chave em um pool de threads limitado.
+
+    É um gerador: devolve (chave, DataFrame ou None, erro ou None) à medida que cada consulta
+    termina, para que a interface possa mostrar o progresso.
+    """
+    limitador = LimitadorTaxa(por_segundo, rajada=max_paralelo)
+
+    def executar(chave):
+        limitador.aguardar()
+        return funcao_busca(chave)
+
+    with ThreadPoolExecutor(max_workers=max_paralelo) as executor:
+        futuros = {executor.submit(executar, chave): chave for chave in chaves}
+        for futuro in as_completed(futuros):
+            try:
+                yield futuros[futuro], futuro.result(), None
+            except Exception as e:
+                yield futuros[futuro], None, e
+
+
+def combinar_resultados(resultados: dict) -> pd.DataFrame:
+    """Junta os resultados de cada consulta em um só DataFrame, identificando a consulta de origem."""
+    partes = [df.assign(**{COLUNA_CONSULTA: descricao}) for descricao, df in resultados.items() if df is not None and not df.empty]
+    if not partes: return pd.DataFrame()
+    combinado = pd.concat(partes, ignore_index=True)
+    colunas = [COLUNA_CONSULTA] + [c for c in combinado.columns if c != COLUNA_CONSULTA]
+    return combinado[colunas]
+
+
+def resumir_por_endereco(combinado: pd.DataFrame, descricoes: list) -> pd.DataFrame:
+    """Estatísticas por endereço consultado: quantidade, valores e valor por m²."""
+    resumo = pd.DataFrame(index=pd.Index(descricoes, name=COLUNA_CONSULTA))
+    resumo['transacoes'] = 0
+    if combinado.empty: return resumo.reset_index()
+    grupos = combinado.groupby(COLUNA_CONSULTA, sort=False)
+    resumo['transacoes'] = grupos.size().reindex(resumo.index).fillna(0).astype(int)
+    if COLUNA_VALOR in combinado.columns:
+        valores = grupos[COLUNA_VALOR]
+        resumo['valor_mediano'] = valores.median()
+        resumo['valor_minimo'] = valores.min()
+        resumo['valor_maximo'] = valores.max()
+        if COLUNA_AREA_CONSTRUIDA in combinado.columns:
+            area = combinado[COLUNA_AREA_CONSTRUIDA].astype('float64').replace(0, np.nan)
+            por_m2 = (combinado[COLUNA_VALOR] / area).rename('valor_m2')
+            resumo['valor_m2_mediano'] = por_m2.groupby(combinado[COLUNA_CONSULTA], sort=False).median()
+    if COLUNA_ANO in combinado.columns:
+        resumo['ano_mais_recente'] = grupos[COLUNA_ANO].max().astype('Int32')
+    return resumo.reset_index()
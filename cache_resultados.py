@@ -0,0 +1,404 @@
+# cache_resultados.py
+"""Cache compartilhado dos resultados de busca, indexado pela forma canônica da consulta."""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from esquema import PERFIS_COLUNAS, COLUNA_ANO, COLUNA_CEP, COLUNA_LOGRADOURO, COLUNA_NUMERO
+from normalizacao import canonizar_cep, casa_logradouro, intervalo_cep, normalizar_logradouro, separar_tipo
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChaveBusca:
+    """Consulta canônica: duas buscas com a mesma chave devolvem o mesmo resultado."""
+    rua: str = ''
+    rua_exata: bool = False
+    cep: str = ''
+    numero: str = ''
+    anos: tuple = ()
+    perfil: str = ''
+
+    def hash(self) -> str:
+        return hashlib.sha256(repr(self).encode('utf-8')).hexdigest()
+
+    def campos(self) -> dict:
+        """Campos em formato JSON (anos como lista), para gravar a busca fora do processo."""
+        return {**asdict(self), 'anos': list(self.anos)}
+
+    @classmethod
+    def de_campos(cls, campos: dict) -> 'ChaveBusca':
+        rua = campos.get('rua', '')
+        # Buscas gravadas com a forma canônica anterior ("av paulista") passam para a chave atual
+        if rua and not campos.get('rua_exata'): rua = normalizar_logradouro(rua)
+        return cls(**{**campos, 'rua': rua, 'anos': tuple(campos.get('anos', ()))})
+
+
+def chave_busca(nome_rua: str = None, cep: str = None, numero: str = None, anos: list = None,
+                perfil: str = '', logradouro_exato: str = None) -> ChaveBusca:
+    """Monta a chave canônica: rua normalizada, CEP canônico (exato, prefixo ou faixa), número sem espaços e anos ordenados."""
+    return ChaveBusca(
+        rua=logradouro_exato or normalizar_logradouro(nome_rua),
+        rua_exata=bool(logradouro_exato),
+        cep=canonizar_cep(cep),
+        numero=numero.strip() if numero else '',
+        anos=tuple(sorted({int(ano) for ano in anos or []})),
+        perfil=perfil or '',
+    )
+
+
+def contem(ampla: ChaveBusca, estrita: ChaveBusca) -> bool:
+    """Indica se toda linha da busca estrita também está na busca ampla, com as colunas de que ela precisa.
+
+    Vale só para listas de transações (perfis de PERFIS_COLUNAS), não para resultados agregados.
+    """
+    if ampla.perfil not in PERFIS_COLUNAS or estrita.perfil not in PERFIS_COLUNAS: return False
+    colunas_ampla, colunas_estrita = PERFIS_COLUNAS[ampla.perfil], PERFIS_COLUNAS[estrita.perfil]
+    if colunas_ampla != ['*'] and (colunas_estrita == ['*'] or not set(colunas_estrita) <= set(colunas_ampla)): return False
+    if ampla.anos and not (estrita.anos and set(estrita.anos) <= set(ampla.anos)): return False
+    if ampla.numero and ampla.numero != estrita.numero: return False
+    if ampla.cep:
+        if not estrita.cep: return False
+        inicio, fim = intervalo_cep(ampla.cep)
+        inicio_estrita, fim_estrita = intervalo_cep(estrita.cep)
+        if not inicio <= inicio_estrita <= fim_estrita <= fim: return False
+    if ampla.rua:
+        if not estrita.rua or ampla.rua_exata and (not estrita.rua_exata or ampla.rua != estrita.rua): return False
+        if not ampla.rua_exata:
+            if estrita.rua_exata:
+                # O nome exato está na ampla quando sua chave atende ao padrão dela
+                if not casa_logradouro(normalizar_logradouro(estrita.rua), ampla.rua): return False
+            else:
+                # Padrão contém padrão ("nome% tipo"): o nome estrito começa com o amplo e, se a ampla
+                # tem tipo, é o mesmo. Comparar a chave inteira com o padrão não basta: "paulista av"
+                # começa com "paulista a", mas "paulista nova av" atende à estrita e não à ampla
+                nome, tipo = separar_tipo(ampla.rua)
+                nome_estrita, tipo_estrita = separar_tipo(estrita.rua)
+                if not nome_estrita.startswith(nome) or tipo and tipo != tipo_estrita: return False
+    return True
+
+
+def colunas_filtro(ampla: ChaveBusca, estrita: ChaveBusca) -> set:
+    """Colunas que filtrar_local lê para aplicar ao resultado da busca ampla os filtros que só a estrita tem."""
+    colunas = set()
+    if (estrita.rua, estrita.rua_exata) != (ampla.rua, ampla.rua_exata): colunas.add(COLUNA_LOGRADOURO)
+    if estrita.cep != ampla.cep: colunas.add(COLUNA_CEP)
+    if estrita.numero != ampla.numero: colunas.add(COLUNA_NUMERO)
+    if estrita.anos != ampla.anos: colunas.add(COLUNA_ANO)
+    return colunas
+
+
+def tamanho_em_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+@dataclass(eq=False)
+class _Entrada:
+    """Um resultado em memória, com o índice de refino (montado uma vez) e as referências das sessões."""
+    df: pd.DataFrame
+    tamanho: int
+    criado_em: float
+    referencias: int = 0
+    em_cache: bool = True          # False depois de removida do LRU (só as referências a mantêm viva)
+    indice: object = field(default=None, repr=False)
+
+
+class Referencia:
+    """Alça leve de um resultado compartilhado, guardada no session_state no lugar do DataFrame.
+
+    Enquanto existir, o resultado não é removido do cache; é liberada quando a sessão a substitui
+    por outra busca ou termina.
+    """
+
+    def __init__(self, cache: 'CacheResultados', chave: ChaveBusca, entrada: _Entrada):
+        self.chave = chave
+        self._cache = cache
+        self._entrada = entrada
+        weakref.finalize(self, cache._liberar, chave, entrada)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """O resultado compartilhado (não deve ser alterado no lugar)."""
+        return self._entrada.df
+
+    def indice_refino(self):
+        """IndiceRefino do resultado, montado pela primeira sessão que refina e reaproveitado pelas demais."""
+        return self._cache._indice_refino(self._entrada)
+
+
+class CacheResultados:
+    """LRU limitado por bytes em memória, com TTL, métricas e uma camada opcional em disco.
+
+    A camada em disco (Parquet) é compartilhada entre os processos do Streamlit e sobrevive
+    a reinícios; a camada em memória é do processo. Resultados com referências (ver referenciar)
+    não são removidos pelo LRU e continuam contados no limite de bytes até serem liberados.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 ** 2, ttl: float = 600, diretorio=None,
+                 max_bytes_disco: int = 2 * 1024 ** 3):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.diretorio = Path(diretorio) if diretorio else None
+        self.max_bytes_disco = max_bytes_disco
+        self._itens = OrderedDict()  # chave -> _Entrada
+        self._referenciadas = {}     # chave -> _Entrada fora do LRU que ainda tem referências
+        self._bytes = 0              # entradas do LRU e entradas fora dele que ainda têm referências
+        self._lock = threading.Lock()
+        # Referências liberadas pelo coletor de lixo, aplicadas quando o lock está livre (ver _liberar)
+        self._liberacoes = deque()
+        self.metricas = {'acertos_memoria': 0, 'acertos_disco': 0, 'acertos_contencao': 0, 'faltas': 0, 'remocoes': 0,
+                         'compartilhamentos': 0}
+        self._invalidado_em = {}  # ano -> momento da última alteração dos dados desse ano
+        if self.diretorio:
+            self.diretorio.mkdir(parents=True, exist_ok=True)
+
+    def _valido(self, chave: ChaveBusca, criado_em: float) -> bool:
+        """Dentro do TTL e mais novo que a última alteração dos anos da busca (sem filtro de ano, de todos)."""
+        if time.time() - criado_em > self.ttl: return False
+        anos = chave.anos or self._invalidado_em
+        return all(criado_em >= self._invalidado_em.get(ano, 0) for ano in anos)
+
+    # --- Memória ---
+
+    def _remover(self, chave):
+        entrada = self._itens.pop(chave)
+        entrada.em_cache = False
+        if entrada.referencias:
+            self._referenciadas[chave] = entrada
+        else:
+            self._bytes -= entrada.tamanho
+
+    def _ajustar(self):
+        """Remove as entradas sem referências, da menos usada para a mais usada, até caber no limite."""
+        self._aplicar_liberacoes()
+        while self._bytes > self.max_bytes:
+            livre = next((chave for chave, entrada in self._itens.items() if not entrada.referencias), None)
+            if livre is None: return
+            self._remover(livre)
+            self.metricas['remocoes'] += 1
+
+    def _guardar_memoria(self, chave, df: pd.DataFrame, criado_em: float):
+        tamanho = tamanho_em_bytes(df)
+        if tamanho > self.max_bytes: return
+        with self._lock:
+            if chave in self._itens: self._remover(chave)
+            self._itens[chave] = _Entrada(df, tamanho, criado_em)
+            self._bytes += tamanho
+            self._ajustar()
+
+    # --- Referências ---
+
+    def _liberar(self, chave: ChaveBusca, entrada: _Entrada):
+        """Chamado pelo weakref.finalize, que pode rodar numa thread que já tem o lock: só enfileira.
+
+        A liberação é aplicada agora se o lock estiver livre; senão, pela próxima operação que o tomar.
+        """
+        self._liberacoes.append((chave, entrada))
+        if self._lock.acquire(blocking=False):
+            try:
+                self._ajustar()
+            finally:
+                self._lock.release()
+
+    def _aplicar_liberacoes(self):
+        """Aplica as liberações enfileiradas (com o lock tomado)."""
+        while self._liberacoes:
+            chave, entrada = self._liberacoes.popleft()
+            entrada.referencias -= 1
+            if not entrada.referencias and not entrada.em_cache:
+                self._bytes -= entrada.tamanho
+                if self._referenciadas.get(chave) is entrada:
+                    del self._referenciadas[chave]
+
+    def _descartar_referenciadas(self, condicao):
+        """Tira do caminho das buscas as entradas fora do LRU (as sessões que as têm continuam a usá-las)."""
+        for chave in [c for c, entrada in self._referenciadas.items() if condicao(c, entrada)]:
+            del self._referenciadas[chave]
+
+    def _indice_refino(self, entrada: _Entrada):
+        from indice_refino import IndiceRefino
+        with self._lock:
+            if entrada.indice is not None: return entrada.indice
+        indice = IndiceRefino(entrada.df)  # fora do lock: pode levar alguns segundos
+        with self._lock:
+            if entrada.indice is None:
+                entrada.indice = indice
+                entrada.tamanho += indice.tamanho_em_bytes()
+                if entrada.em_cache or entrada.referencias:
+                    self._bytes += indice.tamanho_em_bytes()
+                self._ajustar()
+            return entrada.indice
+
+    # --- Disco ---
+
+    def _arquivo(self, chave: ChaveBusca) -> Path:
+        return self.diretorio / f'{chave.hash()}.parquet'
+
+    def _ler_disco(self, chave):
+        if not self.diretorio: return None
+        arquivo = self._arquivo(chave)
+        try:
+            criado_em = arquivo.stat().st_mtime
+            if not self._valido(chave, criado_em): return None
+            return pd.read_parquet(arquivo), criado_em
+        except (OSError, ValueError):
+            return None
+
+    def _gravar_disco(self, chave, df: pd.DataFrame):
+        if not self.diretorio: return
+        try:
+            arquivo = self._arquivo(chave)
+            temporario = arquivo.with_name(f'.{arquivo.name}.{os.getpid()}.tmp')
+            df.to_parquet(temporario, index=False)
+            os.replace(temporario, arquivo)
+            self._limpar_disco()
+        except Exception as e:
+            logger.warning("Falha ao gravar resultado no cache em disco: %s", e)
+
+    def _limpar_disco(self):
+        """Apaga arquivos vencidos e, se o limite de bytes for excedido, os mais antigos."""
+        arquivos = []
+        for arquivo in self.diretorio.glob('*.parquet'):
+            try:
+                info = arquivo.stat()
+            except OSError:
+                continue
+            if time.time() - info.st_mtime > self.ttl:
+                arquivo.unlink(missing_ok=True)
+            else:
+                arquivos.append((info.st_mtime, info.st_size, arquivo))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, arquivo in sorted(arquivos):
+            if total <= self.max_bytes_disco: break
+            arquivo.unlink(missing_ok=True)
+            total -= tamanho
+
+    # --- Contenção ---
+
+    def _obter_contido(self, chave: ChaveBusca):
+        """(DataFrame, criado_em) filtrado em memória do menor resultado completo (não truncado) que contém a busca."""
+        with self._lock:
+            # O perfil da busca ampla pode não trazer a coluna de um filtro (o 'analise' não tem numero)
+            candidatas = [(c, e) for c, e in [*self._itens.items(), *self._referenciadas.items()]
+                          if e.df.attrs.get('truncado') is False and contem(c, chave) and self._valido(c, e.criado_em)
+                          and colunas_filtro(c, chave) <= set(e.df.columns)]
+        if not candidatas: return None
+        from replica_local import filtrar_local
+        ampla, entrada = min(candidatas, key=lambda item: len(item[1].df))
+        # Só os filtros que a busca ampla não aplicou; a ordem (id decrescente) se mantém
+        df = filtrar_local(entrada.df, chave.rua if chave.rua != ampla.rua or chave.rua_exata != ampla.rua_exata else None,
+                           chave.cep if chave.cep != ampla.cep else None, chave.numero if chave.numero != ampla.numero else None,
+                           chave.rua_exata, list(chave.anos) if chave.anos != ampla.anos else None)
+        colunas = PERFIS_COLUNAS[chave.perfil]
+        if colunas != ['*']: df = df[df.columns.intersection(colunas)]
+        df = df.reset_index(drop=True)
+        df.attrs['truncado'] = False
+        return df, entrada.criado_em  # vale enquanto o resultado de origem valeria
+
+    def _contar(self, metrica: str):
+        with self._lock:
+            self.metricas[metrica] += 1
+
+    # --- Interface ---
+
+    def obter(self, chave: ChaveBusca):
+        """Devolve o DataFrame em cache ou None."""
+        with self._lock:
+            self._aplicar_liberacoes()
+            entrada = self._itens.get(chave)
+            if entrada and self._valido(chave, entrada.criado_em):
+                self._itens.move_to_end(chave)
+                self.metricas['acertos_memoria'] += 1
+                return entrada.df
+            if entrada: self._remover(chave)
+            # Resultado que saiu do LRU mas continua aberto em alguma sessão
+            entrada = self._referenciadas.get(chave)
+            if entrada and self._valido(chave, entrada.criado_em):
+                self.metricas['acertos_memoria'] += 1
+                return entrada.df
+        lido = self._ler_disco(chave)
+        if lido is not None:
+            df, criado_em = lido
+            self._guardar_memoria(chave, df, criado_em)
+            self._contar('acertos_disco')
+            return df
+        # Busca mais restrita que um resultado completo já em memória: filtrada sem ir ao banco
+        contido = self._obter_contido(chave)
+        if contido is not None:
+            df, criado_em = contido
+            self._guardar_memoria(chave, df, criado_em)
+            self._contar('acertos_contencao')
+            return df
+        self._contar('faltas')
+        return None
+
+    def guardar(self, chave: ChaveBusca, df: pd.DataFrame):
+        """Guarda o resultado nas duas camadas."""
+        self._guardar_memoria(chave, df, time.time())
+        self._gravar_disco(chave, df)
+
+    def referenciar(self, chave: ChaveBusca, df: pd.DataFrame) -> Referencia:
+        """Referência ao resultado da chave: sessões com a mesma busca compartilham um só DataFrame.
+
+        Se o resultado não estiver (ou não couber) no cache, df passa a ser mantido só pelas referências.
+        """
+        with self._lock:
+            self._aplicar_liberacoes()
+            entrada = self._itens.get(chave) or self._referenciadas.get(chave)
+            if entrada is not None and entrada.df is df:
+                self.metricas['compartilhamentos'] += entrada.referencias > 0
+            else:
+                entrada = _Entrada(df, tamanho_em_bytes(df), time.time(), em_cache=False)
+                self._bytes += entrada.tamanho
+                self._referenciadas[chave] = entrada
+            entrada.referencias += 1
+            return Referencia(self, chave, entrada)
+
+    def invalidar(self, condicao=None):
+        """Remove da memória as chaves que satisfazem a condição; sem condição, esvazia também o disco."""
+        with self._lock:
+            self._aplicar_liberacoes()
+            for chave in [c for c in self._itens if condicao is None or condicao(c)]:
+                self._remover(chave)
+            self._descartar_referenciadas(lambda c, _: condicao is None or condicao(c))
+        if self.diretorio and condicao is None:
+            for arquivo in self.diretorio.glob('*.parquet'):
+                arquivo.unlink(missing_ok=True)
+
+    def invalidar_anos(self, alteracoes: dict):
+        """Descarta os resultados anteriores à alteração de cada ano ({ano: momento em segundos}).
+
+        Vale para as duas camadas: os arquivos em disco mais antigos passam a ser ignorados.
+        """
+        with self._lock:
+            for ano, momento in alteracoes.items():
+                self._invalidado_em[int(ano)] = max(momento, self._invalidado_em.get(int(ano), 0))
+            for chave in [c for c, entrada in self._itens.items() if not self._valido(c, entrada.criado_em)]:
+                self._remover(chave)
+            self._descartar_referenciadas(lambda c, entrada: not self._valido(c, entrada.criado_em))
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            self._aplicar_liberacoes()
+            consultas = sum(self.metricas[m] for m in ('acertos_memoria', 'acertos_disco', 'acertos_contencao', 'faltas'))
+            acertos = self.metricas['acertos_memoria'] + self.metricas['acertos_disco'] + self.metricas['acertos_contencao']
+            referenciadas = [entrada for entrada in self._itens.values() if entrada.referencias] + list(self._referenciadas.values())
+            return {
+                **self.metricas,
+                'itens': len(self._itens),
+                'itens_referenciados': len(referenciadas),
+                'referencias': sum(entrada.referencias for entrada in referenciadas),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'taxa_acerto': acertos / consultas if consultas else 0.0,
+            }
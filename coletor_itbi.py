@@ -0,0 +1,461 @@
+# coletor_itbi.py
+"""Robô coletor: carrega as planilhas de ITBI em transacoes_imobiliarias como um pipeline em blocos.
+
+As planilhas (uma ou mais por ano, com o ano no nome do arquivo) ficam em ITBI_PLANILHAS_DIR.
+Cada arquivo é lido em blocos, limpo de forma vetorizada e enviado em lotes de upsert, então a
+memória usada não cresce com o tamanho da planilha. Os anos são processados em paralelo e o
+progresso de cada arquivo é gravado, para que uma carga interrompida continue de onde parou.
+
+Na atualização (--atualizar), planilhas iguais às da última execução são ignoradas e, das
+demais, só as transações novas ou alteradas são enviadas. Os anos alterados ficam registrados
+em coletor_atualizacoes, que a aplicação consulta para invalidar apenas os caches desses anos.
+
+Cada linha leva também o logradouro normalizado (logradouro_norm, ver normalizacao.normalizar_logradouro).
+--normalizar preenche a coluna nas transações já carregadas, sem ler as planilhas.
+
+    python coletor_itbi.py --carga-total
+    python coletor_itbi.py --atualizar
+    python coletor_itbi.py --ano 2024
+    python coletor_itbi.py --normalizar
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from esquema import (TABELA, TABELA_ATUALIZACOES, COLUNA_ID, COLUNA_ANO, COLUNA_LOGRADOURO, COLUNA_LOGRADOURO_NORM, COLUNA_NUMERO,
+                     COLUNA_CEP, COLUNA_DATA, COLUNA_VALOR, COLUNAS_FLOAT32, COLUNAS_MONETARIAS)
+from indice_logradouros import carregar_logradouros
+from indice_refino import normalizar_texto
+from normalizacao import normalizar_logradouro, normalizar_logradouros
+
+logger = logging.getLogger('coletor_itbi')
+
+DIRETORIO_PLANILHAS = 'planilhas'
+DIRETORIO_PROGRESSO = '.progresso'  # dentro do diretório das planilhas, um arquivo JSON por ano
+EXTENSOES = ('.xlsx', '.csv')
+TAMANHO_BLOCO = 20000   # linhas lidas da planilha por vez
+TAMANHO_LOTE = 1000     # linhas por requisição de upsert
+MAX_PROCESSOS = 4       # anos processados em paralelo
+TENTATIVAS = 3
+
+# Identificação estável de uma transação: o upsert usa esta coluna (índice único, ver sql/)
+COLUNA_CHAVE = 'chave_transacao'
+# Hash de todo o conteúdo da linha, para detectar transações alteradas
+COLUNA_HASH = 'hash_linha'
+# Estado de cada planilha já carregada (ver sql/coletor_estado.sql)
+TABELA_ARQUIVOS = 'coletor_arquivos'
+COLUNAS_IDENTIFICACAO = [
+    'n_do_cadastro_sql', COLUNA_DATA, 'natureza_de_transacao', 'cartorio_de_registro',
+    'matricula_do_imovel', COLUNA_NUMERO, 'complemento', COLUNA_VALOR,
+]
+
+# Colunas das planilhas da Prefeitura, já no formato de nome da tabela
+COLUNAS_TEXTO = [
+    'n_do_cadastro_sql', COLUNA_LOGRADOURO, 'complemento', 'bairro', 'referencia', 'natureza_de_transacao',
+    'tipo_de_financiamento', 'cartorio_de_registro', 'matricula_do_imovel', 'situacao_do_sql', 'uso_iptu',
+    'descricao_do_uso_iptu', 'padrao_iptu', 'descricao_do_padrao_iptu', 'acc_iptu',
+]
+COLUNAS_NUMERICAS = COLUNAS_MONETARIAS + COLUNAS_FLOAT32
+# Identificadores guardados como texto que o XLSX entrega como número (float quando o bloco tem células vazias)
+COLUNAS_CODIGO = ['n_do_cadastro_sql', 'matricula_do_imovel', 'cartorio_de_registro', 'acc_iptu']
+
+
+# --- 1. LEITURA EM BLOCOS ---
+
+def nome_coluna(titulo) -> str:
+    """'Valor de Transação (declarado pelo contribuinte)' -> 'valor_de_transacao_declarado_pelo_contribuinte'."""
+    return re.sub(r'[^a-z0-9]+', '_', normalizar_texto(str(titulo or '')).strip()).strip('_')
+
+
+def _ler_xlsx(caminho: Path, tamanho_bloco: int):
+    from openpyxl import load_workbook  # só necessário para planilhas XLSX
+
+    pasta = load_workbook(caminho, read_only=True, data_only=True)
+    try:
+        for aba in pasta.worksheets:
+            linhas = aba.iter_rows(values_only=True)
+            cabecalho = [nome_coluna(titulo) for titulo in next(linhas, ())]
+            if COLUNA_LOGRADOURO not in cabecalho: continue  # abas de legenda ou resumo
+            bloco = []
+            for linha in linhas:
+                bloco.append(linha[:len(cabecalho)])
+                if len(bloco) == tamanho_bloco:
+                    yield pd.DataFrame(bloco, columns=cabecalho)
+                    bloco = []
+            if bloco:
+                yield pd.DataFrame(bloco, columns=cabecalho)
+    finally:
+        pasta.close()
+
+
+def ler_em_blocos(caminho: Path, tamanho_bloco: int = TAMANHO_BLOCO):
+    """Gera DataFrames de até `tamanho_bloco` linhas, com as colunas já renomeadas, sem carregar o arquivo inteiro."""
+    if caminho.suffix.lower() == '.xlsx':
+        yield from _ler_xlsx(caminho, tamanho_bloco)
+        return
+    with pd.read_csv(caminho, sep=None, engine='python', dtype=str, encoding='utf-8-sig', chunksize=tamanho_bloco) as leitor:
+        for bloco in leitor:
+            yield bloco.rename(columns=nome_coluna)
+
+
+# --- 2. LIMPEZA VETORIZADA ---
+
+def _texto(serie: pd.Series) -> pd.Series:
+    texto = serie.astype('string').str.strip().str.replace(r'\s+', ' ', regex=True)
+    return texto.mask(texto == '')
+
+
+def _numero(serie: pd.Series) -> pd.Series:
+    """Números das planilhas: já numéricos (XLSX) ou texto no formato brasileiro ('1.234,56')."""
+    valores = pd.to_numeric(serie, errors='coerce')
+    pendentes = valores.isna() & serie.notna()
+    if pendentes.any():
+        texto = serie[pendentes].astype('string').str.replace(r'[^\d,.-]', '', regex=True)
+        texto = texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        valores[pendentes] = pd.to_numeric(texto, errors='coerce')
+    return valores.astype('float64')
+
+
+def _inteiro_texto(serie: pd.Series) -> pd.Series:
+    """Número ou código como texto: 123.0 (lido do XLSX) vira '123', 'S/N' fica como está."""
+    valores = pd.to_numeric(serie, errors='coerce')
+    inteiros = valores.where(valores % 1 == 0).astype('Int64').astype('string')
+    return inteiros.fillna(_texto(serie))
+
+
+def _md5_colunas(df: pd.DataFrame, colunas: list) -> pd.Series:
+    """MD5 por linha dos valores das colunas (datas em ISO, valor com 2 casas, ausentes como texto vazio)."""
+    partes = []
+    for coluna in colunas:
+        if coluna not in df.columns:
+            partes.append(pd.Series('', index=df.index, dtype='string'))
+        elif coluna == COLUNA_DATA:
+            partes.append(df[coluna].dt.strftime('%Y-%m-%d').astype('string').fillna(''))
+        elif coluna == COLUNA_VALOR:
+            partes.append(df[coluna].map('{:.2f}'.format, na_action='ignore').astype('string').fillna(''))
+        else:
+            partes.append(df[coluna].astype('string').fillna(''))
+    texto = partes[0].str.cat(partes[1:], sep='|')
+    return pd.Series([hashlib.md5(t.encode('utf-8')).hexdigest() for t in texto], index=df.index, dtype='string')
+
+
+def chave_transacao(df: pd.DataFrame) -> pd.Series:
+    """MD5 das colunas de identificação, no mesmo formato do preenchimento em SQL (sql/chave_transacao.sql)."""
+    return _md5_colunas(df, COLUNAS_IDENTIFICACAO)
+
+
+def hash_linha(df: pd.DataFrame) -> pd.Series:
+    """MD5 de todas as colunas carregadas: muda sempre que algum valor da transação muda.
+
+    O logradouro normalizado fica de fora: é derivado do nome, e uma mudança no dicionário de
+    normalização é aplicada por --normalizar sem reenviar as transações.
+    """
+    derivadas = (COLUNA_CHAVE, COLUNA_HASH, COLUNA_LOGRADOURO_NORM)
+    return _md5_colunas(df, sorted(c for c in df.columns if c not in derivadas))
+
+
+def limpar_bloco(bruto: pd.DataFrame, ano: int) -> pd.DataFrame:
+    """Padroniza um bloco da planilha: tipos, textos sem espaços extras, logradouro sem acentos (e normalizado), CEP numérico e datas."""
+    bruto = bruto.loc[:, ~bruto.columns.duplicated()]
+    df = pd.DataFrame(index=bruto.index)
+    for coluna in COLUNAS_TEXTO:
+        if coluna in bruto.columns:
+            df[coluna] = _inteiro_texto(bruto[coluna]) if coluna in COLUNAS_CODIGO else _texto(bruto[coluna])
+    for coluna in COLUNAS_NUMERICAS:
+        if coluna in bruto.columns: df[coluna] = _numero(bruto[coluna])
+    if COLUNA_NUMERO in bruto.columns:
+        df[COLUNA_NUMERO] = _inteiro_texto(bruto[COLUNA_NUMERO])
+    if COLUNA_CEP in bruto.columns:
+        cep = pd.to_numeric(bruto[COLUNA_CEP], errors='coerce')
+        digitos = bruto[COLUNA_CEP].astype('string').str.replace(r'\D', '', regex=True)
+        df[COLUNA_CEP] = cep.fillna(pd.to_numeric(digitos, errors='coerce')).astype('Int64')
+    if COLUNA_LOGRADOURO in df.columns:
+        df[COLUNA_LOGRADOURO] = df[COLUNA_LOGRADOURO].str.normalize('NFD').str.replace('[\u0300-\u036f]', '', regex=True)
+        df[COLUNA_LOGRADOURO_NORM] = normalizar_logradouros(df[COLUNA_LOGRADOURO])
+
+    data = bruto[COLUNA_DATA] if COLUNA_DATA in bruto.columns else pd.Series(pd.NaT, index=bruto.index)
+    if not pd.api.types.is_datetime64_any_dtype(data):
+        data = pd.to_datetime(data, errors='coerce', dayfirst=True)
+    df[COLUNA_DATA] = data
+    df[COLUNA_ANO] = data.dt.year.fillna(ano).astype('int64')
+
+    # Linhas em branco, de rodapé e de totais não têm logradouro
+    df = df[df[COLUNA_LOGRADOURO].notna()] if COLUNA_LOGRADOURO in df.columns else df.iloc[0:0]
+    df = df.assign(**{COLUNA_CHAVE: chave_transacao(df), COLUNA_HASH: hash_linha(df)})
+    # Duas linhas com a mesma chave no mesmo lote fariam o upsert falhar
+    return df.drop_duplicates(COLUNA_CHAVE, keep='last')
+
+
+def para_registros(df: pd.DataFrame) -> list:
+    """Registros prontos para o JSON do PostgREST (datas ISO e None no lugar de valores ausentes)."""
+    saida = df.copy()
+    saida[COLUNA_DATA] = saida[COLUNA_DATA].dt.strftime('%Y-%m-%d')
+    saida = saida.astype(object)
+    return saida.where(saida.notna(), None).to_dict('records')
+
+
+# --- 3. ENVIO E PROGRESSO ---
+
+def criar_cliente():
+    from supabase import create_client
+
+    load_dotenv()
+    url = os.getenv('SUPABASE_URL')
+    chave = os.getenv('SUPABASE_SERVICE_KEY') or os.getenv('SUPABASE_KEY')
+    if not url or not chave:
+        raise RuntimeError("Credenciais do Supabase não configuradas (SUPABASE_URL e SUPABASE_SERVICE_KEY ou SUPABASE_KEY).")
+    return create_client(url, chave)
+
+
+def enviar_lote(cliente, registros: list):
+    """Upsert de um lote pela chave da transação, com novas tentativas em falhas temporárias."""
+    for tentativa in range(TENTATIVAS):
+        try:
+            cliente.table(TABELA).upsert(registros, on_conflict=COLUNA_CHAVE, returning='minimal').execute()
+            return
+        except Exception as e:
+            if tentativa == TENTATIVAS - 1: raise
+            logger.warning("Falha no envio de %d linhas (tentativa %d): %s", len(registros), tentativa + 1, e)
+            time.sleep(2 ** tentativa)
+
+
+def carregar_hashes(cliente, ano: int) -> dict:
+    """Chave -> hash_linha das transações do ano já gravadas (paginação por id)."""
+    hashes, cursor = {}, 0
+    while True:
+        pagina = (cliente.table(TABELA).select(f'{COLUNA_ID},{COLUNA_CHAVE},{COLUNA_HASH}')
+                  .eq(COLUNA_ANO, ano).gt(COLUNA_ID, cursor).order(COLUNA_ID).limit(TAMANHO_LOTE)
+                  .execute().data or [])
+        hashes.update((linha[COLUNA_CHAVE], linha[COLUNA_HASH]) for linha in pagina if linha[COLUNA_CHAVE])
+        if len(pagina) < TAMANHO_LOTE: return hashes
+        cursor = pagina[-1][COLUNA_ID]
+
+
+def hash_arquivo(caminho: Path) -> str:
+    """SHA-256 do conteúdo da planilha, lido em pedaços."""
+    resumo = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for pedaco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            resumo.update(pedaco)
+    return resumo.hexdigest()
+
+
+def ler_estado_arquivos(cliente, ano: int) -> dict:
+    """Nome da planilha -> estado gravado na última carga (assinatura, hash e linhas)."""
+    linhas = cliente.table(TABELA_ARQUIVOS).select('*').eq(COLUNA_ANO, ano).execute().data or []
+    return {linha['arquivo']: linha for linha in linhas}
+
+
+def registrar_arquivo(cliente, caminho: Path, ano: int, assinatura: str, hash_conteudo: str, linhas: int):
+    cliente.table(TABELA_ARQUIVOS).upsert({
+        'arquivo': caminho.name, COLUNA_ANO: ano, 'assinatura': assinatura, 'hash': hash_conteudo,
+        'linhas': linhas, 'carregado_em': datetime.now(timezone.utc).isoformat(),
+    }, on_conflict='arquivo', returning='minimal').execute()
+
+
+def sinalizar_ano_alterado(cliente, ano: int, linhas_alteradas: int):
+    """Registra que o ano mudou, para a aplicação invalidar só os caches desse ano."""
+    cliente.table(TABELA_ATUALIZACOES).upsert({
+        COLUNA_ANO: ano, 'atualizado_em': datetime.now(timezone.utc).isoformat(), 'linhas_alteradas': linhas_alteradas,
+    }, on_conflict=COLUNA_ANO, returning='minimal').execute()
+
+
+def atualizar_indice_ceps(cliente):
+    """Recalcula a visão cep_logradouros (sql/indice_ceps.sql) usada pela busca por setor de CEP."""
+    try:
+        cliente.rpc('atualizar_indice_ceps', {}).execute()
+    except Exception as e:
+        logger.warning("Índice de CEPs não atualizado (execute sql/indice_ceps.sql): %s", e)
+
+
+def atualizar_tendencias(cliente, anos: list):
+    """Recalcula as tendências mensais (sql/tendencias.sql) só dos anos alterados."""
+    try:
+        cliente.rpc('atualizar_tendencias', {'p_anos': list(anos)}).execute()
+    except Exception as e:
+        logger.warning("Tendências não atualizadas (execute sql/tendencias.sql): %s", e)
+
+
+def normalizar_gravados(cliente, tamanho_lote: int = TAMANHO_LOTE) -> int:
+    """Preenche logradouro_norm das transações já gravadas, por nome distinto (sql/logradouro_norm.sql).
+
+    Só as linhas cuja chave mudou são reescritas, então o comando pode ser repetido depois de uma
+    mudança no dicionário de normalização. Devolve o número de transações alteradas.
+    """
+    nomes = [str(nome) for nome in carregar_logradouros(cliente).index]
+    alteradas = 0
+    for inicio in range(0, len(nomes), tamanho_lote):
+        pares = [{'nome': nome, 'norm': normalizar_logradouro(nome)} for nome in nomes[inicio:inicio + tamanho_lote]]
+        alteradas += cliente.rpc('atualizar_logradouro_norm', {'p_pares': pares}).execute().data or 0
+        logger.info("Logradouros normalizados: %d de %d.", min(inicio + tamanho_lote, len(nomes)), len(nomes))
+    return alteradas
+
+
+def _arquivo_progresso(diretorio: Path, ano: int) -> Path:
+    return diretorio / DIRETORIO_PROGRESSO / f'{ano}.json'
+
+
+def ler_progresso(diretorio: Path, ano: int) -> dict:
+    """Progresso por arquivo do ano: {nome: {'assinatura', 'linhas', 'concluido'}}."""
+    caminho = _arquivo_progresso(diretorio, ano)
+    if not caminho.exists(): return {}
+    try:
+        return json.loads(caminho.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+
+def gravar_progresso(diretorio: Path, ano: int, progresso: dict):
+    caminho = _arquivo_progresso(diretorio, ano)
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho.with_suffix('.tmp')
+    temporario.write_text(json.dumps(progresso, indent=2), encoding='utf-8')
+    os.replace(temporario, caminho)
+
+
+def assinatura_arquivo(caminho: Path) -> str:
+    info = caminho.stat()
+    return f'{info.st_size}-{info.st_mtime_ns}'
+
+
+# --- 4. PIPELINE ---
+
+def processar_ano(ano: int, arquivos: list, diretorio: Path, tamanho_bloco: int = TAMANHO_BLOCO,
+                  tamanho_lote: int = TAMANHO_LOTE, incremental: bool = False) -> dict:
+    """Carrega os arquivos de um ano, retomando do último bloco confirmado de cada arquivo.
+
+    Com incremental, planilhas iguais às da última carga são ignoradas e só as linhas com
+    chave nova ou hash_linha diferente do gravado são enviadas.
+    """
+    cliente = criar_cliente()
+    progresso = ler_progresso(diretorio, ano)
+    carregados = ler_estado_arquivos(cliente, ano)
+    gravados, anos_lidos = {}, set()  # chave -> hash_linha, baixados por ano só quando alguma planilha mudou
+    alteradas = {}  # ano_transacao -> linhas enviadas
+    enviadas = 0
+    for caminho in arquivos:
+        assinatura = assinatura_arquivo(caminho)
+        anterior = carregados.get(caminho.name, {})
+        hash_conteudo = anterior.get('hash') if anterior.get('assinatura') == assinatura else hash_arquivo(caminho)
+        if incremental and anterior.get('hash') == hash_conteudo:
+            logger.info("%s não mudou desde a última carga, ignorando.", caminho.name)
+            continue
+        estado = progresso.get(caminho.name, {})
+        if estado.get('assinatura') != assinatura:
+            estado = {'assinatura': assinatura, 'linhas': 0, 'concluido': False}
+        if estado['concluido']:
+            logger.info("%s já carregado, ignorando.", caminho.name)
+            continue
+        ja_enviadas, lidas = estado['linhas'], 0
+        if ja_enviadas: logger.info("%s: retomando após %d linhas.", caminho.name, ja_enviadas)
+        for bloco in ler_em_blocos(caminho, tamanho_bloco):
+            inicio, lidas = lidas, lidas + len(bloco)
+            if lidas <= ja_enviadas: continue
+            if inicio < ja_enviadas: bloco = bloco.iloc[ja_enviadas - inicio:]
+            limpo = limpar_bloco(bloco, ano)
+            if incremental:
+                # Uma planilha pode trazer transações datadas em outro ano
+                for ano_linha in set(limpo[COLUNA_ANO].unique()) - anos_lidos:
+                    gravados.update(carregar_hashes(cliente, int(ano_linha)))
+                    anos_lidos.add(ano_linha)
+                anteriores = limpo[COLUNA_CHAVE].map(gravados).astype('string').fillna('')
+                limpo = limpo[anteriores != limpo[COLUNA_HASH]]
+            for posicao in range(0, len(limpo), tamanho_lote):
+                enviar_lote(cliente, para_registros(limpo.iloc[posicao:posicao + tamanho_lote]))
+            enviadas += len(limpo)
+            for ano_linha, quantidade in limpo[COLUNA_ANO].value_counts().items():
+                alteradas[int(ano_linha)] = alteradas.get(int(ano_linha), 0) + int(quantidade)
+            # Só depois do bloco inteiro confirmado; reenviar um bloco é inofensivo (upsert pela chave)
+            estado['linhas'] = lidas
+            progresso[caminho.name] = estado
+            gravar_progresso(diretorio, ano, progresso)
+            logger.info("%s: %d linhas lidas, %d enviadas.", caminho.name, lidas, enviadas)
+        estado['concluido'] = True
+        progresso[caminho.name] = estado
+        gravar_progresso(diretorio, ano, progresso)
+        registrar_arquivo(cliente, caminho, ano, assinatura, hash_conteudo, lidas)
+    for ano_alterado, quantidade in alteradas.items():
+        sinalizar_ano_alterado(cliente, ano_alterado, quantidade)
+    return {'ano': ano, 'arquivos': len(arquivos), 'linhas_enviadas': enviadas, 'anos_alterados': sorted(alteradas)}
+
+
+def localizar_planilhas(diretorio: Path) -> dict:
+    """Agrupa as planilhas por ano, identificado no nome do arquivo (ex.: 'GUIAS DE ITBI 2024.xlsx')."""
+    por_ano = {}
+    for caminho in sorted(diretorio.iterdir()) if diretorio.exists() else []:
+        ano = re.search(r'(?<!\d)(19|20)\d{2}(?!\d)', caminho.stem)
+        if caminho.suffix.lower() in EXTENSOES and ano and not caminho.name.startswith(('~', '.')):
+            por_ano.setdefault(int(ano.group(0)), []).append(caminho)
+    return por_ano
+
+
+def executar(anos: dict, diretorio: Path, processos: int = MAX_PROCESSOS, **opcoes) -> list:
+    """Processa cada ano em um processo separado (ou no próprio processo, se houver só um)."""
+    if len(anos) <= 1 or processos <= 1:
+        return [processar_ano(ano, arquivos, diretorio, **opcoes) for ano, arquivos in sorted(anos.items())]
+    resumos = []
+    with ProcessPoolExecutor(max_workers=min(processos, len(anos))) as executor:
+        futuros = {executor.submit(processar_ano, ano, arquivos, diretorio, **opcoes): ano for ano, arquivos in anos.items()}
+        for futuro in as_completed(futuros):
+            resumos.append(futuro.result())
+            logger.info("Ano %s concluído: %s", futuros[futuro], resumos[-1])
+    return sorted(resumos, key=lambda resumo: resumo['ano'])
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Carrega as planilhas de ITBI em transacoes_imobiliarias.")
+    modo = parser.add_mutually_exclusive_group(required=True)
+    modo.add_argument('--carga-total', action='store_true', help="Todos os anos (retoma uma carga interrompida).")
+    modo.add_argument('--atualizar', action='store_true', help="Envia só as planilhas e transações novas ou alteradas.")
+    modo.add_argument('--ano', type=int, help="Carrega um ano específico.")
+    modo.add_argument('--normalizar', action='store_true', help="Preenche logradouro_norm das transações já carregadas.")
+    parser.add_argument('--diretorio', default=os.getenv('ITBI_PLANILHAS_DIR', DIRETORIO_PLANILHAS))
+    parser.add_argument('--processos', type=int, default=MAX_PROCESSOS)
+    parser.add_argument('--bloco', type=int, default=TAMANHO_BLOCO, help="Linhas lidas da planilha por vez.")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="Linhas por requisição de upsert.")
+    parser.add_argument('--reiniciar', action='store_true', help="Ignora o progresso gravado e recomeça.")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(processName)s %(message)s')
+    if args.normalizar:
+        logger.info("Transações com logradouro_norm alterado: %d", normalizar_gravados(criar_cliente(), args.lote))
+        return 0
+
+    diretorio = Path(args.diretorio)
+    planilhas = localizar_planilhas(diretorio)
+    anos = {args.ano: planilhas.get(args.ano, [])} if args.ano else planilhas
+    anos = {ano: arquivos for ano, arquivos in anos.items() if arquivos}
+    if not anos:
+        logger.error("Nenhuma planilha encontrada em %s.", diretorio)
+        return 1
+
+    if args.reiniciar:
+        for ano in anos:
+            _arquivo_progresso(diretorio, ano).unlink(missing_ok=True)
+
+    resumos = executar(anos, diretorio, args.processos, tamanho_bloco=args.bloco, tamanho_lote=args.lote,
+                       incremental=args.atualizar)
+    for resumo in resumos:
+        logger.info("Ano %d: %d arquivo(s), %d linhas enviadas.", resumo['ano'], resumo['arquivos'], resumo['linhas_enviadas'])
+    alterados = sorted({ano for resumo in resumos for ano in resumo['anos_alterados']})
+    logger.info("Anos alterados: %s", ', '.join(map(str, alterados)) or 'nenhum')
+    if alterados:
+        cliente = criar_cliente()
+        atualizar_indice_ceps(cliente)
+        atualizar_tendencias(cliente, alterados)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
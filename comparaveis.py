@@ -0,0 +1,130 @@
+# comparaveis.py
+"""Transações comparáveis (comps) a um imóvel, pontuadas de forma vetorizada sobre um snapshot colunar."""
+
+import numpy as np
+import pandas as pd
+
+from esquema import (COLUNA_ID, COLUNA_ANO, COLUNA_CEP, COLUNA_NUMERO, COLUNA_VALOR, COLUNA_AREA_CONSTRUIDA,
+                     COLUNA_AREA_TERRENO, COLUNA_USO, PERFIS_COLUNAS)
+from normalizacao import DIGITOS_CEP, intervalo_cep
+
+QUANTIDADE_PADRAO = 10
+# Região procurada em volta do CEP do imóvel: setor (5 dígitos), sub-região (3) e região (2).
+# A região só é ampliada quando a menor não tem candidatos suficientes.
+NIVEIS_REGIAO = (5, 3, 2)
+CANDIDATOS_POR_COMPARAVEL = 5
+# Diferença que vale uma unidade de distância em cada atributo
+ESCALA_AREA = np.log(1.25)      # 25% maior ou menor
+ESCALA_TERRENO = np.log(1.5)
+ESCALA_ANO = 2.0                # anos
+ESCALA_CEP = 3.0                # dígitos do CEP em que os dois imóveis diferem
+COLUNAS_COMPARAVEIS = PERFIS_COLUNAS['analise']
+
+
+def cep_predominante(df: pd.DataFrame, numero: str = None):
+    """CEP mais frequente nas transações de um logradouro (só as do número, se houver alguma)."""
+    if df.empty or COLUNA_CEP not in df.columns: return None
+    if numero and COLUNA_NUMERO in df.columns:
+        mesmo_numero = df[df[COLUNA_NUMERO].astype(str).str.strip() == numero.strip()]
+        if not mesmo_numero.empty: df = mesmo_numero
+    ceps = pd.to_numeric(df[COLUNA_CEP], errors='coerce').dropna()
+    return int(ceps.mode().iloc[0]) if not ceps.empty else None
+
+
+def _numeros(serie: pd.Series, positivos: bool = False) -> np.ndarray:
+    """Coluna como float64, com NaN nos valores ausentes (e, com positivos, nos menores ou iguais a zero)."""
+    valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return np.where(valores > 0, valores, np.nan) if positivos else valores
+
+
+class BaseComparaveis:
+    """Snapshot ordenado por CEP: cada consulta pontua só a fatia da região, com operações NumPy.
+
+    Os atributos (área, terreno, ano, uso) ficam em arrays separados; as demais colunas só são
+    lidas para as linhas escolhidas.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        ceps = pd.to_numeric(df[COLUNA_CEP], errors='coerce') if COLUNA_CEP in df.columns else pd.Series(dtype='float64')
+        df = df[ceps.notna().to_numpy()]
+        ceps = ceps.dropna().to_numpy(dtype='int64')
+        ordem = np.argsort(ceps, kind='stable')
+        self.linhas = df.iloc[ordem].reset_index(drop=True)
+        self.ceps = ceps[ordem]
+        # Áreas em log: a diferença entre dois imóveis vira uma diferença relativa
+        self._area = np.log(_numeros(self._coluna(COLUNA_AREA_CONSTRUIDA), positivos=True))
+        self._terreno = np.log(_numeros(self._coluna(COLUNA_AREA_TERRENO), positivos=True))
+        self._anos = _numeros(self._coluna(COLUNA_ANO))
+        self._ids = np.nan_to_num(_numeros(self._coluna(COLUNA_ID)))
+        usos = pd.Categorical(self._coluna(COLUNA_USO))
+        self._usos, self._categorias_uso = usos.codes, usos.categories
+
+    def _coluna(self, coluna: str) -> pd.Series:
+        return self.linhas[coluna] if coluna in self.linhas.columns else pd.Series(None, index=self.linhas.index, dtype=object)
+
+    def __len__(self):
+        return len(self.ceps)
+
+    def usos(self) -> list:
+        """Usos do IPTU presentes no snapshot, do mais para o menos frequente."""
+        contagem = np.bincount(self._usos[self._usos >= 0], minlength=len(self._categorias_uso))
+        return [str(self._categorias_uso[i]) for i in np.argsort(-contagem, kind='stable') if contagem[i]]
+
+    def _codigos_uso(self, uso: str) -> np.ndarray:
+        """Categorias de uso iguais ao texto (sem diferenciar maiúsculas) ou, se nenhuma for, que o contêm."""
+        nomes = pd.Series(self._categorias_uso.astype(str)).str.casefold()
+        termo = uso.strip().casefold()
+        iguais = np.flatnonzero((nomes == termo).to_numpy())
+        return iguais if len(iguais) else np.flatnonzero(nomes.str.contains(termo, regex=False).to_numpy())
+
+    def _regiao(self, cep: int, digitos: int) -> tuple:
+        inicio, fim = intervalo_cep(f'{cep:0{DIGITOS_CEP}d}'[:digitos])
+        return int(np.searchsorted(self.ceps, inicio, 'left')), int(np.searchsorted(self.ceps, fim, 'right'))
+
+    def buscar(self, cep: int, area: float = None, ano: int = None, uso: str = None, terreno: float = None,
+               quantidade: int = QUANTIDADE_PADRAO) -> pd.DataFrame:
+        """As `quantidade` transações mais parecidas com o imóvel, da mais para a menos parecida.
+
+        A distância combina a diferença relativa de área e terreno, a diferença de ano e quantos
+        dígitos do CEP diferem; atributos não informados não entram na conta. O uso, se informado,
+        é filtro: só transações do mesmo uso do IPTU são comparáveis.
+        """
+        if not len(self) or cep is None: return self.linhas.head(0).assign(distancia=pd.Series(dtype='float64'))
+        cep = int(cep)
+        codigos_uso = self._codigos_uso(uso) if uso else None
+        for digitos in NIVEIS_REGIAO:
+            a, b = self._regiao(cep, digitos)
+            validos = np.ones(b - a, dtype=bool)
+            if codigos_uso is not None: validos &= np.isin(self._usos[a:b], codigos_uso)
+            if area: validos &= ~np.isnan(self._area[a:b])
+            if validos.sum() >= quantidade * CANDIDATOS_POR_COMPARAVEL: break
+        posicoes = a + np.flatnonzero(validos)
+
+        # Distância ao quadrado, somada atributo por atributo sobre os candidatos da região
+        distancia = np.zeros(len(posicoes))
+        if area:
+            distancia += ((self._area[posicoes] - np.log(area)) / ESCALA_AREA) ** 2
+        if terreno:
+            diferenca = (self._terreno[posicoes] - np.log(terreno)) / ESCALA_TERRENO
+            distancia += np.nan_to_num(diferenca, nan=1.0) ** 2   # terreno desconhecido conta como uma unidade
+        if ano:
+            distancia += np.nan_to_num((self._anos[posicoes] - ano) / ESCALA_ANO, nan=1.0) ** 2
+        # Dígitos iniciais em comum com o CEP do imóvel: 8 no mesmo CEP, 5 no mesmo setor
+        comuns = np.zeros(len(posicoes), dtype='int64')
+        for digito in range(1, DIGITOS_CEP + 1):
+            escala = 10 ** (DIGITOS_CEP - digito)
+            comuns += self.ceps[posicoes] // escala == cep // escala
+        distancia += ((DIGITOS_CEP - comuns) / ESCALA_CEP) ** 2
+
+        if len(posicoes) > quantidade:
+            melhores = np.argpartition(distancia, quantidade - 1)[:quantidade]
+        else:
+            melhores = np.arange(len(posicoes))
+        # Empates (mesma distância) ficam com a transação mais recente primeiro
+        melhores = melhores[np.lexsort((-self._ids[posicoes[melhores]], distancia[melhores]))]
+        resultado = self.linhas.take(posicoes[melhores]).reset_index(drop=True)
+        resultado.insert(0, 'distancia', np.sqrt(distancia[melhores]).round(2))
+        if COLUNA_VALOR in resultado.columns and COLUNA_AREA_CONSTRUIDA in resultado.columns:
+            resultado['valor_m2'] = resultado[COLUNA_VALOR].astype('float64') / \
+                resultado[COLUNA_AREA_CONSTRUIDA].astype('float64').replace(0, np.nan)
+        return resultado
@@ -0,0 +1,163 @@
+# consultas.py
+"""Montagem e execução das consultas à tabela transacoes_imobiliarias no Supabase."""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from esquema import (TABELA, TABELA_ATUALIZACOES, COLUNA_ID, COLUNA_ANO, COLUNA_LOGRADOURO, COLUNA_LOGRADOURO_NORM,
+                     COLUNA_NUMERO, COLUNA_CEP, compactar_tipos)
+from metricas import medir
+from normalizacao import intervalo_cep, padrao_logradouro
+
+TAMANHO_PAGINA = 1000   # máximo de linhas que o PostgREST devolve por requisição
+LIMITE_LINHAS = 50000   # teto padrão de linhas por busca
+MAX_PARALELO = 4        # requisições simultâneas por busca
+
+
+def aplicar_filtros(query, rua_normalizada: str = None, cep_limpo: str = None, numero: str = None, anos: list = None,
+                    rua_exata: bool = False):
+    """Aplica os filtros da busca a uma consulta do PostgREST.
+
+    cep_limpo é o CEP canônico (ver canonizar_cep): um prefixo ou faixa vira gte/lte sobre a coluna
+    inteira, atendido pelo mesmo índice que a igualdade. Com rua_exata, rua_normalizada é um nome escolhido no índice de logradouros e a consulta
+    usa igualdade (atendida pelo índice da coluna); sem ela, é a chave de normalizar_logradouro, buscada por
+    prefixo na coluna logradouro_norm (LIKE sem curinga inicial, atendido pelo índice text_pattern_ops).
+    """
+    if anos:
+        query = query.in_(COLUNA_ANO, anos)
+    if cep_limpo:
+        inicio, fim = intervalo_cep(cep_limpo)
+        query = query.eq(COLUNA_CEP, inicio) if inicio == fim else query.gte(COLUNA_CEP, inicio).lte(COLUNA_CEP, fim)
+    if rua_normalizada and rua_exata:
+        query = query.eq(COLUNA_LOGRADOURO, rua_normalizada)
+    elif rua_normalizada:
+        query = query.like(COLUNA_LOGRADOURO_NORM, padrao_logradouro(rua_normalizada))
+    if numero:
+        query = query.eq(COLUNA_NUMERO, numero)
+    return query
+
+
+def _dividir_intervalo(inicio: int, fim: int, partes: int) -> list:
+    """Divide o intervalo de ids [inicio, fim) em fatias, da mais recente para a mais antiga."""
+    passo = max(1, -(-(fim - inicio) // partes))
+    limites = list(range(fim, inicio, -passo)) + [inicio]
+    return [(max(baixo, inicio), alto) for alto, baixo in zip(limites, limites[1:])]
+
+
+def buscar_paginado(cliente, rua_normalizada: str = None, cep_limpo: str = None, numero: str = None, anos: list = None,
+                    colunas: str = '*', limite_linhas: int = LIMITE_LINHAS, max_paralelo: int = MAX_PARALELO,
+                    tamanho_pagina: int = TAMANHO_PAGINA, rua_exata: bool = False) -> pd.DataFrame:
+    """Percorre todo o conjunto de resultados por paginação em chave (id decrescente).
+
+    A primeira página traz os registros mais recentes. Se houver mais, o restante do intervalo
+    de ids é dividido em fatias percorridas em paralelo; com o teto de linhas, cada fatia lê só o
+    que as fatias mais recentes ainda não preencheram, então o resultado são sempre as
+    `limite_linhas` transações mais recentes. O DataFrame devolvido já vem com tipos compactos e
+    indica em df.attrs['truncado'] se há resultados além do teto.
+    """
+    def consulta():
+        query = cliente.table(TABELA).select(colunas)  # projeção já no formato 'a,b,c' (ver colunas_do_perfil)
+        return aplicar_filtros(query, rua_normalizada, cep_limpo, numero, anos, rua_exata)
+
+    def executar(query) -> list:
+        with medir('supabase.requisicao') as contexto:
+            dados = query.execute().data or []
+            contexto['linhas'] = len(dados)
+        return dados
+
+    def montar(pagina: list) -> pd.DataFrame:
+        with medir('busca.dataframe', linhas=len(pagina)):
+            return pd.DataFrame(pagina)
+
+    # Uma linha além do teto: só assim se sabe se existem resultados depois dele
+    alvo = limite_linhas + 1
+    pedido = min(tamanho_pagina, alvo)
+    primeira = executar(consulta().order(COLUNA_ID, desc=True).limit(pedido))
+    paginas = [montar(primeira)]
+
+    if len(primeira) == pedido and len(primeira) < alvo:
+        menor = executar(consulta().order(COLUNA_ID).limit(1))
+        fatias = _dividir_intervalo(menor[0][COLUNA_ID], primeira[-1][COLUNA_ID], max_paralelo) if menor else []
+        restante = alvo - len(primeira)
+        lock = threading.Lock()
+        obtidas = [0] * len(fatias)  # linhas lidas por fatia, da mais recente para a mais antiga
+
+        def percorrer(i):
+            inicio, cursor = fatias[i]
+            while True:
+                with lock:
+                    # Todas as linhas das fatias anteriores são mais recentes que as desta: se já
+                    # bastam para o teto, nenhuma linha desta fatia entraria no resultado
+                    if sum(obtidas[:i]) >= restante: return
+                    pedido_fatia = min(tamanho_pagina, restante - obtidas[i])
+                if pedido_fatia <= 0: return
+                pagina = executar(consulta().gte(COLUNA_ID, inicio).lt(COLUNA_ID, cursor)
+                                  .order(COLUNA_ID, desc=True).limit(pedido_fatia))
+                if pagina:
+                    quadro = montar(pagina)
+                    with lock:
+                        paginas.append(quadro)
+                        obtidas[i] += len(pagina)
+                if len(pagina) < pedido_fatia: return
+                cursor = pagina[-1][COLUNA_ID]
+
+        with ThreadPoolExecutor(max_workers=max_paralelo) as executor:
+            list(executor.map(percorrer, range(len(fatias))))
+
+    paginas = [p for p in paginas if not p.empty]
+    df = pd.concat(paginas, ignore_index=True) if paginas else pd.DataFrame()
+    truncado = len(df) > limite_linhas
+    if not df.empty:
+        with medir('busca.compactar', linhas=len(df)):
+            df = df.sort_values(COLUNA_ID, ascending=False, ignore_index=True).head(limite_linhas)
+            df = compactar_tipos(df)
+    df.attrs['truncado'] = truncado
+    return df
+
+
+def paginas_busca(cliente, rua_normalizada: str = None, cep_limpo: str = None, numero: str = None, anos: list = None,
+                  colunas: str = '*', rua_exata: bool = False, tamanho_pagina: int = TAMANHO_PAGINA):
+    """Gera todo o conjunto de resultados, uma página (DataFrame) por vez, do id mais recente ao mais antigo.
+
+    Ao contrário de buscar_paginado, não tem teto de linhas e não junta as páginas: quem consome
+    (a exportação) grava cada página e a descarta.
+    """
+    cursor = None
+    while True:
+        query = aplicar_filtros(cliente.table(TABELA).select(colunas), rua_normalizada, cep_limpo, numero, anos, rua_exata)
+        if cursor is not None:
+            query = query.lt(COLUNA_ID, cursor)
+        with medir('supabase.requisicao') as contexto:
+            pagina = query.order(COLUNA_ID, desc=True).limit(tamanho_pagina).execute().data or []
+            contexto['linhas'] = len(pagina)
+        if pagina:
+            yield pd.DataFrame(pagina)
+        if len(pagina) < tamanho_pagina: return
+        cursor = pagina[-1][COLUNA_ID]
+
+
+def contar_busca(cliente, rua_normalizada: str = None, cep_limpo: str = None, numero: str = None, anos: list = None,
+                 rua_exata: bool = False, metodo: str = 'estimated') -> int:
+    """Total de linhas da busca por uma requisição HEAD, sem transferir linhas.
+
+    Com 'estimated', o PostgREST conta exatamente até o teto de linhas configurado e, acima
+    dele, usa a estimativa do planejador do Postgres.
+    """
+    query = aplicar_filtros(cliente.table(TABELA).select(COLUNA_ID, count=metodo, head=True),
+                            rua_normalizada, cep_limpo, numero, anos, rua_exata)
+    with medir('supabase.requisicao'):
+        return int(query.execute().count or 0)
+
+
+def ler_anos(cliente) -> list:
+    """Anos distintos da tabela, pela função RPC get_distinct_anos."""
+    response = cliente.rpc('get_distinct_anos', {}).execute()
+    return [item['ano'] for item in response.data or []]
+
+
+def ler_atualizacoes(cliente) -> dict:
+    """Momento (em segundos) da última alteração de cada ano pelo coletor, da tabela coletor_atualizacoes."""
+    linhas = cliente.table(TABELA_ATUALIZACOES).select(f'{COLUNA_ANO},atualizado_em').execute().data or []
+    return {int(linha[COLUNA_ANO]): pd.Timestamp(linha['atualizado_em']).timestamp() for linha in linhas}
@@ -0,0 +1,81 @@
+# esquema.py
+"""Nomes, perfis de colunas e tipos de transacoes_imobiliarias usados pela aplicação."""
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # só para as anotações (o pandas é importado dentro das funções)
+    import pandas as pd
+
+TABELA = 'transacoes_imobiliarias'
+# Anos alterados pelo coletor, lidos pela aplicação para invalidar só os caches desses anos
+TABELA_ATUALIZACOES = 'coletor_atualizacoes'
+
+# Chave primária sequencial da tabela (usada na sincronização incremental e na paginação)
+COLUNA_ID = 'id'
+COLUNA_ANO = 'ano_transacao'
+COLUNA_LOGRADOURO = 'nome_do_logradouro'
+# Chave de normalizacao.normalizar_logradouro, gravada pelo coletor e indexada (sql/logradouro_norm.sql)
+COLUNA_LOGRADOURO_NORM = 'logradouro_norm'
+COLUNA_NUMERO = 'numero'
+COLUNA_CEP = 'cep'
+COLUNA_BAIRRO = 'bairro'
+COLUNA_VALOR = 'valor_de_transacao_declarado_pelo_contribuinte'
+COLUNA_DATA = 'data_de_transacao'
+COLUNA_AREA_CONSTRUIDA = 'area_construida_m2'
+COLUNA_AREA_TERRENO = 'area_do_terreno_m2'
+COLUNA_USO = 'descricao_do_uso_iptu'
+
+# --- Perfis de colunas (projeção enviada no select) ---
+
+PERFIS_COLUNAS = {
+    'listagem': [
+        COLUNA_ID, COLUNA_ANO, COLUNA_DATA, COLUNA_LOGRADOURO, COLUNA_NUMERO, 'complemento',
+        COLUNA_BAIRRO, COLUNA_CEP, COLUNA_VALOR, COLUNA_AREA_CONSTRUIDA, COLUNA_USO,
+    ],
+    'analise': [
+        COLUNA_ID, COLUNA_ANO, COLUNA_DATA, COLUNA_LOGRADOURO, COLUNA_BAIRRO, COLUNA_CEP,
+        COLUNA_VALOR, 'valor_venal_de_referencia', COLUNA_AREA_CONSTRUIDA, COLUNA_AREA_TERRENO,
+        COLUNA_USO, 'descricao_do_padrao_iptu', 'natureza_de_transacao', 'tipo_de_financiamento',
+    ],
+    'completo': ['*'],
+}
+PERFIL_PADRAO = 'listagem'
+
+
+def colunas_do_perfil(perfil: str) -> str:
+    """Lista de colunas do perfil no formato aceito pelo select do PostgREST."""
+    return ','.join(PERFIS_COLUNAS.get(perfil, PERFIS_COLUNAS[PERFIL_PADRAO]))
+
+# --- Tipos compactos ---
+
+COLUNAS_CATEGORICAS = [
+    COLUNA_LOGRADOURO, COLUNA_LOGRADOURO_NORM, COLUNA_BAIRRO, 'referencia', 'natureza_de_transacao', 'tipo_de_financiamento',
+    'cartorio_de_registro', 'situacao_do_sql', 'uso_iptu', COLUNA_USO, 'padrao_iptu', 'descricao_do_padrao_iptu',
+]
+COLUNAS_INTEIRAS = [COLUNA_CEP, COLUNA_ANO]
+# Áreas e proporções cabem em float32; valores monetários ficam em float64 para não perder centavos
+COLUNAS_FLOAT32 = [COLUNA_AREA_CONSTRUIDA, COLUNA_AREA_TERRENO, 'testada_m', 'fracao_ideal', 'proporcao_transmitida']
+COLUNAS_MONETARIAS = [
+    COLUNA_VALOR, 'valor_venal_de_referencia', 'valor_venal_de_referencia_proporcional',
+    'base_de_calculo_adotada', 'valor_financiado',
+]
+COLUNAS_DATA = [COLUNA_DATA]
+
+
+def compactar_tipos(df: 'pd.DataFrame') -> 'pd.DataFrame':
+    """Converte as colunas conhecidas para tipos compactos (categorias, int32, float32, datas)."""
+    import pandas as pd  # importado aqui: o formulário usa os perfis acima antes de o pandas ser carregado
+    if df.empty: return df
+    for coluna in df.columns.intersection(COLUNAS_CATEGORICAS):
+        if not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    for coluna in df.columns.intersection(COLUNAS_INTEIRAS):
+        valores = pd.to_numeric(df[coluna], errors='coerce')
+        df[coluna] = valores.astype('Int32' if valores.isna().any() else 'int32')
+    for coluna in df.columns.intersection(COLUNAS_FLOAT32):
+        df[coluna] = pd.to_numeric(df[coluna], errors='coerce').astype('float32')
+    for coluna in df.columns.intersection(COLUNAS_MONETARIAS):
+        df[coluna] = pd.to_numeric(df[coluna], errors='coerce')
+    for coluna in df.columns.intersection(COLUNAS_DATA):
+        df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+    return df
@@ -0,0 +1,174 @@
+# exportacao.py
+"""Exportação do conjunto completo de resultados para CSV, Parquet ou XLSX, gravado página por página."""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from esquema import COLUNA_ID, compactar_tipos
+from formatacao import FORMATOS_COLUNAS, formatar_para_texto
+
+TAMANHO_BLOCO = 5000
+MAX_LINHAS_PLANILHA = 1_048_575   # limite de linhas de uma aba do Excel, sem o cabeçalho
+# Páginas guardadas até que toda coluna tenha um valor não nulo e o tipo do Parquet possa ser fixado
+MAX_PAGINAS_ESQUEMA = 20
+
+FORMATOS = {
+    'csv': ('CSV', 'text/csv'),
+    'parquet': ('Parquet', 'application/vnd.apache.parquet'),
+    'xlsx': ('Excel (XLSX)', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+# Formato de número do Excel para cada tipo de FORMATOS_COLUNAS (o valor da célula continua numérico)
+FORMATOS_EXCEL = {
+    'moeda': '"R$" #,##0.00',
+    'area': '#,##0.00 "m²"',
+    'percentual': '0.00"%"',
+    'data': 'DD/MM/YYYY',
+}
+
+
+def em_blocos(df: pd.DataFrame, tamanho: int = TAMANHO_BLOCO):
+    """Fatia um resultado já em memória nas mesmas páginas que a exportação consome."""
+    for inicio in range(0, len(df), tamanho):
+        yield df.iloc[inicio:inicio + tamanho]
+
+
+def _normalizar(pagina: pd.DataFrame) -> pd.DataFrame:
+    """Tipos iguais em todas as páginas: categorias viram texto e números soltos viram float64.
+
+    O JSON do PostgREST traz 1500.0 como inteiro, então uma coluna numérica pode chegar como int64
+    numa página e float64 na seguinte; só o id é mantido inteiro.
+    """
+    pagina = compactar_tipos(pagina.copy())
+    for coluna in pagina.columns:
+        serie = pagina[coluna]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            pagina[coluna] = serie.astype(object).where(serie.notna(), None)
+        elif coluna == COLUNA_ID:
+            pagina[coluna] = pd.to_numeric(serie, errors='coerce').astype('Int64')
+        elif pd.api.types.is_integer_dtype(serie.dtype) and serie.dtype.itemsize == 8:
+            pagina[coluna] = serie.astype('float64')
+    return pagina
+
+
+# --- CSV ---
+
+def _exportar_csv(paginas, destino, formatar: bool, ao_progredir) -> int:
+    linhas = 0
+    with open(destino, 'w', encoding='utf-8-sig', newline='') as arquivo:  # BOM: o Excel reconhece os acentos
+        for pagina in paginas:
+            if formatar: pagina = formatar_para_texto(pagina)
+            pagina.to_csv(arquivo, index=False, header=linhas == 0, date_format='%Y-%m-%d')
+            linhas += len(pagina)
+            ao_progredir(linhas)
+    return linhas
+
+
+# --- Parquet ---
+
+def _esquema(tabelas: list) -> pa.Schema:
+    """Tipo de cada coluna pela primeira página em que ela não é toda nula (ou texto, se nunca aparecer)."""
+    campos = []
+    for campo in tabelas[0].schema:
+        tipo = next((t.schema.field(campo.name).type for t in tabelas if not pa.types.is_null(t.schema.field(campo.name).type)),
+                    pa.string())
+        campos.append(pa.field(campo.name, tipo))
+    return pa.schema(campos)
+
+
+def _exportar_parquet(paginas, destino, formatar: bool, ao_progredir) -> int:
+    """Uma row group por página; os valores ficam sempre tipados (a formatação em R$ não se aplica)."""
+    linhas, escritor, pendentes = 0, None, []
+
+    def gravar(tabela):
+        nonlocal linhas
+        escritor.write_table(tabela.cast(escritor.schema))
+        linhas += tabela.num_rows
+        ao_progredir(linhas)
+
+    try:
+        for pagina in paginas:
+            tabela = pa.Table.from_pandas(_normalizar(pagina), preserve_index=False)
+            if escritor is not None:
+                gravar(tabela)
+                continue
+            pendentes.append(tabela)
+            nulas = any(all(pa.types.is_null(t.schema.field(campo.name).type) for t in pendentes)
+                        for campo in tabela.schema)
+            if not nulas or len(pendentes) >= MAX_PAGINAS_ESQUEMA:
+                escritor = pq.ParquetWriter(destino, _esquema(pendentes), compression='zstd')
+                for tabela in pendentes: gravar(tabela)
+                pendentes = []
+        if escritor is None and pendentes:
+            escritor = pq.ParquetWriter(destino, _esquema(pendentes), compression='zstd')
+            for tabela in pendentes: gravar(tabela)
+    finally:
+        if escritor is not None: escritor.close()
+    if escritor is None:
+        pq.write_table(pa.table({}), destino)
+    return linhas
+
+
+# --- XLSX ---
+
+def _celula(valor):
+    """Valor aceito pelo openpyxl: nulos vazios, datas do Python e números nativos."""
+    if valor is None or valor is pd.NaT or (isinstance(valor, float) and np.isnan(valor)): return None
+    if isinstance(valor, pd.Timestamp): return valor.to_pydatetime()
+    if isinstance(valor, np.generic): return valor.item()
+    return valor
+
+
+def _exportar_xlsx(paginas, destino, formatar: bool, ao_progredir) -> int:
+    """Planilha em modo write_only (as linhas vão para o disco à medida que são escritas).
+
+    Com formatar, as colunas de FORMATOS_COLUNAS recebem formato de número do Excel (R$, m², %),
+    sem deixar de ser numéricas. Acima do limite de linhas de uma aba, continua em uma nova aba.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+
+    livro = Workbook(write_only=True)
+    aba, linhas_aba, linhas, colunas, formatos = None, 0, 0, None, {}
+    for pagina in paginas:
+        pagina = _normalizar(pagina)
+        if colunas is None:
+            colunas = list(pagina.columns)
+            formatos = {i: FORMATOS_EXCEL[FORMATOS_COLUNAS[c][0]] for i, c in enumerate(colunas)
+                        if formatar and c in FORMATOS_COLUNAS}
+            formatos.update({i: FORMATOS_EXCEL['data'] for i, c in enumerate(colunas)
+                             if pd.api.types.is_datetime64_any_dtype(pagina[c].dtype)})
+        for linha in pagina[colunas].itertuples(index=False, name=None):
+            if aba is None or linhas_aba >= MAX_LINHAS_PLANILHA:
+                aba = livro.create_sheet(f'ITBI {len(livro.worksheets) + 1}')
+                aba.append(colunas)
+                linhas_aba = 0
+            valores = [_celula(valor) for valor in linha]
+            for i, formato in formatos.items():
+                if valores[i] is not None:
+                    celula = WriteOnlyCell(aba, value=valores[i])
+                    celula.number_format = formato
+                    valores[i] = celula
+            aba.append(valores)
+            linhas_aba += 1
+        linhas += len(pagina)
+        ao_progredir(linhas)
+    if aba is None:
+        livro.create_sheet('ITBI 1')
+    livro.save(destino)
+    return linhas
+
+
+EXPORTADORES = {'csv': _exportar_csv, 'parquet': _exportar_parquet, 'xlsx': _exportar_xlsx}
+
+
+def exportar(paginas, formato: str, destino, formatar: bool = False, ao_progredir=None) -> int:
+    """Grava as páginas (iterável de DataFrames) em destino e devolve o número de linhas.
+
+    Só uma página fica em memória por vez. formatar converte os valores para o padrão brasileiro
+    (R$ 1.234,56) no CSV e aplica formatos de número no XLSX; desligado, as colunas continuam numéricas.
+    """
+    if formato not in EXPORTADORES:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+    return EXPORTADORES[formato](paginas, destino, formatar, ao_progredir or (lambda linhas: None))
@@ -0,0 +1,116 @@
+# formatacao.py
+"""Formatação de colunas para exibição: configuração de colunas do Streamlit e formatadores vetorizados."""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from esquema import COLUNA_VALOR, COLUNA_DATA, COLUNA_AREA_CONSTRUIDA, COLUNA_AREA_TERRENO
+
+DIGITOS_INTEIROS = 15  # suficiente para valores até R$ 999 trilhões
+
+# Formato de exibição declarado por coluna: (tipo, rótulo)
+FORMATOS_COLUNAS = {
+    COLUNA_VALOR: ('moeda', 'Valor declarado (R$)'),
+    'valor_venal_de_referencia': ('moeda', 'Valor venal de referência (R$)'),
+    'valor_venal_de_referencia_proporcional': ('moeda', 'Valor venal proporcional (R$)'),
+    'base_de_calculo_adotada': ('moeda', 'Base de cálculo (R$)'),
+    'valor_financiado': ('moeda', 'Valor financiado (R$)'),
+    COLUNA_AREA_CONSTRUIDA: ('area', 'Área construída (m²)'),
+    COLUNA_AREA_TERRENO: ('area', 'Área do terreno (m²)'),
+    'proporcao_transmitida': ('percentual', 'Proporção transmitida (%)'),
+    COLUNA_DATA: ('data', 'Data da transação'),
+    # Estatísticas calculadas pela aplicação
+    'valor_mediano': ('moeda', 'Valor mediano (R$)'),
+    'valor_p10': ('moeda', 'Percentil 10 (R$)'),
+    'valor_p25': ('moeda', 'Percentil 25 (R$)'),
+    'valor_p75': ('moeda', 'Percentil 75 (R$)'),
+    'valor_p90': ('moeda', 'Percentil 90 (R$)'),
+    'valor_minimo': ('moeda', 'Valor mínimo (R$)'),
+    'valor_maximo': ('moeda', 'Valor máximo (R$)'),
+    'valor_m2_mediano': ('moeda', 'Valor mediano por m² (R$)'),
+    'valor_m2_p25': ('moeda', 'Valor por m², percentil 25 (R$)'),
+    'valor_m2_p75': ('moeda', 'Valor por m², percentil 75 (R$)'),
+    'valor_m2': ('moeda', 'Valor por m² (R$)'),
+}
+
+# --- Configuração de colunas do st.dataframe (sem copiar nem converter os dados) ---
+
+def configuracao_colunas(colunas) -> dict:
+    """Monta o column_config do Streamlit para as colunas formatadas, mantendo os valores numéricos."""
+    import streamlit as st
+
+    config = {}
+    for coluna in colunas:
+        if coluna not in FORMATOS_COLUNAS: continue
+        tipo, rotulo = FORMATOS_COLUNAS[coluna]
+        if tipo == 'data':
+            config[coluna] = st.column_config.DateColumn(rotulo, format="DD/MM/YYYY")
+        elif tipo == 'percentual':
+            config[coluna] = st.column_config.NumberColumn(rotulo, format="%.2f%%")
+        else:
+            # 'localized' usa o separador de milhar e decimal do navegador (1.234,56 em pt-BR)
+            config[coluna] = st.column_config.NumberColumn(rotulo, format="localized")
+    return config
+
+# --- Formatadores vetorizados (para textos, exportações e gráficos) ---
+
+def _numero_br(serie: pd.Series, casas: int = 2) -> tuple:
+    """Formata o módulo dos números no padrão brasileiro (1.234.567,89) e devolve também os sinais."""
+    valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    nulos = np.isnan(valores)
+    escala = 10 ** casas
+    total = np.rint(np.abs(np.where(nulos, 0, valores)) * escala).astype('int64')
+    digitos = pc.utf8_lpad(pc.cast(pa.array(total), pa.string()), DIGITOS_INTEIROS + casas, '0')
+    grupos = [pc.utf8_slice_codeunits(digitos, i, i + 3) for i in range(0, DIGITOS_INTEIROS, 3)]
+    texto = pc.utf8_ltrim(pc.binary_join_element_wise(*grupos, '.'), '0.')
+    texto = pc.if_else(pc.equal(texto, ''), '0', texto)
+    if casas:
+        decimais = pc.utf8_slice_codeunits(digitos, DIGITOS_INTEIROS, DIGITOS_INTEIROS + casas)
+        texto = pc.binary_join_element_wise(texto, decimais, ',')
+    sinais = pc.if_else(pa.array((valores < 0) & (total > 0)), '-', '')
+    return pc.if_else(pa.array(nulos), pa.scalar(None, pa.string()), texto), sinais
+
+
+def _com_afixos(numero: tuple, indice, prefixo: str = '', sufixo: str = '', vazio: str = 'N/A') -> pd.Series:
+    texto, sinais = numero
+    texto = pc.binary_join_element_wise(sinais, prefixo, texto, sufixo, '')
+    return pd.Series(pc.fill_null(texto, vazio).to_pandas(), index=indice)
+
+
+def formatar_moeda(serie: pd.Series) -> pd.Series:
+    """R$ 1.234.567,89"""
+    return _com_afixos(_numero_br(serie, 2), serie.index, prefixo='R$ ')
+
+
+def formatar_area(serie: pd.Series, casas: int = 2) -> pd.Series:
+    """1.234,50 m²"""
+    return _com_afixos(_numero_br(serie, casas), serie.index, sufixo=' m²')
+
+
+def formatar_percentual(serie: pd.Series, casas: int = 2) -> pd.Series:
+    """12,50%"""
+    return _com_afixos(_numero_br(serie, casas), serie.index, sufixo='%')
+
+
+def formatar_data(serie: pd.Series) -> pd.Series:
+    """31/12/2024"""
+    return pd.to_datetime(serie, errors='coerce').dt.strftime('%d/%m/%Y').fillna('N/A')
+
+
+FORMATADORES = {
+    'moeda': formatar_moeda,
+    'area': formatar_area,
+    'percentual': formatar_percentual,
+    'data': formatar_data,
+}
+
+
+def formatar_para_texto(df: pd.DataFrame) -> pd.DataFrame:
+    """Devolve uma cópia com as colunas declaradas em FORMATOS_COLUNAS convertidas em texto."""
+    formatado = df.copy(deep=False)
+    for coluna in df.columns.intersection(list(FORMATOS_COLUNAS)):
+        tipo, _ = FORMATOS_COLUNAS[coluna]
+        formatado[coluna] = FORMATADORES[tipo](df[coluna])
+    return formatado
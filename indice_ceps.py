@@ -0,0 +1,71 @@
+# indice_ceps.py
+"""Índice de transações por CEP e logradouro, para dimensionar e dividir buscas por setor ou faixa de CEP."""
+
+import numpy as np
+import pandas as pd
+
+TAMANHO_PAGINA = 1000
+
+
+def carregar_contagem_ceps(cliente) -> pd.DataFrame:
+    """Baixa, página por página, o índice pré-calculado (RPC get_cep_logradouros)."""
+    linhas, inicio = [], 0
+    while True:
+        response = cliente.rpc('get_cep_logradouros', {}).range(inicio, inicio + TAMANHO_PAGINA - 1).execute()
+        pagina = response.data or []
+        linhas.extend(pagina)
+        if len(pagina) < TAMANHO_PAGINA: break
+        inicio += TAMANHO_PAGINA
+    return pd.DataFrame(linhas, columns=['cep', 'logradouro', 'total'])
+
+
+class IndiceCeps:
+    """Contagens por CEP em ordem, com soma acumulada: o total de uma faixa sai de duas buscas binárias.
+
+    As contagens somam todos os anos, então com filtro de ano são um teto do tamanho da busca.
+    """
+
+    def __init__(self, contagens: pd.DataFrame):
+        # contagens: colunas cep, logradouro e total
+        contagens = contagens.dropna(subset=['cep'])
+        por_cep = contagens.groupby('cep')['total'].sum().sort_index()
+        self.ceps = por_cep.index.to_numpy(dtype='int64')
+        self._acumulado = np.concatenate([[0], np.cumsum(por_cep.to_numpy(dtype='int64'))])
+        ordem = np.argsort(contagens['cep'].to_numpy(dtype='int64'), kind='stable')
+        self._logradouros = contagens.iloc[ordem].reset_index(drop=True)
+        self._ceps_logradouros = self._logradouros['cep'].to_numpy(dtype='int64')
+
+    def __len__(self):
+        return len(self.ceps)
+
+    def _posicoes(self, inicio: int, fim: int) -> tuple:
+        return np.searchsorted(self.ceps, inicio, 'left'), np.searchsorted(self.ceps, fim, 'right')
+
+    def resumo(self, inicio: int, fim: int) -> dict:
+        """CEPs com transações e número de transações na faixa [inicio, fim]."""
+        a, b = self._posicoes(inicio, fim)
+        return {'ceps': int(b - a), 'transacoes': int(self._acumulado[b] - self._acumulado[a])}
+
+    def logradouros(self, inicio: int, fim: int, quantidade: int = 5) -> pd.Series:
+        """Logradouros com mais transações na faixa."""
+        a = np.searchsorted(self._ceps_logradouros, inicio, 'left')
+        b = np.searchsorted(self._ceps_logradouros, fim, 'right')
+        faixa = self._logradouros.iloc[a:b]
+        return faixa.groupby('logradouro')['total'].sum().nlargest(quantidade)
+
+    def partes(self, inicio: int, fim: int, max_transacoes: int) -> list:
+        """Divide a faixa em subfaixas com até max_transacoes cada: [(inicio, fim, transações)].
+
+        As partes são contíguas e cobrem toda a faixa, inclusive CEPs que surgiram depois do cálculo
+        do índice. Um único CEP maior que o limite fica sozinho na sua parte.
+        """
+        a, b = self._posicoes(inicio, fim)
+        partes, inicio_parte = [], inicio
+        while a < b:
+            # Primeiro CEP que já não cabe na parte (pelo menos um CEP por parte)
+            c = max(a + 1, int(np.searchsorted(self._acumulado, self._acumulado[a] + max_transacoes, 'right')) - 1)
+            c = min(c, b)
+            fim_parte = int(self.ceps[c]) - 1 if c < b else fim
+            partes.append((inicio_parte, fim_parte, int(self._acumulado[c] - self._acumulado[a])))
+            inicio_parte, a = fim_parte + 1, c
+        return partes or [(inicio, fim, 0)]
@@ -0,0 +1,76 @@
+# indice_logradouros.py
+"""Índice de trigramas e prefixos sobre os nomes distintos de logradouro, para sugerir nomes enquanto o usuário digita."""
+
+from bisect import bisect_left
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from normalizacao import normalizar_busca
+
+TAMANHO_PAGINA = 1000
+SIMILARIDADE_MINIMA = 0.2
+# A partir desta pontuação a primeira sugestão já vem selecionada na interface
+PONTUACAO_CONFIANTE = 0.6
+
+
+def _trigramas(texto: str) -> set:
+    """Trigramas no estilo do pg_trgm (com espaços de preenchimento nas bordas)."""
+    texto = f'  {texto} '
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+def carregar_logradouros(cliente) -> pd.Series:
+    """Baixa, página por página, a contagem de transações por logradouro (RPC get_distinct_logradouros)."""
+    linhas, inicio = [], 0
+    while True:
+        response = cliente.rpc('get_distinct_logradouros', {}).range(inicio, inicio + TAMANHO_PAGINA - 1).execute()
+        pagina = response.data or []
+        linhas.extend(pagina)
+        if len(pagina) < TAMANHO_PAGINA: break
+        inicio += TAMANHO_PAGINA
+    return pd.Series({item['logradouro']: item['total'] for item in linhas}, dtype='int64')
+
+
+class IndiceLogradouros:
+    """Sugestões de logradouro ordenadas por prefixo, similaridade de trigramas e número de transações."""
+
+    def __init__(self, contagens: pd.Series):
+        # contagens: nome como gravado no banco -> número de transações
+        pares = sorted((normalizar_busca(str(nome)), str(nome), int(total)) for nome, total in contagens.items() if nome)
+        self.chaves = [chave for chave, _, _ in pares]
+        self.nomes = [nome for _, nome, _ in pares]
+        self.totais = np.array([total for _, _, total in pares], dtype=np.int64)
+        postagens = defaultdict(list)
+        quantidades = np.zeros(len(pares), dtype=np.int32)
+        for posicao, chave in enumerate(self.chaves):
+            trigramas = _trigramas(chave)
+            quantidades[posicao] = len(trigramas)
+            for trigrama in trigramas:
+                postagens[trigrama].append(posicao)
+        self._postagens = {t: np.array(p, dtype=np.int32) for t, p in postagens.items()}
+        self._quantidades = quantidades
+
+    def __len__(self):
+        return len(self.chaves)
+
+    def sugerir(self, texto: str, limite: int = 10) -> list:
+        """Devolve até `limite` tuplas (nome, total de transações, pontuação), da melhor para a pior."""
+        termo = normalizar_busca(texto)
+        if not termo or not self.chaves: return []
+        trigramas = _trigramas(termo)
+        listas = [self._postagens[t] for t in trigramas if t in self._postagens]
+        if listas:
+            acertos = np.bincount(np.concatenate(listas), minlength=len(self.chaves))
+            pontuacao = acertos / (len(trigramas) + self._quantidades - acertos)
+        else:
+            pontuacao = np.zeros(len(self.chaves))
+        # Nomes que começam com o termo digitado vêm antes de qualquer semelhança parcial
+        inicio, fim = bisect_left(self.chaves, termo), bisect_left(self.chaves, termo + '\uffff')
+        pontuacao[inicio:fim] += 1.0
+        candidatos = np.flatnonzero(pontuacao >= SIMILARIDADE_MINIMA)
+        if len(candidatos) > limite:
+            candidatos = candidatos[np.argpartition(-pontuacao[candidatos], limite)[:limite]]
+        ordem = np.lexsort((-self.totais[candidatos], -pontuacao[candidatos]))
+        return [(self.nomes[i], int(self.totais[i]), float(min(pontuacao[i], 1.0))) for i in candidatos[ordem]]
@@ -0,0 +1,105 @@
+# indice_refino.py
+"""Índice em memória para o filtro "Refine sua busca" sobre um conjunto de resultados."""
+
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Colunas com mais valores distintos que isso ganham um índice invertido de trigramas;
+# abaixo disso, varrer os valores distintos já é mais rápido que consultar o índice.
+LIMIAR_TRIGRAMAS = 2000
+# Ao cruzar as listas de trigramas, para quando sobram poucos candidatos e confere o texto deles
+MAX_CANDIDATOS = 256
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas e sem acentos, para comparar o texto digitado com os valores da coluna."""
+    return ''.join(c for c in unicodedata.normalize('NFD', str(texto)) if unicodedata.category(c) != 'Mn').lower()
+
+
+def _normalizar_serie(serie: pd.Series) -> pd.Series:
+    """Versão vetorizada de normalizar_texto para os valores distintos de uma coluna."""
+    return serie.str.normalize('NFD').str.replace('[\u0300-\u036f]', '', regex=True).str.lower()
+
+
+def _trigramas(texto: str) -> set:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class _ColunaIndexada:
+    """Valores distintos normalizados de uma coluna e o código de cada linha."""
+
+    def __init__(self, serie: pd.Series):
+        codigos, distintos = pd.factorize(serie, sort=False)
+        self.codigos = codigos
+        self.valores = _normalizar_serie(pd.Series(np.asarray(distintos, dtype=object)).astype(str))
+        self._postagens = None
+
+    def _indice(self) -> dict:
+        """Índice invertido trigrama -> posições dos valores distintos, montado na primeira consulta."""
+        if self._postagens is None:
+            postagens = defaultdict(list)
+            for posicao, valor in enumerate(self.valores):
+                for trigrama in _trigramas(valor):
+                    postagens[trigrama].append(posicao)
+            self._postagens = {t: np.array(p, dtype=np.int32) for t, p in postagens.items()}
+        return self._postagens
+
+    def valores_contendo(self, termo: str) -> np.ndarray:
+        """Posições dos valores distintos que contêm o termo (já normalizado)."""
+        candidatos = None
+        if len(termo) >= 3 and len(self.valores) > LIMIAR_TRIGRAMAS:
+            indice = self._indice()
+            listas = [indice.get(t) for t in _trigramas(termo)]
+            if any(lista is None for lista in listas): return np.empty(0, dtype=np.int64)
+            listas.sort(key=len)
+            candidatos = listas[0]
+            for lista in listas[1:]:
+                if len(candidatos) <= MAX_CANDIDATOS: break
+                candidatos = np.intersect1d(candidatos, lista, assume_unique=True)
+        valores = self.valores if candidatos is None else self.valores.iloc[candidatos]
+        encontrados = valores.str.contains(termo, regex=False).to_numpy(dtype=bool)
+        return np.flatnonzero(encontrados) if candidatos is None else candidatos[encontrados]
+
+    def mascara(self, termo: str) -> np.ndarray:
+        """Máscara booleana das linhas cujo valor contém o termo."""
+        # A última posição fica sempre False e absorve o código -1 dos valores nulos
+        acerto = np.zeros(len(self.valores) + 1, dtype=bool)
+        acerto[self.valores_contendo(termo)] = True
+        return acerto[self.codigos]
+
+
+class IndiceRefino:
+    """Índice de busca por substring sobre todas as colunas de um resultado, criado uma vez por busca.
+
+    Os valores distintos de cada coluna são normalizados na criação; o índice de trigramas de
+    cada coluna é montado na primeira vez em que ela é filtrada e reaproveitado depois.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.tamanho = len(df)
+        self._colunas = {coluna: _ColunaIndexada(df[coluna]) for coluna in df.columns}
+
+    def tamanho_em_bytes(self) -> int:
+        """Memória aproximada do índice (códigos por linha e valores distintos normalizados)."""
+        return sum(int(c.codigos.nbytes + c.valores.memory_usage(deep=True)) for c in self._colunas.values())
+
+    def mascara(self, filtros: dict) -> np.ndarray:
+        """Combina (E) os filtros {coluna: texto}; filtros vazios são ignorados."""
+        mascara = np.ones(self.tamanho, dtype=bool)
+        for coluna, texto in filtros.items():
+            termo = normalizar_texto(texto).strip() if texto else ''
+            if termo and coluna in self._colunas:
+                mascara &= self._colunas[coluna].mascara(termo)
+        return mascara
+
+    def posicoes(self, filtros: dict) -> np.ndarray:
+        """Posições das linhas que passam nos filtros: a visão refinada de um resultado compartilhado."""
+        return np.flatnonzero(self.mascara(filtros))
+
+    def filtrar(self, df: pd.DataFrame, filtros: dict) -> pd.DataFrame:
+        """Aplica os filtros ao DataFrame que originou o índice."""
+        if not any(filtros.values()): return df
+        return df.take(self.posicoes(filtros))
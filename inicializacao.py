@@ -0,0 +1,188 @@
+# inicializacao.py
+"""Partida rápida: tarefas de arranque em segundo plano e estado persistido entre reinícios (anos e buscas populares).
+
+Não importa pandas nem supabase: é carregado antes do formulário ser desenhado.
+"""
+
+import atexit
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MAX_TAREFAS_SIMULTANEAS = 4
+PREFIXO_THREADS = 'partida'    # nome das threads do pool, para reconhecer chamadas feitas de dentro de uma tarefa
+MAX_BUSCAS_GUARDADAS = 500     # buscas distintas mantidas no arquivo de estado
+INTERVALO_GRAVACAO = 60        # segundos entre gravações do arquivo de estado
+
+
+@dataclass
+class _Tarefa:
+    funcao: object
+    validade: float = None     # segundos; depois disso o valor é recalculado em segundo plano
+    futuro: object = None
+    valor: object = None
+    pronta: bool = False
+    concluida_em: float = 0.0
+
+
+class Partida:
+    """Tarefas nomeadas executadas em segundo plano, com o último valor servido enquanto é recalculado.
+
+    Uma tarefa só pode esperar por tarefas registradas antes dela (a fila é executada em ordem); a
+    repetição de uma tarefa que falhou, pedida de dentro de outra, roda na thread de quem a pediu.
+    """
+
+    def __init__(self, arquivo_estado=None, max_buscas: int = MAX_BUSCAS_GUARDADAS):
+        self.arquivo = Path(arquivo_estado) if arquivo_estado else None
+        self.max_buscas = max_buscas
+        self._executor = ThreadPoolExecutor(max_workers=MAX_TAREFAS_SIMULTANEAS, thread_name_prefix=PREFIXO_THREADS)
+        self._tarefas = {}  # nome -> _Tarefa
+        # Reentrante: add_done_callback executa concluir() na hora se a tarefa já terminou
+        self._lock = threading.RLock()
+        self._estado = self._ler_estado()
+        self._gravado_em = 0.0
+        atexit.register(self._gravar_estado, forcar=True)  # contagens desde a última gravação
+
+    # --- Tarefas ---
+
+    def tarefa(self, nome: str, funcao, validade: float = None):
+        """Registra e inicia a tarefa; registrar de novo um nome existente não faz nada."""
+        with self._lock:
+            if nome in self._tarefas: return
+            self._tarefas[nome] = tarefa = _Tarefa(funcao, validade)
+            self._iniciar(nome, tarefa)
+
+    def _executar(self, nome: str, tarefa: _Tarefa):
+        inicio = time.perf_counter()
+        valor = tarefa.funcao()
+        logger.info("Tarefa de partida '%s' concluída em %.0f ms", nome, (time.perf_counter() - inicio) * 1000)
+        return valor
+
+    def _concluir(self, nome: str, tarefa: _Tarefa):
+        def concluir(futuro):
+            if futuro.cancelled(): return  # substituída por uma execução na thread que a esperava
+            with self._lock:
+                tarefa.concluida_em = time.time()
+                if futuro.exception() is None:
+                    tarefa.valor, tarefa.pronta = futuro.result(), True
+                else:
+                    logger.warning("Tarefa de partida '%s' falhou: %s", nome, futuro.exception())
+        return concluir
+
+    def _iniciar(self, nome: str, tarefa: _Tarefa):
+        tarefa.futuro = self._executor.submit(self._executar, nome, tarefa)
+        tarefa.futuro.add_done_callback(self._concluir(nome, tarefa))
+
+    def _iniciar_aqui(self, nome: str, tarefa: _Tarefa) -> Future:
+        """Futuro de uma execução feita pela thread atual, que deve completá-lo (ver resultado)."""
+        tarefa.futuro = Future()
+        tarefa.futuro.set_running_or_notify_cancel()
+        tarefa.futuro.add_done_callback(self._concluir(nome, tarefa))
+        return tarefa.futuro
+
+    def pronta(self, nome: str) -> bool:
+        tarefa = self._tarefas.get(nome)
+        return bool(tarefa and (tarefa.pronta or tarefa.futuro.done()))
+
+    def resultado(self, nome: str, esperar: bool = True, padrao=None):
+        """Valor da tarefa; sem esperar, devolve o padrão enquanto ela não termina.
+
+        Um valor vencido (validade) continua sendo devolvido enquanto o novo é calculado, e uma
+        tarefa que falhou sem nunca ter produzido valor é repetida na próxima chamada. Dentro de
+        outra tarefa, uma execução que ainda estaria na fila roda na própria thread que a espera:
+        um worker nunca espera por um futuro parado na fila do mesmo pool.
+        """
+        executar_aqui = False
+        with self._lock:
+            tarefa = self._tarefas.get(nome)
+            if tarefa is None: return padrao
+            na_partida = threading.current_thread().name.startswith(PREFIXO_THREADS)
+            if tarefa.futuro.done():
+                vencida = tarefa.validade is not None and time.time() - tarefa.concluida_em > tarefa.validade
+                if na_partida and not tarefa.pronta and esperar:
+                    self._iniciar_aqui(nome, tarefa)
+                    executar_aqui = True
+                elif vencida or not tarefa.pronta:
+                    self._iniciar(nome, tarefa)
+            if not executar_aqui:
+                if tarefa.pronta or not esperar:
+                    return tarefa.valor if tarefa.pronta else padrao
+                if na_partida and tarefa.futuro.cancel():
+                    self._iniciar_aqui(nome, tarefa)
+                    executar_aqui = True
+            futuro = tarefa.futuro
+        if executar_aqui:
+            try:
+                futuro.set_result(self._executar(nome, tarefa))
+            except Exception as e:
+                futuro.set_exception(e)
+        try:
+            return futuro.result()
+        except Exception:
+            return padrao
+
+    @staticmethod
+    def importar(modulos) -> list:
+        """Importa os módulos pesados para que o script os encontre já carregados."""
+        return [importlib.import_module(modulo).__name__ for modulo in modulos]
+
+    # --- Estado persistido ---
+
+    def _ler_estado(self) -> dict:
+        if not self.arquivo: return {}
+        try:
+            return json.loads(self.arquivo.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def _gravar_estado(self, forcar: bool = False):
+        if not self.arquivo or (not forcar and time.time() - self._gravado_em < INTERVALO_GRAVACAO): return
+        self._gravado_em = time.time()
+        try:
+            with self._lock:
+                conteudo = json.dumps(self._estado, ensure_ascii=False)
+            self.arquivo.parent.mkdir(parents=True, exist_ok=True)
+            temporario = self.arquivo.with_name(f'.{self.arquivo.name}.{os.getpid()}.tmp')
+            temporario.write_text(conteudo, encoding='utf-8')
+            os.replace(temporario, self.arquivo)
+        except OSError as e:
+            logger.warning("Não foi possível gravar o estado da partida: %s", e)
+
+    def anos_conhecidos(self) -> list:
+        """Última lista de anos gravada (de uma execução anterior, se o processo acabou de subir)."""
+        return list(self._estado.get('anos', []))
+
+    def guardar_anos(self, anos: list) -> list:
+        anos = [int(ano) for ano in anos]
+        with self._lock:
+            self._estado['anos'] = anos
+        if anos: self._gravar_estado(forcar=True)
+        return list(anos)
+
+    def registrar_busca(self, identificador: str, campos: dict):
+        """Conta mais uma execução da busca; as mais frequentes são pré-aquecidas na próxima partida."""
+        with self._lock:
+            buscas = self._estado.setdefault('buscas', {})
+            registro = buscas.setdefault(identificador, {'campos': campos, 'total': 0})
+            registro['total'] += 1
+            registro['ultima'] = time.time()
+            if len(buscas) > self.max_buscas:
+                menos_usadas = sorted(buscas, key=lambda i: (buscas[i]['total'], buscas[i].get('ultima', 0)))
+                for removida in menos_usadas[:len(buscas) - self.max_buscas]:
+                    del buscas[removida]
+        self._gravar_estado()
+
+    def buscas_populares(self, quantidade: int) -> list:
+        """Campos das buscas mais executadas, da mais para a menos frequente."""
+        with self._lock:
+            buscas = list(self._estado.get('buscas', {}).values())
+        buscas.sort(key=lambda registro: (registro['total'], registro.get('ultima', 0)), reverse=True)
+        return [registro['campos'] for registro in buscas[:quantidade]]
@@ -0,0 +1,154 @@
+# metricas.py
+"""Medição da duração de cada fase da busca, contadores e exportação (log JSON e formato texto do Prometheus)."""
+
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Limites (em segundos) dos baldes do histograma exportado para o Prometheus
+BALDES = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Amostras guardadas por fase para os percentis do painel
+AMOSTRAS_POR_FASE = 2000
+
+
+def _rotulos(rotulos: dict) -> str:
+    if not rotulos: return ''
+    escapar = lambda valor: str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in sorted(rotulos.items())) + '}'
+
+
+class RegistroMetricas:
+    """Durações por fase (histograma e amostras recentes) e contadores, compartilhados entre sessões e threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._amostras = defaultdict(lambda: deque(maxlen=AMOSTRAS_POR_FASE))
+        self._baldes = defaultdict(lambda: [0] * len(BALDES))
+        self._somas = defaultdict(float)
+        self._quantidades = defaultdict(int)
+        self._contadores = defaultdict(int)  # (nome, rótulos ordenados) -> valor
+
+    def registrar(self, fase: str, segundos: float, **contexto):
+        """Guarda a duração de uma fase e a escreve no log como uma linha JSON."""
+        with self._lock:
+            self._amostras[fase].append(segundos)
+            self._somas[fase] += segundos
+            self._quantidades[fase] += 1
+            baldes = self._baldes[fase]
+            for i, limite in enumerate(BALDES):
+                if segundos <= limite: baldes[i] += 1
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({'evento': 'fase', 'fase': fase, 'duracao_ms': round(segundos * 1000, 3), **contexto},
+                                   ensure_ascii=False, default=str))
+
+    @contextmanager
+    def medir(self, fase: str, **contexto):
+        """Mede o bloco `with` como uma fase; o contexto (linhas, origem...) vai para o log."""
+        inicio = time.perf_counter()
+        try:
+            yield contexto
+        finally:
+            self.registrar(fase, time.perf_counter() - inicio, **contexto)
+
+    def contar(self, nome: str, quantidade: int = 1, **rotulos):
+        with self._lock:
+            self._contadores[(nome, tuple(sorted(rotulos.items())))] += quantidade
+
+    def contador(self, nome: str, **rotulos) -> int:
+        with self._lock:
+            return self._contadores.get((nome, tuple(sorted(rotulos.items()))), 0)
+
+    def resumo(self) -> list:
+        """Uma linha por fase: quantidade, média e percentis p50/p90/p99 (em ms) das amostras recentes."""
+        with self._lock:
+            fases = {fase: np.array(amostras) for fase, amostras in self._amostras.items()}
+            quantidades = dict(self._quantidades)
+            somas = dict(self._somas)
+        linhas = []
+        for fase, amostras in sorted(fases.items()):
+            p50, p90, p99 = (float(v) for v in np.percentile(amostras, [50, 90, 99]) * 1000)
+            linhas.append({'fase': fase, 'quantidade': quantidades[fase], 'media_ms': somas[fase] / quantidades[fase] * 1000,
+                           'p50_ms': p50, 'p90_ms': p90, 'p99_ms': p99})
+        return linhas
+
+    def contadores(self) -> list:
+        with self._lock:
+            return [{'contador': nome, **dict(rotulos), 'valor': valor} for (nome, rotulos), valor in sorted(self._contadores.items())]
+
+    def texto_prometheus(self, medidores: dict = None) -> str:
+        """Exporta histogramas, contadores e medidores avulsos no formato texto do Prometheus."""
+        with self._lock:
+            baldes = {fase: list(valores) for fase, valores in self._baldes.items()}
+            somas = dict(self._somas)
+            quantidades = dict(self._quantidades)
+            contadores = dict(self._contadores)
+        linhas = ['# HELP itbi_fase_duracao_segundos Duração de cada fase da busca.',
+                  '# TYPE itbi_fase_duracao_segundos histogram']
+        for fase in sorted(baldes):
+            for limite, acumulado in zip(BALDES, baldes[fase]):
+                linhas.append(f'itbi_fase_duracao_segundos_bucket{_rotulos({"fase": fase, "le": limite})} {acumulado}')
+            linhas.append(f'itbi_fase_duracao_segundos_bucket{_rotulos({"fase": fase, "le": "+Inf"})} {quantidades[fase]}')
+            linhas.append(f'itbi_fase_duracao_segundos_sum{_rotulos({"fase": fase})} {somas[fase]}')
+            linhas.append(f'itbi_fase_duracao_segundos_count{_rotulos({"fase": fase})} {quantidades[fase]}')
+        for nome in sorted({nome for nome, _ in contadores}):
+            linhas.append(f'# TYPE itbi_{nome}_total counter')
+            for (contador, rotulos), valor in sorted(contadores.items()):
+                if contador == nome:
+                    linhas.append(f'itbi_{nome}_total{_rotulos(dict(rotulos))} {valor}')
+        for nome, valor in sorted((medidores or {}).items()):
+            linhas.append(f'# TYPE itbi_{nome} gauge')
+            linhas.append(f'itbi_{nome} {valor}')
+        return '\n'.join(linhas) + '\n'
+
+
+# Registro único do processo, compartilhado pelas sessões do Streamlit
+REGISTRO = RegistroMetricas()
+medir = REGISTRO.medir
+contar = REGISTRO.contar
+
+
+def configurar_log_json(nivel=logging.INFO):
+    """Escreve as linhas JSON das fases na saída de erro (uma por linha, sem prefixos)."""
+    if any(getattr(h, '_itbi_metricas', False) for h in logger.handlers): return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    handler._itbi_metricas = True
+    logger.addHandler(handler)
+    logger.setLevel(nivel)
+    logger.propagate = False
+
+
+def iniciar_servidor_metricas(porta: int, medidores=None, registro: RegistroMetricas = REGISTRO,
+                              endereco: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve GET /metrics em uma thread de segundo plano.
+
+    `medidores` é uma função sem argumentos que devolve valores instantâneos (ex.: ocupação do cache).
+    O endpoint não tem autenticação: por padrão só atende na própria máquina; outro `endereco`
+    (ex.: '0.0.0.0') o expõe na rede.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            corpo = registro.texto_prometheus(medidores() if medidores else None).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer((endereco, porta), Handler)
+    threading.Thread(target=servidor.serve_forever, name='itbi-metricas', daemon=True).start()
+    return servidor
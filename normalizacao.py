@@ -0,0 +1,178 @@
+# normalizacao.py
+"""Normalização de nomes de logradouro e de CEPs, compartilhada pela busca e pelos índices."""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:  # só para as anotações (o pandas é importado dentro das funções)
+    import pandas as pd
+
+
+def normalizar_busca(texto_busca: str) -> str:
+    """Texto comparado com os nomes do índice de sugestões: sem acentos, em minúsculas e com o tipo abreviado."""
+    if not texto_busca: return ""
+    texto_sem_acento = ''.join(c for c in unicodedata.normalize('NFD', texto_busca) if unicodedata.category(c) != 'Mn')
+    texto_lower = texto_sem_acento.lower()
+    substituicoes = {'rua ': 'r ', 'avenida ': 'av ', 'estrada ': 'est ', 'travessa ': 'tv ', 'praca ': 'pca ', 'largo ': 'lgo '}
+    for chave, valor in substituicoes.items():
+        if texto_lower.startswith(chave):
+            texto_lower = texto_lower.replace(chave, valor, 1)
+            break
+    return texto_lower.strip()
+
+
+# --- Logradouro normalizado (coluna logradouro_norm) ---
+
+# Cada forma canônica e as variantes escritas nas planilhas e pelos usuários (já sem acento e em minúsculas)
+TIPOS_LOGRADOURO = {
+    'r': ('rua', 'r'), 'av': ('avenida', 'av', 'avn', 'aven'), 'al': ('alameda', 'al', 'alam'),
+    'tv': ('travessa', 'tv', 'trav', 'tr'), 'pca': ('praca', 'pca', 'pc', 'pr'), 'lgo': ('largo', 'lgo', 'lg'),
+    'est': ('estrada', 'est', 'estr'), 'rod': ('rodovia', 'rod'), 'vd': ('viaduto', 'vd', 'viad'),
+    'pte': ('ponte', 'pte'), 'ld': ('ladeira', 'ld', 'lad'), 'bc': ('beco', 'bc'), 'vla': ('viela', 'vla'),
+    'psg': ('passagem', 'psg', 'pass'), 'pq': ('parque', 'pq', 'prq'), 'esc': ('escadaria', 'esc'),
+    'acs': ('acesso', 'acs'), 'pto': ('patio', 'pto'),
+}
+TITULOS = {
+    'dr': ('doutor', 'doutora', 'dr', 'dra'), 'prof': ('professor', 'professora', 'prof', 'profa', 'profo'),
+    'cel': ('coronel', 'cel'), 'pres': ('presidente', 'pres', 'pdte'), 'gen': ('general', 'gen'),
+    'cap': ('capitao', 'cap', 'capt'), 'ten': ('tenente', 'ten', 'tte'), 'mal': ('marechal', 'mal'),
+    'eng': ('engenheiro', 'engenheira', 'eng', 'engo', 'enga'), 'sen': ('senador', 'sen'),
+    'dep': ('deputado', 'deputada', 'dep'), 'gov': ('governador', 'gov'), 'alm': ('almirante', 'alm'),
+    'brig': ('brigadeiro', 'brig', 'brg'), 'maj': ('major', 'maj'), 'sgt': ('sargento', 'sgt', 'sarg'),
+    'com': ('comendador', 'com', 'comend'), 'des': ('desembargador', 'des', 'desemb'),
+    'min': ('ministro', 'min'), 'cons': ('conselheiro', 'cons'), 'ver': ('vereador', 'ver'),
+    'mons': ('monsenhor', 'mons'), 'pe': ('padre', 'pe'), 'fr': ('frei', 'fr'), 'cmte': ('comandante', 'cmte', 'cmt'),
+    'emb': ('embaixador', 'emb'), 'visc': ('visconde', 'visc'), 'arq': ('arquiteto', 'arq'),
+    'sto': ('santo', 'sto'), 'sta': ('santa', 'sta'), 'nsa': ('nossa', 'nsa'), 'sra': ('senhora', 'sra'),
+}
+ORDINAIS = {
+    '1': ('primeiro', 'primeira'), '2': ('segundo', 'segunda'), '3': ('terceiro', 'terceira'), '4': ('quarto', 'quarta'),
+    '5': ('quinto', 'quinta'), '6': ('sexto', 'sexta'), '7': ('setimo', 'setima'), '8': ('oitavo', 'oitava'),
+    '9': ('nono', 'nona'), '10': ('decimo', 'decima'),
+}
+PALAVRAS_VAZIAS = frozenset({'de', 'da', 'do', 'das', 'dos', 'e'})
+
+_TIPOS = {variante: canonico for canonico, variantes in TIPOS_LOGRADOURO.items() for variante in variantes}
+_PALAVRAS = {variante: canonico for tabela in (TITULOS, ORDINAIS)
+             for canonico, variantes in tabela.items() for variante in variantes}
+_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+_ORDINAL = re.compile(r'^(\d+)[oa]$')   # 1o, 2a (o º e o ª viram o e a na decomposição NFKD)
+
+
+@lru_cache(maxsize=65536)
+def normalizar_logradouro(texto: str) -> str:
+    """Chave de comparação do logradouro, igual na carga (coluna logradouro_norm) e na busca.
+
+    Sem acentos, pontuação e palavras vazias, com tipos, títulos e ordinais na forma abreviada, e o
+    tipo no fim para que o nome seja o prefixo da chave: "Av. Brig. Luís Antônio" e "AV BRIGADEIRO
+    LUIS ANTONIO" resultam em "brig luis antonio av"; "R. 1º de Março" em "1 marco r".
+    """
+    if not texto: return ''
+    texto = unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+    palavras = _NAO_ALFANUMERICO.sub(' ', texto).split()
+    tipo = _TIPOS.get(palavras[0]) if len(palavras) > 1 else None
+    if tipo: palavras = palavras[1:]
+    # Palavras vazias só saem quando sobra algum nome: "Rua E" fica "e r", não "r" (que casaria com toda rua)
+    if any(palavra not in PALAVRAS_VAZIAS for palavra in palavras):
+        palavras = [palavra for palavra in palavras if palavra not in PALAVRAS_VAZIAS]
+    nome = []
+    for palavra in palavras:
+        ordinal = _ORDINAL.match(palavra)
+        nome.append(ordinal.group(1) if ordinal else _PALAVRAS.get(palavra, palavra))
+    return ' '.join(nome + [tipo] if tipo else nome)
+
+
+def normalizar_logradouros(serie: 'pd.Series') -> 'pd.Series':
+    """normalizar_logradouro sobre uma coluna inteira: cada valor distinto é normalizado uma vez.
+
+    Um bloco do coletor com centenas de milhares de linhas tem poucos milhares de logradouros.
+    """
+    import numpy as np
+    import pandas as pd  # importado aqui: a busca usa normalizar_logradouro antes de o pandas ser carregado
+
+    codigos, distintos = pd.factorize(serie)
+    # O código -1 (valor ausente) pega o último elemento, None
+    chaves = np.array([normalizar_logradouro(str(valor)) for valor in distintos] + [None], dtype=object)
+    return pd.Series(chaves[codigos], index=serie.index, dtype='string')
+
+
+def separar_tipo(chave: str) -> tuple:
+    """(nome, tipo) de uma chave de normalizar_logradouro; tipo vazio quando a busca não informou."""
+    partes = chave.rsplit(' ', 1)
+    return (partes[0], partes[1]) if len(partes) == 2 and partes[1] in TIPOS_LOGRADOURO else (chave, '')
+
+
+def padrao_logradouro(chave: str) -> str:
+    """Padrão LIKE da busca sobre logradouro_norm: o nome como prefixo e, se houver, o tipo no fim.
+
+    Um LIKE com prefixo fixo é atendido pelo índice text_pattern_ops da coluna (sql/logradouro_norm.sql).
+    """
+    nome, tipo = separar_tipo(chave)
+    return f'{nome}%' + (f' {tipo}' if tipo else '')
+
+
+def casa_logradouro(normalizado: str, chave: str) -> bool:
+    """Versão em Python do padrao_logradouro: o logradouro normalizado atende à busca pela chave."""
+    nome, tipo = separar_tipo(chave)
+    return normalizado.startswith(nome) and (not tipo or normalizado.endswith(f' {tipo}')
+                                             and len(normalizado) >= len(nome) + len(tipo) + 1)
+
+
+# --- CEP ---
+
+DIGITOS_CEP = 8
+# Prefixos mais curtos cobririam regiões inteiras ("0" é metade da Grande São Paulo)
+MINIMO_PREFIXO_CEP = 3
+
+
+def _bloco_cep(prefixo: str) -> tuple:
+    """Primeiro e último CEP (inteiros) que começam com o prefixo."""
+    escala = 10 ** (DIGITOS_CEP - len(prefixo))
+    return int(prefixo) * escala, (int(prefixo) + 1) * escala - 1
+
+
+def canonizar_cep(texto: str) -> str:
+    """Forma canônica da busca por CEP: exato, prefixo ou faixa.
+
+    "01311-000" -> "01311000" (exato); "01311" -> "01311" (setor); "013" -> "013" (sub-região);
+    "01310-000 a 01319-999" ou "01310 a 01319" -> "01310000-01319999" (faixa). Uma faixa que
+    cobre exatamente um prefixo vira o prefixo, para que as duas formas usem o mesmo cache.
+
+    Texto que não é um CEP (sem números, mais de dois números, mais de 8 dígitos ou prefixo com
+    menos de MINIMO_PREFIXO_CEP dígitos) resulta em "": quem chama deve recusar a busca.
+    """
+    if not texto: return ""
+    # Junta o hífen do formato 01311-000 antes de separar os números da faixa
+    numeros = re.findall(r'\d+', re.sub(r'(?<!\d)(\d{5})-(\d{3})(?!\d)', r'\1\2', texto))
+    if not 1 <= len(numeros) <= 2 or any(not MINIMO_PREFIXO_CEP <= len(n) <= DIGITOS_CEP for n in numeros): return ""
+    # 6 ou 7 dígitos são um CEP completo sem os zeros à esquerda (comum em planilhas); até 5, um prefixo
+    numeros = [n.zfill(DIGITOS_CEP) if len(n) > 5 else n for n in numeros]
+    if len(numeros) == 1: return numeros[0]
+    primeiro, ultimo = sorted(numeros, key=lambda n: n.ljust(DIGITOS_CEP, '0'))
+    inicio, fim = primeiro.ljust(DIGITOS_CEP, '0'), ultimo.ljust(DIGITOS_CEP, '9')
+    for tamanho in range(MINIMO_PREFIXO_CEP, DIGITOS_CEP + 1):
+        if _bloco_cep(inicio[:tamanho]) == (int(inicio), int(fim)):
+            return inicio[:tamanho]
+    return f'{inicio}-{fim}'
+
+
+def intervalo_cep(canonico: str) -> tuple:
+    """(primeiro, último) CEP inteiro da busca canônica; iguais quando o CEP é exato."""
+    if '-' in canonico:
+        inicio, fim = canonico.split('-')
+        return int(inicio), int(fim)
+    return _bloco_cep(canonico)
+
+
+def descrever_cep(canonico: str) -> str:
+    """Texto da busca por CEP para a interface: 01311-000, setor 01311, 01310-000 a 01319-999."""
+    def formatar(cep: int) -> str:
+        texto = f'{cep:08d}'
+        return f'{texto[:5]}-{texto[5:]}'
+    inicio, fim = intervalo_cep(canonico)
+    if inicio == fim: return formatar(inicio)
+    if '-' not in canonico:
+        return f"{'setor' if len(canonico) == 5 else 'sub-região' if len(canonico) == 3 else 'prefixo'} {canonico}"
+    return f'{formatar(inicio)} a {formatar(fim)}'
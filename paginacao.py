@@ -0,0 +1,55 @@
+# paginacao.py
+"""Grade de resultados paginada: ordenação no servidor e só as linhas da página enviadas ao navegador."""
+
+import numpy as np
+import pandas as pd
+
+TAMANHOS_PAGINA = (25, 50, 100, 250)
+# Celulares recebem páginas menores: menos linhas serializadas e uma tabela que cabe na tela
+TAMANHO_PAGINA_CELULAR = 25
+TAMANHO_PAGINA_TELA = 100
+MARCAS_CELULAR = ('mobi', 'android', 'iphone', 'ipad')
+
+
+def tamanho_pagina_padrao(user_agent: str = None) -> int:
+    """Linhas por página para o aparelho do usuário, deduzido do User-Agent do navegador."""
+    agente = (user_agent or '').lower()
+    return TAMANHO_PAGINA_CELULAR if any(marca in agente for marca in MARCAS_CELULAR) else TAMANHO_PAGINA_TELA
+
+
+def colunas_ordenaveis(df: pd.DataFrame) -> list:
+    """Colunas numéricas e de data, as que a grade ordena no servidor."""
+    return [coluna for coluna in df.columns
+            if pd.api.types.is_numeric_dtype(df[coluna].dtype) or pd.api.types.is_datetime64_any_dtype(df[coluna].dtype)]
+
+
+def _valores_ordenacao(serie: pd.Series) -> np.ndarray:
+    """Coluna como float64, com NaN nos valores ausentes (datas viram o número de nanossegundos)."""
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype='datetime64[ns]').astype('int64').astype('float64')
+        valores[serie.isna().to_numpy()] = np.nan
+        return valores
+    return pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+def ordenar(df: pd.DataFrame, coluna: str = None, decrescente: bool = True, posicoes: np.ndarray = None) -> np.ndarray:
+    """Posições das linhas (todas ou só `posicoes`, as do refino) na ordem da coluna, com os ausentes no fim.
+
+    Sem coluna, mantém a ordem do resultado (mais recentes primeiro). A ordenação é estável: empates
+    ficam na ordem do resultado.
+    """
+    posicoes = np.arange(len(df)) if posicoes is None else np.asarray(posicoes)
+    if not coluna: return posicoes
+    valores = _valores_ordenacao(df[coluna].take(posicoes))
+    # argsort deixa NaN no fim; negar os valores inverte a ordem sem mudar isso
+    return posicoes[np.argsort(-valores if decrescente else valores, kind='stable')]
+
+
+def total_paginas(linhas: int, tamanho: int) -> int:
+    return max(1, -(-linhas // tamanho))
+
+
+def pagina(df: pd.DataFrame, posicoes: np.ndarray, numero: int, tamanho: int) -> pd.DataFrame:
+    """Linhas da página `numero` (a partir de 1): só elas são copiadas."""
+    inicio = (numero - 1) * tamanho
+    return df.take(posicoes[inicio:inicio + tamanho])
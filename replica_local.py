@@ -0,0 +1,268 @@
+# replica_local.py
+"""Réplica local de transacoes_imobiliarias em Parquet, particionada por ano_transacao."""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from consultas import ler_atualizacoes
+from normalizacao import casa_logradouro, intervalo_cep, normalizar_logradouro
+from esquema import TABELA, COLUNA_ID, COLUNA_ANO, COLUNA_LOGRADOURO, COLUNA_NUMERO, COLUNA_CEP, compactar_tipos
+
+logger = logging.getLogger(__name__)
+
+TAMANHO_PAGINA = 1000       # limite padrão de linhas por resposta do PostgREST
+PAGINAS_POR_ARQUIVO = 50    # páginas acumuladas antes de gravar um novo arquivo da partição
+MAX_ARQUIVOS_PARTICAO = 20  # acima disso os arquivos da partição são compactados em um só
+ARQUIVO_ESTADO = '_estado.json'
+
+
+def filtrar_local(df: pd.DataFrame, rua_normalizada: str = None, cep_limpo: str = None, numero: str = None,
+                  rua_exata: bool = False, anos: list = None) -> pd.DataFrame:
+    """Aplica em memória os mesmos filtros que buscar_dados envia ao Supabase.
+
+    Sem rua_exata, a chave de cada logradouro é calculada aqui a partir de nome_do_logradouro: as linhas
+    do snapshot sincronizadas antes da coluna logradouro_norm existir não a têm preenchida.
+    """
+    if df.empty: return df
+    mascara = pd.Series(True, index=df.index)
+    if anos:
+        mascara &= df[COLUNA_ANO].isin(anos).fillna(False).astype(bool)
+    if cep_limpo:
+        inicio, fim = intervalo_cep(cep_limpo)
+        mascara &= pd.to_numeric(df[COLUNA_CEP], errors='coerce').between(inicio, fim).fillna(False).astype(bool)
+    if rua_normalizada:
+        logradouros = df[COLUNA_LOGRADOURO]
+        if rua_exata:
+            mascara &= (logradouros == rua_normalizada).fillna(False).astype(bool)
+        elif isinstance(logradouros.dtype, pd.CategoricalDtype):
+            # Normaliza e compara só uma vez por categoria e filtra as linhas pelos códigos
+            categorias = logradouros.cat.categories
+            atende = [casa_logradouro(normalizar_logradouro(str(nome)), rua_normalizada) for nome in categorias]
+            mascara &= logradouros.isin(categorias[atende])
+        else:
+            mascara &= logradouros.map(
+                lambda nome: isinstance(nome, str) and casa_logradouro(normalizar_logradouro(nome), rua_normalizada)
+            ).astype(bool)
+    if numero:
+        coluna = df[COLUNA_NUMERO]
+        if pd.api.types.is_numeric_dtype(coluna):
+            mascara &= (coluna == pd.to_numeric(numero, errors='coerce')).fillna(False).astype(bool)
+        else:
+            mascara &= coluna.astype(str).str.strip() == numero
+    return df[mascara]
+
+
+class ReplicaLocal:
+    """Snapshot local com uma pasta por ano, sincronizado de forma incremental pelo id."""
+
+    def __init__(self, diretorio, idade_maxima: float = 6 * 3600):
+        self.diretorio = Path(diretorio)
+        self.idade_maxima = idade_maxima
+        self._lock = threading.Lock()
+        self._lock_sincronizacao = threading.Lock()
+        self._particoes = {}  # ano -> (assinatura dos arquivos, DataFrame)
+
+    # --- Estado da sincronização ---
+
+    def _ler_estado(self) -> dict:
+        caminho = self.diretorio / ARQUIVO_ESTADO
+        if not caminho.exists(): return {}
+        try:
+            return json.loads(caminho.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    def _gravar_estado(self, estado: dict):
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        temporario = self.diretorio / (ARQUIVO_ESTADO + '.tmp')
+        temporario.write_text(json.dumps(estado), encoding='utf-8')
+        os.replace(temporario, self.diretorio / ARQUIVO_ESTADO)
+
+    def esta_atualizada(self) -> bool:
+        """Indica se existe snapshot e se a última sincronização está dentro da idade máxima."""
+        estado = self._ler_estado()
+        sincronizado_em = estado.get('sincronizado_em')
+        if not estado.get('anos') or sincronizado_em is None: return False
+        return time.time() - sincronizado_em <= self.idade_maxima
+
+    def anos_disponiveis(self) -> list:
+        """Anos presentes no snapshot, do mais recente para o mais antigo."""
+        return sorted((int(ano) for ano in self._ler_estado().get('anos', {})), reverse=True)
+
+    # --- Sincronização incremental ---
+
+    def _pasta(self, ano) -> Path:
+        return self.diretorio / f'{COLUNA_ANO}={ano}'
+
+    def _gravar_parte(self, ano, linhas: list) -> int:
+        """Grava um lote de linhas novas como um arquivo da partição e devolve o maior id."""
+        df = pd.DataFrame(linhas)
+        ultimo_id = int(df[COLUNA_ID].max())
+        pasta = self._pasta(ano)
+        pasta.mkdir(parents=True, exist_ok=True)
+        temporario = pasta / f'.parte-{ultimo_id:012d}.tmp'
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, pasta / f'parte-{ultimo_id:012d}.parquet')
+        return ultimo_id
+
+    def _compactar(self, ano):
+        """Junta os arquivos de uma partição quando eles se acumulam."""
+        arquivos = sorted(self._pasta(ano).glob('parte-*.parquet'))
+        if len(arquivos) <= MAX_ARQUIVOS_PARTICAO: return
+        df = pd.concat([pd.read_parquet(a) for a in arquivos], ignore_index=True)
+        ultimo_id = int(df[COLUNA_ID].max())
+        temporario = self._pasta(ano) / f'.compactado-{ultimo_id:012d}.tmp'
+        df.to_parquet(temporario, index=False)
+        destino = self._pasta(ano) / f'parte-{ultimo_id:012d}.parquet'
+        os.replace(temporario, destino)
+        for arquivo in arquivos:
+            if arquivo != destino: arquivo.unlink(missing_ok=True)
+
+    def sincronizar_ano(self, cliente, ano, estado: dict) -> int:
+        """Baixa por paginação em chave (id > último id) apenas as linhas novas de um ano."""
+        info = estado['anos'].setdefault(str(ano), {'ultimo_id': 0, 'linhas': 0})
+        novas, total, cursor = [], 0, info['ultimo_id']
+        while True:
+            response = (cliente.table(TABELA).select('*')
+                        .eq(COLUNA_ANO, ano)
+                        .gt(COLUNA_ID, cursor)
+                        .order(COLUNA_ID)
+                        .limit(TAMANHO_PAGINA)
+                        .execute())
+            pagina = response.data or []
+            novas.extend(pagina)
+            if pagina: cursor = pagina[-1][COLUNA_ID]
+            fim = len(pagina) < TAMANHO_PAGINA
+            if novas and (fim or len(novas) >= TAMANHO_PAGINA * PAGINAS_POR_ARQUIVO):
+                info['ultimo_id'] = self._gravar_parte(ano, novas)
+                info['linhas'] += len(novas)
+                total += len(novas)
+                novas = []
+                self._gravar_estado(estado)
+            if fim: break
+        self._compactar(ano)
+        return total
+
+    def _alteracoes(self, cliente) -> dict:
+        try:
+            return ler_atualizacoes(cliente)
+        except Exception as e:
+            logger.warning("Não foi possível ler os anos alterados pelo coletor: %s", e)
+            return {}
+
+    def sincronizar(self, cliente) -> int:
+        """Sincroniza todos os anos publicados pela RPC get_distinct_anos.
+
+        Linhas alteradas pelo coletor mantêm o id, então a paginação por id não as vê: os anos
+        sinalizados em coletor_atualizacoes depois da última cópia são baixados de novo por inteiro.
+        """
+        with self._lock_sincronizacao:
+            response = cliente.rpc('get_distinct_anos', {}).execute()
+            anos = [item['ano'] for item in (response.data or [])]
+            estado = self._ler_estado()
+            estado.setdefault('anos', {})
+            alteracoes = self._alteracoes(cliente)
+            for ano in anos:
+                info = estado['anos'].get(str(ano))
+                if info is not None and info.get('alterado_em', 0) < alteracoes.get(ano, 0):
+                    logger.info("Ano %s alterado pelo coletor; recriando a partição.", ano)
+                    shutil.rmtree(self._pasta(ano), ignore_errors=True)
+                    del estado['anos'][str(ano)]
+                    # Até terminar, as buscas voltam ao Supabase em vez de ver o ano incompleto
+                    estado['sincronizado_em'] = None
+                    self._gravar_estado(estado)
+            total = sum(self.sincronizar_ano(cliente, ano, estado) for ano in anos)
+            for ano in anos:
+                if str(ano) in estado['anos']:
+                    estado['anos'][str(ano)]['alterado_em'] = alteracoes.get(ano, 0)
+            estado['sincronizado_em'] = time.time()
+            self._gravar_estado(estado)
+            return total
+
+    def iniciar_sincronizacao_periodica(self, cliente, intervalo: float = 3600) -> threading.Thread:
+        """Mantém o snapshot atualizado em uma thread de fundo."""
+        def _loop():
+            while True:
+                try:
+                    novas = self.sincronizar(cliente)
+                    logger.info("Réplica local sincronizada: %d linhas novas.", novas)
+                except Exception as e:
+                    logger.warning("Falha ao sincronizar réplica local: %s", e)
+                time.sleep(intervalo)
+
+        thread = threading.Thread(target=_loop, name='sincronizacao-replica', daemon=True)
+        thread.start()
+        return thread
+
+    # --- Consulta ---
+
+    def _carregar_particao(self, ano) -> pd.DataFrame:
+        """Lê a partição do ano, reaproveitando a cópia em memória enquanto os arquivos não mudarem."""
+        for _ in range(3):
+            arquivos = sorted(self._pasta(ano).glob('parte-*.parquet'))
+            try:
+                assinatura = tuple((a.name, a.stat().st_mtime_ns) for a in arquivos)
+                with self._lock:
+                    em_memoria = self._particoes.get(ano)
+                if em_memoria and em_memoria[0] == assinatura:
+                    return em_memoria[1]
+                df = pd.concat([pd.read_parquet(a) for a in arquivos], ignore_index=True) if arquivos else pd.DataFrame()
+                df = compactar_tipos(df)
+            except FileNotFoundError:
+                continue  # partição compactada durante a leitura
+            with self._lock:
+                self._particoes[ano] = (assinatura, df)
+            return df
+        return pd.DataFrame()
+
+    def contagem_logradouros(self) -> pd.Series:
+        """Número de transações por logradouro em todo o snapshot."""
+        contagens = [self._carregar_particao(ano)[COLUNA_LOGRADOURO].value_counts() for ano in self.anos_disponiveis()]
+        contagens = [c for c in contagens if not c.empty]
+        if not contagens: return pd.Series(dtype='int64')
+        return pd.concat(contagens).groupby(level=0, observed=True).sum()
+
+    def contagem_ceps(self) -> pd.DataFrame:
+        """Transações por CEP e logradouro em todo o snapshot (mesmas colunas da RPC get_cep_logradouros)."""
+        partes = []
+        for ano in self.anos_disponiveis():
+            df = self._carregar_particao(ano)
+            if df.empty: continue
+            partes.append(df.groupby([COLUNA_CEP, COLUNA_LOGRADOURO], observed=True).size().rename('total').reset_index())
+        if not partes: return pd.DataFrame(columns=['cep', 'logradouro', 'total'])
+        contagem = pd.concat(partes).groupby([COLUNA_CEP, COLUNA_LOGRADOURO], observed=True)['total'].sum().reset_index()
+        return contagem.rename(columns={COLUNA_CEP: 'cep', COLUNA_LOGRADOURO: 'logradouro'})
+
+    def tabela(self, colunas: list = None) -> pd.DataFrame:
+        """Todas as partições do snapshot em um só DataFrame, só com as colunas pedidas."""
+        partes = []
+        for ano in self.anos_disponiveis():
+            df = self._carregar_particao(ano)
+            if colunas: df = df[df.columns.intersection(colunas)]
+            if not df.empty: partes.append(df)
+        return compactar_tipos(pd.concat(partes, ignore_index=True)) if partes else pd.DataFrame()
+
+    def buscar(self, rua_normalizada: str = None, cep_limpo: str = None, numero: str = None,
+               anos: list = None, limite: int = 1000, colunas: list = None, rua_exata: bool = False) -> pd.DataFrame:
+        """Responde a uma busca a partir do snapshot, com o mesmo teto de linhas da consulta remota."""
+        resultados = []
+        for ano in (anos or self.anos_disponiveis()):
+            parcial = filtrar_local(self._carregar_particao(ano), rua_normalizada, cep_limpo, numero, rua_exata)
+            if colunas and colunas != ['*']:
+                parcial = parcial[parcial.columns.intersection(colunas)]
+            if not parcial.empty: resultados.append(parcial)
+        if not resultados: return pd.DataFrame()
+        df = pd.concat(resultados, ignore_index=True)
+        truncado = bool(limite) and len(df) > limite
+        df = df.sort_values(COLUNA_ID, ascending=False, ignore_index=True)
+        if truncado: df = df.head(limite)
+        df = compactar_tipos(df)
+        df.attrs['truncado'] = truncado
+        return df
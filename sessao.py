@@ -0,0 +1,233 @@
+# sessao.py
+"""Sessões de usuário validadas localmente (JWT), renovadas em segundo plano, com um cliente Supabase por usuário."""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+# Renova o token quando faltar menos que isso para expirar
+MARGEM_RENOVACAO = 120
+# Sessões sem uso há mais tempo que isso deixam de ser renovadas
+MAX_OCIOSIDADE = 12 * 3600
+MAX_CLIENTES = 200
+AUDIENCIA = 'authenticated'
+
+
+def _opcoes_sem_estado():
+    """Clientes sem sessão persistida e sem a thread de renovação automática da biblioteca."""
+    try:
+        from supabase.lib.client_options import SyncClientOptions as OpcoesCliente
+    except ImportError:  # versões do supabase-py anteriores à separação entre cliente síncrono e assíncrono
+        from supabase.lib.client_options import ClientOptions as OpcoesCliente
+    return OpcoesCliente(persist_session=False, auto_refresh_token=False)
+
+
+@dataclass
+class SessaoUsuario:
+    """Tokens e dados do usuário de uma sessão do Streamlit; atualizada no lugar pela renovação."""
+    access_token: str
+    refresh_token: str
+    expira_em: float
+    usuario: dict
+    ultimo_uso: float = field(default_factory=time.time)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    _lock_renovacao: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def id_usuario(self) -> str:
+        return self.usuario.get('id', '')
+
+    def atualizar(self, access_token: str, refresh_token: str, expira_em: float):
+        with self._lock:
+            self.access_token, self.refresh_token, self.expira_em = access_token, refresh_token, expira_em
+
+
+def usuario_das_claims(claims: dict) -> dict:
+    """Mesmo formato de user.dict() usado pela interface (id, email e user_metadata)."""
+    return {'id': claims.get('sub'), 'email': claims.get('email'), 'user_metadata': claims.get('user_metadata') or {},
+            'role': claims.get('role')}
+
+
+class ValidadorJWT:
+    """Confere assinatura, expiração e audiência do access token sem chamar o Supabase.
+
+    Projetos com segredo JWT (HS256) usam SUPABASE_JWT_SECRET; projetos com chaves assimétricas
+    usam o JWKS do Auth, baixado uma vez e guardado em cache.
+    """
+
+    def __init__(self, supabase_url: str, segredo: str = None, validade_chaves: int = 3600):
+        self.segredo = segredo
+        self._jwks = jwt.PyJWKClient(f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+                                     cache_keys=True, lifespan=validade_chaves)
+
+    def validar(self, token: str) -> dict:
+        """Devolve as claims do token ou levanta jwt.InvalidTokenError."""
+        algoritmo = jwt.get_unverified_header(token).get('alg')
+        if algoritmo == 'HS256':
+            if not self.segredo:
+                raise jwt.InvalidKeyError("SUPABASE_JWT_SECRET não configurado para validar tokens HS256.")
+            chave = self.segredo
+        else:
+            chave = self._jwks.get_signing_key_from_jwt(token).key
+        return jwt.decode(token, chave, algorithms=[algoritmo], audience=AUDIENCIA,
+                          options={'require': ['exp', 'sub']}, leeway=5)
+
+
+class PoolClientes:
+    """Um cliente Supabase por usuário (LRU), autenticado com o token da sessão para as consultas."""
+
+    def __init__(self, supabase_url: str, supabase_key: str, max_clientes: int = MAX_CLIENTES):
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.max_clientes = max_clientes
+        self._clientes = OrderedDict()  # id do usuário -> (cliente, token aplicado)
+        self._lock = threading.Lock()
+
+    def novo_cliente(self):
+        from supabase import create_client
+        return create_client(self.supabase_url, self.supabase_key, options=_opcoes_sem_estado())
+
+    def cliente(self, sessao: SessaoUsuario):
+        """Cliente do usuário da sessão, com o access token atual aplicado ao PostgREST."""
+        with self._lock:
+            cliente, token = self._clientes.pop(sessao.id_usuario, (None, None))
+            if cliente is None:
+                cliente = self.novo_cliente()
+            if token != sessao.access_token:
+                cliente.postgrest.auth(sessao.access_token)
+                token = sessao.access_token
+            self._clientes[sessao.id_usuario] = (cliente, token)
+            while len(self._clientes) > self.max_clientes:
+                self._clientes.popitem(last=False)
+            return cliente
+
+    def descartar(self, id_usuario: str):
+        with self._lock:
+            self._clientes.pop(id_usuario, None)
+
+
+class GerenciadorSessoes:
+    """Cria sessões a partir de logins, valida a cada rerun sem rede e as renova antes de expirar."""
+
+    def __init__(self, supabase_url: str, supabase_key: str, segredo_jwt: str = None,
+                 margem_renovacao: float = MARGEM_RENOVACAO, max_ociosidade: float = MAX_OCIOSIDADE):
+        self.validador = ValidadorJWT(supabase_url, segredo_jwt)
+        self.pool = PoolClientes(supabase_url, supabase_key)
+        self.margem_renovacao = margem_renovacao
+        self.max_ociosidade = max_ociosidade
+        self._sessoes = {}  # id(sessão) -> sessão registrada para renovação
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._thread = None
+
+    # --- Criação ---
+
+    def _registrar(self, sessao: SessaoUsuario) -> SessaoUsuario:
+        with self._lock:
+            self._sessoes[id(sessao)] = sessao
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._renovar_periodicamente, name='renovacao-sessoes', daemon=True)
+                self._thread.start()
+        self._acordar.set()
+        return sessao
+
+    def _claims_ou_consulta(self, access_token: str) -> dict:
+        """Valida localmente; se não houver chave para isso, consulta o Auth uma única vez."""
+        try:
+            return self.validador.validar(access_token)
+        except (jwt.PyJWKClientError, jwt.InvalidKeyError):
+            resposta = self.pool.novo_cliente().auth.get_user(access_token)
+            if not resposta or not resposta.user: raise
+            claims = jwt.decode(access_token, options={'verify_signature': False})
+            return {**claims, 'email': resposta.user.email, 'user_metadata': resposta.user.user_metadata}
+
+    def de_tokens(self, access_token: str, refresh_token: str = '') -> SessaoUsuario:
+        """Sessão a partir dos tokens devolvidos pelo login OAuth (validados localmente)."""
+        claims = self._claims_ou_consulta(access_token)
+        return self._registrar(SessaoUsuario(access_token, refresh_token, float(claims['exp']), usuario_das_claims(claims)))
+
+    def de_resposta(self, resposta) -> SessaoUsuario:
+        """Sessão a partir de um AuthResponse (login com email e senha)."""
+        s = resposta.session
+        return self._registrar(SessaoUsuario(s.access_token, s.refresh_token, float(s.expires_at or time.time() + s.expires_in),
+                                             resposta.user.model_dump()))
+
+    def entrar_com_senha(self, email: str, senha: str) -> SessaoUsuario:
+        resposta = self.pool.novo_cliente().auth.sign_in_with_password({'email': email, 'password': senha})
+        if not resposta.session: raise ValueError("Credenciais inválidas")
+        return self.de_resposta(resposta)
+
+    # --- Validação a cada rerun ---
+
+    def validar(self, sessao: SessaoUsuario) -> bool:
+        """Confere a sessão localmente (sem rede, salvo se o token venceu sem ter sido renovado)."""
+        if sessao is None: return False
+        sessao.ultimo_uso = time.time()
+        if sessao.expira_em - time.time() <= 5 and not self.renovar(sessao):
+            return False
+        try:
+            self.validador.validar(sessao.access_token)
+        except (jwt.PyJWKClientError, jwt.InvalidKeyError):
+            pass  # sem chave para conferir a assinatura localmente: vale a expiração conferida acima
+        except jwt.InvalidTokenError as e:
+            logger.warning("Sessão de %s rejeitada: %s", sessao.usuario.get('email'), e)
+            return False
+        return True
+
+    def renovar(self, sessao: SessaoUsuario) -> bool:
+        """Troca o refresh token por um novo access token; só uma renovação por sessão de cada vez."""
+        if not sessao.refresh_token: return False
+        with sessao._lock_renovacao:
+            if sessao.expira_em - time.time() > self.margem_renovacao:
+                return True  # já renovada por outra thread
+            return self._renovar(sessao)
+
+    def _renovar(self, sessao: SessaoUsuario) -> bool:
+        try:
+            resposta = self.pool.novo_cliente().auth.refresh_session(sessao.refresh_token)
+            s = resposta.session
+            sessao.atualizar(s.access_token, s.refresh_token, float(s.expires_at or time.time() + s.expires_in))
+            return True
+        except Exception as e:
+            logger.warning("Falha ao renovar a sessão de %s: %s", sessao.usuario.get('email'), e)
+            return False
+
+    def encerrar(self, sessao: SessaoUsuario):
+        with self._lock:
+            self._sessoes.pop(id(sessao), None)
+            outras = any(s.id_usuario == sessao.id_usuario for s in self._sessoes.values())
+        if not outras:
+            self.pool.descartar(sessao.id_usuario)
+        try:
+            cliente = self.pool.novo_cliente()
+            cliente.auth.set_session(sessao.access_token, sessao.refresh_token)
+            cliente.auth.sign_out({'scope': 'local'})
+        except Exception as e:
+            logger.info("Logout remoto não concluído: %s", e)
+
+    # --- Renovação em segundo plano ---
+
+    def _renovar_periodicamente(self):
+        while True:
+            agora = time.time()
+            with self._lock:
+                sessoes = list(self._sessoes.values())
+            proxima = agora + 3600
+            for sessao in sessoes:
+                if agora - sessao.ultimo_uso > self.max_ociosidade:
+                    with self._lock:
+                        self._sessoes.pop(id(sessao), None)
+                    continue
+                if sessao.expira_em - agora <= self.margem_renovacao and not self.renovar(sessao):
+                    with self._lock:
+                        self._sessoes.pop(id(sessao), None)
+                    continue
+                proxima = min(proxima, sessao.expira_em - self.margem_renovacao)
+            self._acordar.wait(max(1.0, proxima - time.time()))
+            self._acordar.clear()
@@ -0,0 +1,37 @@
+-- Chave estável de cada transação, usada pelo coletor (coletor_itbi.py) para fazer upsert em vez de insert.
+-- Com ela, reenviar um bloco depois de uma carga interrompida não duplica linhas.
+alter table transacoes_imobiliarias add column if not exists chave_transacao text;
+
+-- Preenche as linhas já carregadas com o mesmo MD5 calculado pelo coletor (ver chave_transacao em coletor_itbi.py).
+update transacoes_imobiliarias
+set chave_transacao = md5(concat_ws('|',
+    coalesce(n_do_cadastro_sql::text, ''),
+    coalesce(to_char(data_de_transacao, 'YYYY-MM-DD'), ''),
+    coalesce(natureza_de_transacao, ''),
+    coalesce(cartorio_de_registro::text, ''),
+    coalesce(matricula_do_imovel::text, ''),
+    coalesce(numero::text, ''),
+    coalesce(complemento, ''),
+    coalesce(to_char(valor_de_transacao_declarado_pelo_contribuinte, 'FM999999999990.00'), '')
+))
+where chave_transacao is null;
+
+-- O índice único só é criado se nenhuma chave se repetir. Linhas repetidas nas planilhas antigas
+-- ficam com a mesma chave: nesse caso, revise-as e arquive-as com sql/deduplicar_chave_transacao.sql
+-- e execute este script de novo (ele pode ser repetido).
+do $$
+declare
+    repetidas bigint;
+begin
+    select count(*) into repetidas
+    from (select chave_transacao from transacoes_imobiliarias
+          where chave_transacao is not null
+          group by chave_transacao having count(*) > 1) r;
+    if repetidas > 0 then
+        raise warning '% chaves repetidas: índice único não criado (ver sql/deduplicar_chave_transacao.sql)', repetidas;
+    else
+        create unique index if not exists transacoes_imobiliarias_chave_transacao_idx
+            on transacoes_imobiliarias (chave_transacao);
+    end if;
+end;
+$$;
@@ -0,0 +1,32 @@
+-- Estado da carga incremental do coletor (coletor_itbi.py --atualizar).
+-- Execute depois de sql/chave_transacao.sql.
+
+-- Hash de todo o conteúdo da linha: o coletor só reenvia transações cujo hash mudou.
+-- Linhas antigas ficam com hash nulo e são regravadas uma vez na primeira atualização.
+alter table transacoes_imobiliarias add column if not exists hash_linha text;
+
+-- Consulta dos hashes de um ano, paginada por id
+create index if not exists transacoes_imobiliarias_ano_id_idx
+    on transacoes_imobiliarias (ano_transacao, id);
+
+-- Uma linha por planilha carregada: planilhas com o mesmo hash são ignoradas
+create table if not exists coletor_arquivos (
+    arquivo text primary key,
+    ano_transacao integer not null,
+    assinatura text,           -- tamanho e data de modificação, para evitar recalcular o hash
+    hash text not null,        -- SHA-256 do conteúdo
+    linhas integer,
+    carregado_em timestamptz not null default now()
+);
+
+-- Anos alterados pela última carga; a aplicação lê esta tabela e invalida só os caches desses anos
+create table if not exists coletor_atualizacoes (
+    ano_transacao integer primary key,
+    atualizado_em timestamptz not null default now(),
+    linhas_alteradas integer
+);
+
+-- A aplicação usa a chave anônima: precisa ler coletor_atualizacoes
+alter table coletor_atualizacoes enable row level security;
+drop policy if exists "leitura publica" on coletor_atualizacoes;
+create policy "leitura publica" on coletor_atualizacoes for select using (true);
@@ -0,0 +1,29 @@
+-- Transações repetidas (mesma chave_transacao), encontradas por sql/chave_transacao.sql.
+-- Execute em etapas: a remoção (etapa 3) só acontece depois de descomentada, e remove
+-- apenas as linhas copiadas para transacoes_duplicadas. Da mais recente (maior id) de cada
+-- chave nada é copiado nem removido.
+
+-- 1. Lista as chaves repetidas e quantas linhas seriam arquivadas
+select chave_transacao, count(*) as linhas, count(*) - 1 as arquivadas, min(id) as primeiro_id, max(id) as ultimo_id
+from transacoes_imobiliarias
+where chave_transacao is not null
+group by chave_transacao
+having count(*) > 1
+order by linhas desc;
+
+-- 2. Copia as linhas repetidas mais antigas para a tabela de arquivo (pode ser repetida)
+create table if not exists transacoes_duplicadas (like transacoes_imobiliarias);
+alter table transacoes_duplicadas add column if not exists arquivado_em timestamptz default now();
+
+insert into transacoes_duplicadas
+select a.*
+from transacoes_imobiliarias a
+where exists (select 1 from transacoes_imobiliarias b
+              where b.chave_transacao = a.chave_transacao and b.id > a.id)
+  and not exists (select 1 from transacoes_duplicadas d where d.id = a.id);
+
+-- 3. Depois de conferir transacoes_duplicadas, descomente para remover da tabela principal só
+--    as linhas arquivadas, e execute sql/chave_transacao.sql de novo para criar o índice único.
+-- delete from transacoes_imobiliarias t
+-- using transacoes_duplicadas d
+-- where t.id = d.id;
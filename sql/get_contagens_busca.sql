@@ -0,0 +1,32 @@
+-- Contagens (facetas) de uma busca: transações por ano e tipo de imóvel, sem trazer as linhas.
+-- Executada junto com cada busca; a aplicação mostra o total real (acima do teto de linhas) e
+-- o número de transações de cada ano na lista de anos. Os filtros são os de get_estatisticas_busca,
+-- menos o de anos: as contagens cobrem todos os anos e a aplicação soma os escolhidos.
+create or replace function get_contagens_busca(
+    p_logradouro text default null,
+    p_exato boolean default false,
+    p_cep integer default null,
+    p_cep_fim integer default null,
+    p_numero text default null
+)
+returns table (
+    ano_transacao integer,
+    tipo text,
+    transacoes bigint
+)
+language sql
+stable
+as $$
+    select
+        t.ano_transacao,
+        coalesce(t.descricao_do_uso_iptu, 'Não informado') as tipo,
+        count(*) as transacoes
+    from transacoes_imobiliarias t
+    where (p_cep is null or t.cep between p_cep and coalesce(p_cep_fim, p_cep))
+      and (p_numero is null or t.numero = p_numero)
+      and (p_logradouro is null
+           or (p_exato and t.nome_do_logradouro = p_logradouro)
+           or (not p_exato and t.logradouro_norm like p_logradouro))
+    group by 1, 2
+    order by 1 desc, 3 desc;
+$$;
@@ -0,0 +1,13 @@
+-- Nomes distintos de logradouro e o número de transações de cada um.
+-- Usada pelo índice de sugestões da aplicação (indice_logradouros.py), que pagina o resultado com range().
+create or replace function get_distinct_logradouros()
+returns table (logradouro text, total bigint)
+language sql
+stable
+as $$
+    select nome_do_logradouro as logradouro, count(*) as total
+    from transacoes_imobiliarias
+    where nome_do_logradouro is not null
+    group by nome_do_logradouro
+    order by nome_do_logradouro;
+$$;
@@ -0,0 +1,50 @@
+-- Estatísticas de uma busca calculadas no banco: só a tabela agregada trafega pela rede.
+-- Uma linha por ano e tipo de imóvel (descricao_do_uso_iptu), mais uma linha 'Todos' por ano.
+-- Os parâmetros seguem os filtros de buscar_dados; parâmetros nulos não filtram.
+-- p_cep sozinho é um CEP exato; com p_cep_fim, a faixa [p_cep, p_cep_fim] (setor, sub-região ou intervalo).
+-- Com p_exato, p_logradouro é o nome exato; sem ele, o padrão LIKE sobre logradouro_norm (sql/logradouro_norm.sql).
+drop function if exists get_estatisticas_busca(text, boolean, integer, text, integer[]);
+create or replace function get_estatisticas_busca(
+    p_logradouro text default null,
+    p_exato boolean default false,
+    p_cep integer default null,
+    p_cep_fim integer default null,
+    p_numero text default null,
+    p_anos integer[] default null
+)
+returns table (
+    ano_transacao integer,
+    tipo text,
+    transacoes bigint,
+    valor_p10 double precision,
+    valor_p25 double precision,
+    valor_mediano double precision,
+    valor_p75 double precision,
+    valor_p90 double precision,
+    valor_m2_mediano double precision
+)
+language sql
+stable
+as $$
+    select
+        t.ano_transacao,
+        case when grouping(t.descricao_do_uso_iptu) = 1 then 'Todos'
+             else coalesce(t.descricao_do_uso_iptu, 'Não informado') end as tipo,
+        count(*) as transacoes,
+        percentile_cont(0.10) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.25) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.50) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.75) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.90) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.50) within group (
+            order by t.valor_de_transacao_declarado_pelo_contribuinte / nullif(t.area_construida_m2, 0))
+    from transacoes_imobiliarias t
+    where (p_anos is null or t.ano_transacao = any(p_anos))
+      and (p_cep is null or t.cep between p_cep and coalesce(p_cep_fim, p_cep))
+      and (p_numero is null or t.numero = p_numero)
+      and (p_logradouro is null
+           or (p_exato and t.nome_do_logradouro = p_logradouro)
+           or (not p_exato and t.logradouro_norm like p_logradouro))
+    group by grouping sets ((t.ano_transacao, t.descricao_do_uso_iptu), (t.ano_transacao))
+    order by t.ano_transacao desc, grouping(t.descricao_do_uso_iptu) desc, count(*) desc;
+$$;
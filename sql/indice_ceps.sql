@@ -0,0 +1,36 @@
+-- Índice pré-calculado de CEPs: transações por CEP e logradouro.
+-- A aplicação (indice_ceps.py) o usa para mostrar o tamanho de uma busca por setor ou faixa de CEP
+-- antes de executá-la e para dividir setores grandes em partes; as buscas usam o índice da coluna cep.
+create index if not exists transacoes_imobiliarias_cep_idx on transacoes_imobiliarias (cep);
+
+create materialized view if not exists cep_logradouros as
+    select cep, nome_do_logradouro as logradouro, count(*) as total
+    from transacoes_imobiliarias
+    where cep is not null
+    group by cep, nome_do_logradouro;
+
+create unique index if not exists cep_logradouros_idx on cep_logradouros (cep, logradouro);
+
+-- Lida página por página com range(), como get_distinct_logradouros
+create or replace function get_cep_logradouros()
+returns table (cep integer, logradouro text, total bigint)
+language sql
+stable
+as $$
+    select cep, logradouro, total from cep_logradouros order by cep, logradouro;
+$$;
+
+-- Chamada pelo coletor (coletor_itbi.py, com a chave service_role) ao fim de cada carga
+create or replace function atualizar_indice_ceps()
+returns void
+language sql
+security definer
+set search_path = public, pg_temp
+as $$
+    refresh materialized view concurrently cep_logradouros;
+$$;
+
+-- O PostgREST expõe toda função executável: sem isto, a chave anônima da aplicação poderia
+-- disparar o recálculo da visão quantas vezes quisesse
+revoke execute on function atualizar_indice_ceps() from public, anon, authenticated;
+grant execute on function atualizar_indice_ceps() to service_role;
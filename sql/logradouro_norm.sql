@@ -0,0 +1,45 @@
+-- Logradouro normalizado (normalizacao.normalizar_logradouro): sem acentos, pontuação e palavras vazias,
+-- com tipos, títulos e ordinais abreviados e o tipo no fim ("R. 1º de Março" -> "1 marco r").
+-- O coletor (coletor_itbi.py) grava a coluna em cada carga; a busca sem nome exato usa
+-- logradouro_norm like 'nome%' ou 'nome% tipo', atendido pelo índice abaixo.
+-- Execute antes de sql/get_estatisticas_busca.sql, sql/get_contagens_busca.sql e sql/tendencias.sql.
+alter table transacoes_imobiliarias add column if not exists logradouro_norm text;
+
+-- text_pattern_ops: o índice atende LIKE com prefixo fixo em qualquer collation do banco
+create index if not exists transacoes_imobiliarias_logradouro_norm_idx
+    on transacoes_imobiliarias (logradouro_norm text_pattern_ops);
+
+-- Grava a chave de vários logradouros de uma vez: p_pares é uma lista JSON de
+-- {"nome": nome_do_logradouro, "norm": chave}. Usada por python coletor_itbi.py --normalizar
+-- para preencher as linhas já carregadas (e refazer as chaves quando o dicionário muda).
+-- Devolve o número de transações alteradas; as tendências (sql/tendencias.sql), se existirem,
+-- recebem a mesma chave.
+create or replace function atualizar_logradouro_norm(p_pares jsonb)
+returns bigint
+language plpgsql
+as $$
+declare
+    alteradas bigint;
+begin
+    update transacoes_imobiliarias t
+    set logradouro_norm = p.norm
+    from jsonb_to_recordset(p_pares) as p(nome text, norm text)
+    where t.nome_do_logradouro = p.nome
+      and t.logradouro_norm is distinct from p.norm;
+    get diagnostics alteradas = row_count;
+
+    if to_regclass('tendencia_logradouro_mes') is not null then
+        update tendencia_logradouro_mes l
+        set logradouro_norm = p.norm
+        from jsonb_to_recordset(p_pares) as p(nome text, norm text)
+        where l.logradouro = p.nome
+          and l.logradouro_norm is distinct from p.norm;
+    end if;
+    return alteradas;
+end;
+$$;
+
+-- O PostgREST expõe toda função executável: sem isto, a chave anônima da aplicação poderia
+-- reescrever a coluna da tabela inteira. O coletor roda com SUPABASE_SERVICE_KEY
+revoke execute on function atualizar_logradouro_norm(jsonb) from public, anon, authenticated;
+grant execute on function atualizar_logradouro_norm(jsonb) to service_role;
@@ -0,0 +1,154 @@
+-- Tendência de preços pré-agregada: quantidade e quartis do valor e do valor por m² por mês,
+-- por logradouro e por CEP. O gráfico de tendência (analise.tendencia_remota) lê algumas
+-- centenas de linhas destas tabelas em vez das transações.
+-- Execute depois de sql/indice_ceps.sql e sql/logradouro_norm.sql.
+
+create table if not exists tendencia_logradouro_mes (
+    logradouro text not null,
+    ano_transacao integer not null,
+    mes integer not null,
+    transacoes integer not null,
+    valor_p25 double precision,
+    valor_mediano double precision,
+    valor_p75 double precision,
+    valor_m2_p25 double precision,
+    valor_m2_mediano double precision,
+    valor_m2_p75 double precision,
+    primary key (logradouro, ano_transacao, mes)
+);
+-- Chave normalizada do logradouro, para a busca por padrão (ver sql/logradouro_norm.sql)
+alter table tendencia_logradouro_mes add column if not exists logradouro_norm text;
+create index if not exists tendencia_logradouro_mes_norm_idx
+    on tendencia_logradouro_mes (logradouro_norm text_pattern_ops);
+
+create table if not exists tendencia_cep_mes (
+    cep integer not null,
+    ano_transacao integer not null,
+    mes integer not null,
+    transacoes integer not null,
+    valor_p25 double precision,
+    valor_mediano double precision,
+    valor_p75 double precision,
+    valor_m2_p25 double precision,
+    valor_m2_mediano double precision,
+    valor_m2_p75 double precision,
+    primary key (cep, ano_transacao, mes)
+);
+
+-- Recalcula só os anos informados (todos, se p_anos for nulo). Chamada pelo coletor
+-- (coletor_itbi.py) com os anos alterados em cada carga: percentis não podem ser somados,
+-- então o ano inteiro é refeito a partir das transações.
+create or replace function atualizar_tendencias(p_anos integer[] default null)
+returns void
+language plpgsql
+security definer
+set search_path = public, pg_temp
+as $$
+begin
+    delete from tendencia_logradouro_mes where p_anos is null or ano_transacao = any(p_anos);
+    insert into tendencia_logradouro_mes (
+        logradouro, ano_transacao, mes, transacoes, valor_p25, valor_mediano, valor_p75,
+        valor_m2_p25, valor_m2_mediano, valor_m2_p75, logradouro_norm
+    )
+    select
+        t.nome_do_logradouro, t.ano_transacao, extract(month from t.data_de_transacao)::integer, count(*),
+        percentile_cont(0.25) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.50) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.75) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.25) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte / nullif(t.area_construida_m2, 0)),
+        percentile_cont(0.50) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte / nullif(t.area_construida_m2, 0)),
+        percentile_cont(0.75) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte / nullif(t.area_construida_m2, 0)),
+        max(t.logradouro_norm)
+    from transacoes_imobiliarias t
+    where (p_anos is null or t.ano_transacao = any(p_anos))
+      and t.nome_do_logradouro is not null and t.data_de_transacao is not null
+    group by 1, 2, 3;
+
+    delete from tendencia_cep_mes where p_anos is null or ano_transacao = any(p_anos);
+    insert into tendencia_cep_mes
+    select
+        t.cep, t.ano_transacao, extract(month from t.data_de_transacao)::integer, count(*),
+        percentile_cont(0.25) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.50) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.75) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte),
+        percentile_cont(0.25) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte / nullif(t.area_construida_m2, 0)),
+        percentile_cont(0.50) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte / nullif(t.area_construida_m2, 0)),
+        percentile_cont(0.75) within group (order by t.valor_de_transacao_declarado_pelo_contribuinte / nullif(t.area_construida_m2, 0))
+    from transacoes_imobiliarias t
+    where (p_anos is null or t.ano_transacao = any(p_anos))
+      and t.cep is not null and t.data_de_transacao is not null
+    group by 1, 2, 3;
+end;
+$$;
+
+-- Uma linha por mês. Com p_cep (e p_cep_fim), usa as linhas dos CEPs da faixa; senão, as do
+-- logradouro (igualdade com p_exato; sem ele, p_logradouro é o padrão LIKE sobre logradouro_norm).
+-- Quando mais de um logradouro ou CEP entra no mês (grupos > 1), os quartis são a média deles
+-- ponderada pelo número de transações.
+create or replace function get_tendencia(
+    p_logradouro text default null,
+    p_exato boolean default false,
+    p_cep integer default null,
+    p_cep_fim integer default null,
+    p_anos integer[] default null
+)
+returns table (
+    ano_transacao integer,
+    mes integer,
+    transacoes bigint,
+    valor_p25 double precision,
+    valor_mediano double precision,
+    valor_p75 double precision,
+    valor_m2_p25 double precision,
+    valor_m2_mediano double precision,
+    valor_m2_p75 double precision,
+    grupos bigint
+)
+language sql
+stable
+as $$
+    with linhas as (
+        select c.ano_transacao, c.mes, c.transacoes, c.valor_p25, c.valor_mediano, c.valor_p75,
+               c.valor_m2_p25, c.valor_m2_mediano, c.valor_m2_p75
+        from tendencia_cep_mes c
+        where p_cep is not null
+          and c.cep between p_cep and coalesce(p_cep_fim, p_cep)
+          and (p_anos is null or c.ano_transacao = any(p_anos))
+        union all
+        select l.ano_transacao, l.mes, l.transacoes, l.valor_p25, l.valor_mediano, l.valor_p75,
+               l.valor_m2_p25, l.valor_m2_mediano, l.valor_m2_p75
+        from tendencia_logradouro_mes l
+        where p_cep is null and p_logradouro is not null
+          and ((p_exato and l.logradouro = p_logradouro)
+               or (not p_exato and l.logradouro_norm like p_logradouro))
+          and (p_anos is null or l.ano_transacao = any(p_anos))
+    )
+    select
+        ano_transacao, mes, sum(transacoes),
+        sum(valor_p25 * transacoes) / nullif(sum(transacoes) filter (where valor_p25 is not null), 0),
+        sum(valor_mediano * transacoes) / nullif(sum(transacoes) filter (where valor_mediano is not null), 0),
+        sum(valor_p75 * transacoes) / nullif(sum(transacoes) filter (where valor_p75 is not null), 0),
+        sum(valor_m2_p25 * transacoes) / nullif(sum(transacoes) filter (where valor_m2_p25 is not null), 0),
+        sum(valor_m2_mediano * transacoes) / nullif(sum(transacoes) filter (where valor_m2_mediano is not null), 0),
+        sum(valor_m2_p75 * transacoes) / nullif(sum(transacoes) filter (where valor_m2_p75 is not null), 0),
+        count(*)
+    from linhas
+    group by ano_transacao, mes
+    order by ano_transacao, mes;
+$$;
+
+-- Só o coletor (chave service_role) recalcula: com p_anos nulo a função refaz a tabela inteira,
+-- e o PostgREST a exporia à chave anônima da aplicação
+revoke execute on function atualizar_tendencias(integer[]) from public, anon, authenticated;
+grant execute on function atualizar_tendencias(integer[]) to service_role;
+
+-- A aplicação usa a chave anônima: precisa ler as tabelas agregadas
+alter table tendencia_logradouro_mes enable row level security;
+drop policy if exists "leitura publica" on tendencia_logradouro_mes;
+create policy "leitura publica" on tendencia_logradouro_mes for select using (true);
+alter table tendencia_cep_mes enable row level security;
+drop policy if exists "leitura publica" on tendencia_cep_mes;
+create policy "leitura publica" on tendencia_cep_mes for select using (true);
+
+-- Carga inicial
+select atualizar_tendencias(null);
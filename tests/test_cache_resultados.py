@@ -0,0 +1,30 @@
+# tests/test_cache_resultados.py
+"""Contenção entre buscas (contem), que decide quando um resultado em cache atende a outra busca."""
+
+from cache_resultados import chave_busca, contem
+from normalizacao import casa_logradouro, normalizar_logradouro, padrao_logradouro
+
+
+def test_prefixo_sem_tipo_nao_contem_busca_com_tipo_diferente_no_fim():
+    ampla = chave_busca(nome_rua='Paulista A', perfil='listagem')
+    estrita = chave_busca(nome_rua='Av Paulista', perfil='listagem')
+    assert (ampla.rua, estrita.rua) == ('paulista a', 'paulista av')
+    # "Avenida Paulista Nova" atende à estrita e não à ampla: o cache não pode responder
+    nova = normalizar_logradouro('Avenida Paulista Nova')
+    assert casa_logradouro(nova, estrita.rua) and not casa_logradouro(nova, ampla.rua)
+    assert not contem(ampla, estrita)
+
+
+def test_nome_mais_longo_contido():
+    ampla = chave_busca(nome_rua='Paulista', perfil='listagem')
+    assert contem(ampla, chave_busca(nome_rua='Av Paulista', perfil='listagem'))
+    assert contem(ampla, chave_busca(nome_rua='Paulista Nova', perfil='listagem'))
+    assert contem(chave_busca(nome_rua='Av Paulista', perfil='listagem'),
+                  chave_busca(nome_rua='Av Paulista Nova', perfil='listagem'))
+
+
+def test_tipo_da_ampla_exige_o_mesmo_tipo():
+    ampla = chave_busca(nome_rua='Av Paulista', perfil='listagem')
+    assert padrao_logradouro(ampla.rua) == 'paulista% av'
+    assert not contem(ampla, chave_busca(nome_rua='Paulista', perfil='listagem'))
+    assert not contem(ampla, chave_busca(nome_rua='Rua Paulista', perfil='listagem'))
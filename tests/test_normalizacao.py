@@ -0,0 +1,22 @@
+# tests/test_normalizacao.py
+"""Formas canônicas de CEP e de logradouro usadas nas chaves de busca."""
+
+from normalizacao import canonizar_cep, normalizar_logradouro, padrao_logradouro
+
+
+def test_cep_valido():
+    assert canonizar_cep('01311-000') == '01311000'
+    assert canonizar_cep('013') == '013'
+    assert canonizar_cep('01310 a 01319') == '0131'
+
+
+def test_cep_invalido_resulta_vazio():
+    # Sem CEP canônico a busca é recusada, em vez de rodar sem o filtro ou sobre uma região inteira
+    for texto in ('123456789', 'abc', '0', '01', '01 a 02', '01311 a 01319 a 01320'):
+        assert canonizar_cep(texto) == '', texto
+
+
+def test_palavra_vazia_unico_nome_e_mantida():
+    assert normalizar_logradouro('Rua E') == 'e r'
+    assert padrao_logradouro(normalizar_logradouro('Rua E')) == 'e% r'
+    assert normalizar_logradouro('R. 1º de Março') == '1 marco r'